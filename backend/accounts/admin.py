@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from .cache import invalidate_user
 from .models import User
 
 @admin.register(User)
@@ -23,4 +24,11 @@ class UserAdmin(BaseUserAdmin):
             'classes': ('wide',),
             'fields': ('email', 'username', 'password1', 'password2'),
         }),
-    )
\ No newline at end of file
+    )
+
+    def delete_queryset(self, request, queryset):
+        user_ids = list(queryset.values_list('pk', flat=True))
+        super().delete_queryset(request, queryset)
+        # 一括削除は User.delete を通らないので、JWT認証のキャッシュをここで消す
+        for user_id in user_ids:
+            invalidate_user(user_id)
@@ -0,0 +1,99 @@
+"""ASGI向けのログイン・登録の非同期ビュー（AUTH_ASYNC_VIEWS=True のとき urls.py で同期版と差し替える）
+
+同期版のビューは sync_to_async の共有スレッドで動くので、ハッシュの計算中は他の同期処理も待たされる。
+非同期版ではハッシュの計算だけを accounts.passwords のスレッドプールで行い、
+回数の制限・入力の検証・レスポンスの内容は同期版と同じにする（レスポンスはJSONのみ）。
+POST以外のメソッドは同期版のビューに委譲する。
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, Throttled, ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from .passwords import aauthenticate, amake_password
+from .serializers import LoginCredentialsSerializer, UserRegistrationSerializer
+from .throttles import LoginEmailThrottle
+from . import views
+
+renderer = JSONRenderer()
+
+_sync_login_view = views.UserLoginView.as_view()
+_sync_register_view = views.UserRegistrationView.as_view()
+
+
+def _render(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(renderer.render(data), status=status_code, content_type=renderer.media_type)
+
+
+def _error(exc):
+    """DRFの例外ハンドラと同じ形式のエラーレスポンス"""
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = _render(data, exc.status_code)
+    if isinstance(exc, Throttled) and exc.wait is not None:
+        response['Retry-After'] = '%d' % exc.wait
+    return response
+
+
+def _csrf_exempt(view):
+    """todos.async_views._csrf_exempt と同じ（Django 4.2 の csrf_exempt は非同期関数に使えない）"""
+    view.csrf_exempt = True
+    return view
+
+
+def _drf_request(request):
+    return Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES])
+
+
+def _check_throttles(request, view_class):
+    """同期版のビューと同じ回数の制限を確認する（制限を超えていれば Throttled）"""
+    throttles = [throttle_class() for throttle_class in view_class.throttle_classes]
+    waits = [throttle.wait() for throttle in throttles if not throttle.allow_request(request, None)]
+    if waits:
+        raise Throttled(max([wait for wait in waits if wait is not None], default=None))
+
+
+def _invalid_credentials():
+    return ValidationError({api_settings.NON_FIELD_ERRORS_KEY: ['認証情報が正しくありません。']})
+
+
+@_csrf_exempt
+async def login(request):
+    """ユーザーログイン"""
+    if request.method != 'POST':
+        return await sync_to_async(_sync_login_view)(request)
+    drf_request = _drf_request(request)
+    try:
+        await sync_to_async(_check_throttles)(drf_request, views.UserLoginView)
+        serializer = LoginCredentialsSerializer(data=drf_request.data)
+        if not serializer.is_valid():
+            # 同期版と同じく、入力の不備も失敗の回数に数える
+            await sync_to_async(LoginEmailThrottle().record_failure)(drf_request, None)
+            raise ValidationError(serializer.errors)
+        user = await aauthenticate(serializer.validated_data['email'], serializer.validated_data['password'])
+        if user is None:
+            await sync_to_async(LoginEmailThrottle().record_failure)(drf_request, None)
+            raise _invalid_credentials()
+    except APIException as exc:
+        return _error(exc)
+    await sync_to_async(LoginEmailThrottle().record_success)(drf_request, None)
+    return _render(views.token_response_data(user, 'ログインしました。'))
+
+
+@_csrf_exempt
+async def register(request):
+    """ユーザー登録"""
+    if request.method != 'POST':
+        return await sync_to_async(_sync_register_view)(request)
+    drf_request = _drf_request(request)
+    try:
+        await sync_to_async(_check_throttles)(drf_request, views.UserRegistrationView)
+        serializer = UserRegistrationSerializer(data=drf_request.data, context={'request': drf_request})
+        # メールアドレス・ユーザー名の重複の確認でクエリを発行する
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        encoded_password = await amake_password(serializer.validated_data['password'])
+        user = await sync_to_async(serializer.save)(encoded_password=encoded_password)
+    except APIException as exc:
+        return _error(exc)
+    return _render(views.token_response_data(user, 'ユーザー登録が完了しました。'), status.HTTP_201_CREATED)
@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from .cache import acache_user, aget_cached_user, cache_user, get_cached_user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWT認証。ユーザーはキャッシュから組み立て、DBを読むのはキャッシュにない場合だけ（accounts.cache を参照）"""
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+    def check_user(self, user, validated_token):
+        """JWTAuthentication.get_user と同じ確認（無効化・パスワード変更）"""
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+    def get_user(self, validated_token):
+        user = get_cached_user(self.get_user_id(validated_token))
+        if user is None:
+            user = super().get_user(validated_token)
+            cache_user(user)
+            return user
+        self.check_user(user, validated_token)
+        return user
+
+
+class TokenUserJWTAuthentication(CachedJWTAuthentication):
+    """読み取り専用のエンドポイント用のJWT認証
+
+    USER_TRUST_TOKEN_FOR_READS=True の場合、GET・HEADなどのリクエストではユーザーを読まず、
+    トークンの内容だけの TokenUser を返す（ビューは request.user.pk だけを使うこと）。
+    それ以外は CachedJWTAuthentication と同じ。
+    """
+
+    def authenticate(self, request):
+        self.safe_request = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if settings.USER_TRUST_TOKEN_FOR_READS and self.safe_request:
+            self.get_user_id(validated_token)
+            return api_settings.TOKEN_USER_CLASS(validated_token)
+        return super().get_user(validated_token)
+
+
+class AsyncJWTAuthentication(CachedJWTAuthentication):
+    """非同期ビュー用のJWT認証（ユーザーの取得に非同期ORMを使う）"""
+
+    async def aauthenticate(self, request, allow_query_token=False):
+        """認証できたユーザーを返す（トークンがない場合はNone）
+
+        同期版の authenticate と同じく、ヘッダーやトークンが不正な場合は AuthenticationFailed
+        （トークンの検証に失敗した場合はその派生の InvalidToken）を送出する。
+        allow_query_token=True の場合は `?token=` も受け付ける（ヘッダーを付けられないEventSource用）。
+        """
+        header = self.get_header(request)
+        raw_token = self.get_raw_token(header) if header is not None else None
+        if raw_token is None and allow_query_token:
+            raw_token = request.GET.get('token')
+        if not raw_token:
+            return None
+        return await self.aget_user(self.get_validated_token(raw_token))
+
+    async def aget_user(self, validated_token):
+        """get_user の非同期版（キャッシュにない場合は非同期ORMで読む）"""
+        user_id = self.get_user_id(validated_token)
+        user = await aget_cached_user(user_id)
+        if user is None:
+            try:
+                user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            self.check_user(user, validated_token)
+            await acache_user(user)
+            return user
+        self.check_user(user, validated_token)
+        return user
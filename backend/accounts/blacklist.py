@@ -0,0 +1,183 @@
+"""無効にしたリフレッシュトークンの管理
+
+トークンの jti を BlacklistedToken に記録し、有効期限が過ぎた行は purge_blacklisted_tokens() で
+バッチごとに削除する（期限切れのトークンは署名の検証で弾かれるので、記録を残す必要はない）。
+
+リフレッシュのたびにテーブルを引かないよう、期限内の jti をプロセス内のブルームフィルタに持ち、
+「含まれない」と分かったトークンはDBを読まずに通す（含まれる可能性がある場合だけDBで確認する）。
+他のプロセスでの無効化は、共有キャッシュのバージョンが変わったら差分を読み込んで反映する。
+キャッシュがプロセス内メモリの場合は他のプロセスの無効化が伝わらないので、
+TOKEN_BLACKLIST_FILTER='auto' ではフィルタを使わない（USER_CACHE_URL を参照）。
+"""
+import datetime
+import hashlib
+import math
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .models import BlacklistedToken
+
+VERSION_KEY = 'accounts:blacklist:version'
+# 差分の読み込みで遡る時間（記録の日時からコミットまでの間に読み込みが入っても取りこぼさないため）
+SYNC_MARGIN = datetime.timedelta(seconds=60)
+
+
+class BloomFilter:
+    """文字列の集合のブルームフィルタ（削除はできない）"""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(1, capacity)
+        self.size = max(64, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * step) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+def _cache():
+    return caches[settings.USER_CACHE_ALIAS]
+
+
+def filter_enabled():
+    mode = settings.TOKEN_BLACKLIST_FILTER
+    if mode == 'auto':
+        return not isinstance(_cache(), LocMemCache)
+    return mode == 'on'
+
+
+def _current_version():
+    cache = _cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(VERSION_KEY, version, timeout=None):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def _bump_version():
+    """バージョンを上げ、新しい値を返す（キーがなかった場合はNone）"""
+    cache = _cache()
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        return None
+
+
+class BlacklistFilter:
+    """期限内の無効化済み jti のブルームフィルタ（プロセスごとに1つ）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bloom = None
+        self.version = None
+        self.built_at = None
+        self.synced_at = None
+
+    def reset(self):
+        with self.lock:
+            self.bloom = None
+
+    def _rebuild(self, now):
+        tokens = BlacklistedToken.objects.filter(expires_at__gt=now)
+        capacity = max(settings.TOKEN_BLACKLIST_FILTER_CAPACITY, 2 * tokens.count())
+        bloom = BloomFilter(capacity, settings.TOKEN_BLACKLIST_FILTER_ERROR_RATE)
+        for jti in tokens.values_list('jti', flat=True).iterator(chunk_size=10000):
+            bloom.add(jti)
+        self.bloom = bloom
+        self.built_at = now
+
+    def _sync(self, now):
+        tokens = BlacklistedToken.objects.filter(
+            blacklisted_at__gte=self.synced_at - SYNC_MARGIN, expires_at__gt=now
+        )
+        for jti in tokens.values_list('jti', flat=True).iterator(chunk_size=10000):
+            self.bloom.add(jti)
+
+    def might_contain(self, jti):
+        """False なら jti は無効化されていない（True の場合はDBで確認する）"""
+        # DBより先にバージョンを読むので、読み込み中に増えた分は次の呼び出しで反映される
+        version = _current_version()
+        now = timezone.now()
+        with self.lock:
+            expired = (
+                self.bloom is None
+                or self.bloom.count > self.bloom.capacity
+                # 期限が切れたものは消せないので、定期的に作り直す
+                or now - self.built_at > datetime.timedelta(seconds=settings.TOKEN_BLACKLIST_FILTER_REBUILD)
+            )
+            if expired:
+                self._rebuild(now)
+            elif version != self.version:
+                self._sync(now)
+            else:
+                return jti in self.bloom
+            self.version = version
+            self.synced_at = now
+            return jti in self.bloom
+
+    def add(self, jti):
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+
+    def bumped(self, version):
+        """自分の無効化でバージョンを上げた後に呼ぶ
+
+        他のプロセスが間にバージョンを上げていなければ、差分を読み込まずに新しいバージョンとみなす。
+        """
+        with self.lock:
+            if version is not None and self.version is not None and version == self.version + 1:
+                self.version = version
+
+
+blacklist_filter = BlacklistFilter()
+
+
+def is_blacklisted(jti):
+    if filter_enabled() and not blacklist_filter.might_contain(jti):
+        return False
+    return BlacklistedToken.objects.filter(jti=jti).exists()
+
+
+def blacklist_jti(jti, expires_at):
+    """jti を無効にする。既に無効だった場合は False（同じトークンの同時利用を検出するため）"""
+    try:
+        with transaction.atomic():
+            BlacklistedToken.objects.create(jti=jti, expires_at=expires_at, blacklisted_at=timezone.now())
+    except IntegrityError:
+        return False
+    blacklist_filter.add(jti)
+    transaction.on_commit(lambda: blacklist_filter.bumped(_bump_version()))
+    return True
+
+
+def purge_blacklisted_tokens(before=None, batch_size=None):
+    """before（省略時は現在）より前に期限が切れた記録を batch_size 件ずつ削除し、件数を返す"""
+    before = before or timezone.now()
+    batch_size = batch_size or settings.TOKEN_BLACKLIST_PURGE_BATCH_SIZE
+    expired = BlacklistedToken.objects.filter(expires_at__lt=before)
+    count = 0
+    while True:
+        jtis = list(expired.values_list('jti', flat=True)[:batch_size])
+        if not jtis:
+            return count
+        count += BlacklistedToken.objects.filter(jti__in=jtis).delete()[0]
@@ -0,0 +1,67 @@
+"""JWT認証で使うユーザーのキャッシュ
+
+認証のたびに accounts_user を読まないよう、ユーザーの列の値を USER_CACHE_TIMEOUT 秒キャッシュする。
+キャッシュするのは値だけで、リクエストごとに新しいインスタンスを組み立てるので、
+ビューでのインスタンスの変更が他のリクエストに漏れることはない。
+
+User の保存・削除（パスワード変更・無効化を含む）では、直後とコミット後に無効化する。
+QuerySet.update() などで直接書き換えた場合は invalidate_user() を呼ぶこと。
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+
+
+def _cache():
+    return caches[settings.USER_CACHE_ALIAS]
+
+
+def _key(user_id):
+    return f'accounts:user:{user_id}'
+
+
+def _build(values):
+    if values is None:
+        return None
+    user_model = get_user_model()
+    field_names = [field.attname for field in user_model._meta.concrete_fields]
+    # from_db で作るので、保存時は既存の行の更新になる
+    return user_model.from_db(user_model.objects.db, field_names, values)
+
+
+def get_cached_user(user_id):
+    """キャッシュにあるユーザー（新しいインスタンス）。なければNone"""
+    if not settings.USER_CACHE_TIMEOUT:
+        return None
+    return _build(_cache().get(_key(user_id)))
+
+
+async def aget_cached_user(user_id):
+    if not settings.USER_CACHE_TIMEOUT:
+        return None
+    return _build(await _cache().aget(_key(user_id)))
+
+
+def _values(user):
+    return [getattr(user, field.attname) for field in user._meta.concrete_fields]
+
+
+def cache_user(user):
+    if settings.USER_CACHE_TIMEOUT:
+        _cache().set(_key(user.pk), _values(user), timeout=settings.USER_CACHE_TIMEOUT)
+
+
+async def acache_user(user):
+    if settings.USER_CACHE_TIMEOUT:
+        await _cache().aset(_key(user.pk), _values(user), timeout=settings.USER_CACHE_TIMEOUT)
+
+
+def invalidate_user(user_id):
+    """ユーザーのキャッシュを消す
+
+    コミット前に他のリクエストが古い行を読んでキャッシュし直すことがあるので、コミット後にも消す。
+    """
+    key = _key(user_id)
+    _cache().delete(key)
+    transaction.on_commit(lambda: _cache().delete(key))
@@ -0,0 +1,57 @@
+"""コストを設定で変えられるパスワードハッシャー
+
+アルゴリズム名は Django のハッシャーと同じなので、既存のハッシュもそのまま検証できる。
+保存されたハッシュのコストが設定と違う場合は must_update が True になり、
+ログインに成功したときに現在の設定で保存し直される（django.contrib.auth.hashers.check_password を参照）。
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+# hashlib.scrypt の maxmem の既定値（これを超えるコストでは maxmem を指定する必要がある）
+SCRYPT_DEFAULT_MAXMEM = 32 * 1024 * 1024
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    """scrypt（PASSWORD_SCRYPT_*）"""
+
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR
+
+    @property
+    def block_size(self):
+        return settings.PASSWORD_SCRYPT_BLOCK_SIZE
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_SCRYPT_PARALLELISM
+
+    @property
+    def maxmem(self):
+        # 必要なメモリは 128 * n * r バイト（余裕を持たせる）
+        required = 129 * self.work_factor * self.block_size
+        return 0 if required <= SCRYPT_DEFAULT_MAXMEM else required + 1024 * 1024
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2id（PASSWORD_ARGON2_*、argon2-cffi が必要）"""
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2_PARALLELISM
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256（PASSWORD_PBKDF2_ITERATIONS）"""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
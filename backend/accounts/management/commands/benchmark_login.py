@@ -0,0 +1,78 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hashers, make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from accounts.passwords import verify_password
+from accounts.serializers import UserLoginSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        'パスワードのハッシュの方式ごとに、ログインの処理速度とハッシュの検証の並列性能を計測します'
+        '（作成したユーザーは取り消します）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=100, help='方式ごとに計測するログインの回数')
+        parser.add_argument('--threads', type=int, default=settings.PASSWORD_HASH_WORKERS,
+                            help='並列に検証するスレッドの数')
+        parser.add_argument('--algorithms', default='pbkdf2_sha256,scrypt,argon2',
+                            help='計測する方式（カンマ区切り）')
+
+    def handle(self, *args, **options):
+        hashers = dict(zip([hasher.algorithm for hasher in get_hashers()], settings.PASSWORD_HASHERS))
+        for algorithm in options['algorithms'].split(','):
+            path = hashers.get(algorithm)
+            if path is None:
+                self.stdout.write(f'{algorithm}: PASSWORD_HASHERS にないので省略')
+                continue
+            policy = [path] + [other for other in settings.PASSWORD_HASHERS if other != path]
+            with override_settings(PASSWORD_HASHERS=policy):
+                try:
+                    make_password('')
+                except ValueError as exc:
+                    self.stdout.write(f'{algorithm}: {exc}')
+                    continue
+                self.stdout.write(f'{algorithm}:')
+                with transaction.atomic():
+                    self.measure(algorithm, options['logins'], options['threads'])
+                    transaction.set_rollback(True)
+
+    def measure(self, algorithm, logins, threads):
+        password = uuid.uuid4().hex
+        user = get_user_model().objects.create_user(
+            email=f'benchmark-{uuid.uuid4().hex}@example.com', username=f'benchmark-{uuid.uuid4().hex}',
+        )
+        # 以前の方式で保存されたハッシュが、最初のログインで保存し直されることを確かめる
+        user.password = make_password(password, hasher='pbkdf2_sha1')
+        user.save(update_fields=['password'])
+        data = {'email': user.email, 'password': password}
+
+        start = time.perf_counter()
+        self.login(data)
+        elapsed = time.perf_counter() - start
+        user.refresh_from_db(fields=['password'])
+        rehashed = user.password.startswith(algorithm + '$')
+        self.stdout.write(f'  最初のログイン（保存し直しを含む）: {elapsed * 1000:.0f} ms、保存し直し: {rehashed}')
+
+        start = time.perf_counter()
+        for _ in range(logins):
+            self.login(data)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f'  ログイン: {logins / elapsed:.1f} 回/秒（1回あたり {elapsed / logins * 1000:.0f} ms）')
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            start = time.perf_counter()
+            results = list(executor.map(lambda _: verify_password(password, user.password), range(logins)))
+            elapsed = time.perf_counter() - start
+        assert all(is_correct for is_correct, _ in results)
+        self.stdout.write(f'  検証（{threads}スレッド）: {logins / elapsed:.1f} 回/秒')
+
+    def login(self, data):
+        serializer = UserLoginSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
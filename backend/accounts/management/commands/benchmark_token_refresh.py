@@ -0,0 +1,85 @@
+import datetime
+import time
+import uuid
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from accounts.blacklist import blacklist_filter, purge_blacklisted_tokens
+from accounts.models import BlacklistedToken
+from accounts.serializers import TokenRefreshSerializer
+from accounts.tokens import RefreshToken
+
+
+class Command(BaseCommand):
+    help = (
+        '無効化済みトークンの記録が大量にある状態で、リフレッシュの処理速度をブルームフィルタの有無で比較します'
+        '（データは作成後に取り消します）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', type=int, default=10_000_000, help='過去に無効化したトークンの件数')
+        parser.add_argument('--history-days', type=int, default=30,
+                            help='記録の有効期限を散らばらせる日数（多くは期限切れになる）')
+        parser.add_argument('--refreshes', type=int, default=1000, help='計測するリフレッシュの回数')
+        parser.add_argument('--batch-size', type=int, default=50000, help='記録を作成する件数の単位')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            start = time.perf_counter()
+            self.create_history(options['tokens'], options['history_days'], options['batch_size'])
+            self.stdout.write(f'{options["tokens"]}件の記録を作成: {time.perf_counter() - start:.1f} s')
+
+            user = get_user_model().objects.create_user(
+                email=f'benchmark-{uuid.uuid4().hex}@example.com', username=f'benchmark-{uuid.uuid4().hex}',
+            )
+            for mode in ('off', 'on'):
+                with override_settings(TOKEN_BLACKLIST_FILTER=mode):
+                    blacklist_filter.reset()
+                    if mode == 'on':
+                        start = time.perf_counter()
+                        blacklist_filter.might_contain('')
+                        self.stdout.write(f'ブルームフィルタの作成: {time.perf_counter() - start:.1f} s')
+                    self.measure(mode, user, options['refreshes'])
+
+            start = time.perf_counter()
+            purged = purge_blacklisted_tokens()
+            self.stdout.write(f'期限切れの記録の削除: {purged}件 {time.perf_counter() - start:.1f} s')
+            transaction.set_rollback(True)
+        blacklist_filter.reset()
+
+    def create_history(self, count, history_days, batch_size):
+        now = timezone.now()
+        lifetime = api_settings.REFRESH_TOKEN_LIFETIME
+        span = datetime.timedelta(days=history_days) + lifetime
+        for offset in range(0, count, batch_size):
+            tokens = []
+            for i in range(offset, min(offset + batch_size, count)):
+                expires_at = now - datetime.timedelta(days=history_days) + span * (i / count)
+                tokens.append(BlacklistedToken(
+                    jti=uuid.uuid4().hex, expires_at=expires_at, blacklisted_at=expires_at - lifetime,
+                ))
+            BlacklistedToken.objects.bulk_create(tokens)
+
+    def measure(self, mode, user, refreshes):
+        token = str(RefreshToken.for_user(user))
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            start = time.perf_counter()
+            for _ in range(refreshes):
+                serializer = TokenRefreshSerializer(data={'refresh': token})
+                serializer.is_valid(raise_exception=True)
+                token = serializer.validated_data['refresh']
+            elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'  フィルタ {mode}: {refreshes / elapsed:.0f} 回/秒、'
+            f'1回あたり {queries / refreshes:.1f} クエリ'
+        )
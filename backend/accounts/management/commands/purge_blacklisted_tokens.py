@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from accounts.blacklist import purge_blacklisted_tokens
+
+
+class Command(BaseCommand):
+    help = '有効期限が切れた無効化済みトークンの記録を削除します。定期的に実行してください'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='1回に削除する件数（省略時は TOKEN_BLACKLIST_PURGE_BATCH_SIZE）')
+
+    def handle(self, *args, **options):
+        count = purge_blacklisted_tokens(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{count}件の無効化済みトークンの記録を削除しました。'))
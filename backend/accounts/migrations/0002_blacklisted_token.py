@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlacklistedToken',
+            fields=[
+                ('jti', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='トークンID')),
+                ('expires_at', models.DateTimeField(verbose_name='有効期限')),
+                ('blacklisted_at', models.DateTimeField(verbose_name='無効化日時')),
+            ],
+            options={
+                'verbose_name': '無効化したトークン',
+                'verbose_name_plural': '無効化したトークン',
+                'indexes': [models.Index(fields=['expires_at'], name='blacklist_expires_idx'), models.Index(fields=['blacklisted_at'], name='blacklist_blacklisted_idx')],
+            },
+        ),
+    ]
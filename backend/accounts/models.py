@@ -17,4 +17,34 @@ class User(AbstractUser):
         db_table = 'accounts_user'
 
     def __str__(self):
-        return self.email
\ No newline at end of file
+        return self.email
+
+    def save(self, *args, **kwargs):
+        from .cache import invalidate_user
+
+        super().save(*args, **kwargs)
+        # パスワード変更・無効化をJWT認証のキャッシュに反映する
+        invalidate_user(self.pk)
+
+    def delete(self, *args, **kwargs):
+        from .cache import invalidate_user
+
+        user_id = self.pk
+        result = super().delete(*args, **kwargs)
+        invalidate_user(user_id)
+        return result
+class BlacklistedToken(models.Model):
+    """無効にしたリフレッシュトークン（accounts.blacklist を参照）"""
+    jti = models.CharField(primary_key=True, max_length=255, verbose_name='トークンID')
+    expires_at = models.DateTimeField(verbose_name='有効期限')
+    blacklisted_at = models.DateTimeField(verbose_name='無効化日時')
+
+    class Meta:
+        verbose_name = '無効化したトークン'
+        verbose_name_plural = '無効化したトークン'
+        indexes = [
+            # 期限切れの削除
+            models.Index(fields=['expires_at'], name='blacklist_expires_idx'),
+            # ブルームフィルタへの差分の読み込み
+            models.Index(fields=['blacklisted_at'], name='blacklist_blacklisted_idx'),
+        ]
@@ -0,0 +1,77 @@
+"""非同期ビュー向けのパスワードの検証・ハッシュ
+
+ハッシュの計算はCPUを使い続けるので、イベントループや sync_to_async の共有スレッドでは行わず、
+スレッド数を PASSWORD_HASH_WORKERS に制限したプールで実行する。
+hashlib の scrypt・pbkdf2_hmac と argon2-cffi は計算中にGILを解放するので、スレッドの数まで並列に動く。
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher, identify_hasher, is_password_usable, make_password
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash'
+            )
+        return _executor
+
+
+async def _run(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), func, *args)
+
+
+def verify_password(password, encoded):
+    """(一致したか, 現在の設定で保存し直す必要があるか) を返す
+
+    django.contrib.auth.hashers.check_password と同じ判定で、保存し直しは呼び出し側で行う。
+    """
+    if password is None or not is_password_usable(encoded):
+        return False, False
+    preferred = get_hasher()
+    try:
+        hasher = identify_hasher(encoded)
+    except ValueError:
+        return False, False
+
+    hasher_changed = hasher.algorithm != preferred.algorithm
+    must_update = hasher_changed or preferred.must_update(encoded)
+    is_correct = hasher.verify(password, encoded)
+    if not is_correct and not hasher_changed and must_update:
+        hasher.harden_runtime(password, encoded)
+    return is_correct, must_update
+
+
+async def amake_password(password):
+    return await _run(make_password, password)
+
+
+async def averify_password(password, encoded):
+    return await _run(verify_password, password, encoded)
+
+
+async def aauthenticate(email, password):
+    """ModelBackend.authenticate と同じ判定を、ハッシュの計算だけスレッドプールで行う"""
+    User = get_user_model()
+    try:
+        user = await User._default_manager.aget(**{User.USERNAME_FIELD: email})
+    except User.DoesNotExist:
+        # 存在しないメールアドレスでも同じだけ時間がかかるようにする（ModelBackend と同じ）
+        await amake_password(password)
+        return None
+
+    is_correct, must_update = await averify_password(password, user.password)
+    if not is_correct or not user.is_active:
+        return None
+    if must_update:
+        user.password = await amake_password(password)
+        await user.asave(update_fields=['password'])
+    return user
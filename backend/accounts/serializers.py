@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
 from .models import User
+from .tokens import RefreshToken
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, validators=[validate_password])
@@ -18,13 +20,27 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         validated_data.pop('password_confirm')
-        user = User.objects.create_user(**validated_data)
+        # 非同期ビューでは、ハッシュをスレッドプールで計算してから save(encoded_password=...) で渡す
+        encoded_password = validated_data.pop('encoded_password', None)
+        if encoded_password is None:
+            user = User.objects.create_user(**validated_data)
+            return user
+
+        validated_data.pop('password')
+        user = User(**validated_data)
+        user.email = User.objects.normalize_email(user.email)
+        user.username = User.normalize_username(user.username)
+        user.password = encoded_password
+        user.save()
         return user
 
-class UserLoginSerializer(serializers.Serializer):
+class LoginCredentialsSerializer(serializers.Serializer):
+    """ログインの入力の検証（認証はしない）"""
     email = serializers.EmailField()
     password = serializers.CharField()
 
+class UserLoginSerializer(LoginCredentialsSerializer):
+
     def validate(self, attrs):
         email = attrs.get('email')
         password = attrs.get('password')
@@ -70,4 +86,8 @@ class PasswordChangeSerializer(serializers.Serializer):
         user = self.context['request'].user
         if not user.check_password(value):
             raise serializers.ValidationError("現在のパスワードが正しくありません。")
-        return value
\ No newline at end of file
+        return value
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    """トークンのリフレッシュ（使用済みのリフレッシュトークンは accounts.blacklist で無効にする）"""
+    token_class = RefreshToken
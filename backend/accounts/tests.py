@@ -0,0 +1,53 @@
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import AsyncRequestFactory, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from accounts import async_views
+from accounts.throttles import LoginEmailThrottle
+
+User = get_user_model()
+
+PASSWORD = 'correct-horse-battery-staple'
+
+
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        caches[settings.USER_CACHE_ALIAS].clear()
+        self.user = User.objects.create_user(email='user@example.com', username='user', password=PASSWORD)
+        self.limit = LoginEmailThrottle().num_requests
+
+    def login(self, password, ip):
+        return APIClient().post(
+            reverse('user-login'), {'email': self.user.email, 'password': password},
+            format='json', REMOTE_ADDR=ip,
+        )
+
+    def test_failures_from_one_ip_do_not_lock_out_other_ips(self):
+        for _ in range(self.limit):
+            self.assertEqual(self.login('wrong', '10.0.0.1').status_code, 400)
+        self.assertEqual(self.login(PASSWORD, '10.0.0.1').status_code, 429)
+        # 他のIPアドレスからの正しいログインは制限されない
+        response = self.login(PASSWORD, '10.0.0.2')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', str(response.data))
+
+    def test_success_resets_failures(self):
+        for _ in range(self.limit - 1):
+            self.login('wrong', '10.0.0.1')
+        self.assertEqual(self.login(PASSWORD, '10.0.0.1').status_code, 200)
+        self.assertEqual(self.login('wrong', '10.0.0.1').status_code, 400)
+        self.assertEqual(self.login(PASSWORD, '10.0.0.1').status_code, 200)
+
+    def test_async_login_counts_invalid_input(self):
+        factory = AsyncRequestFactory()
+
+        def login(data):
+            return async_to_sync(async_views.login)(factory.post('/', data, content_type='application/json'))
+
+        # パスワードのない入力も、同期版と同じく失敗の回数に数える
+        for _ in range(self.limit):
+            self.assertEqual(login({'email': self.user.email}).status_code, 400)
+        self.assertEqual(login({'email': self.user.email, 'password': PASSWORD}).status_code, 429)
@@ -0,0 +1,79 @@
+"""ログイン・登録の試行回数の制限
+
+パスワードのハッシュの計算はCPUを使うので、ハッシュを計算する前に回数を確認して弾く。
+回数は USER_CACHE_ALIAS のキャッシュに記録する（プロセス内メモリの場合はプロセスごとの回数になる）。
+"""
+import hashlib
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class UserCacheThrottle(SimpleRateThrottle):
+    @property
+    def cache(self):
+        return caches[settings.USER_CACHE_ALIAS]
+
+
+class LoginIPThrottle(UserCacheThrottle):
+    """IPアドレスごとのログインの試行回数"""
+    scope = 'login_ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class RegisterIPThrottle(LoginIPThrottle):
+    """IPアドレスごとのユーザー登録の回数"""
+    scope = 'register_ip'
+
+
+class LoginEmailThrottle(UserCacheThrottle):
+    """メールアドレスとIPアドレスの組ごとのログインの失敗回数
+
+    成功したログインは数えない。失敗したときにビューから record_failure() を、成功したときに
+    record_success() を呼ぶ（そのIPアドレスからの失敗の回数を消す）。
+    メールアドレスだけで数えると、誰でも他人のアドレスで失敗を重ねてその人をログインできなくできるので、
+    IPアドレスも含める（他のIPアドレスからの正しいログインは制限されない）。
+    """
+    scope = 'login_email'
+
+    def get_cache_key(self, request, view):
+        data = request.data
+        email = data.get('email') if hasattr(data, 'get') else None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        # 大文字・小文字を変えて制限を回避できないようにし、キーにはアドレスをそのまま残さない
+        material = f'{email.strip().lower()}|{self.get_ident(request)}'
+        ident = hashlib.sha256(material.encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.history = self.cache.get(self.key, [])
+        self.now = self.timer()
+        while self.history and self.history[-1] <= self.now - self.duration:
+            self.history.pop()
+        if len(self.history) >= self.num_requests:
+            return self.throttle_failure()
+        return True
+
+    def record_failure(self, request, view):
+        if self.rate is None:
+            return
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return
+        now = self.timer()
+        history = [timestamp for timestamp in self.cache.get(key, []) if timestamp > now - self.duration]
+        history.insert(0, now)
+        self.cache.set(key, history, self.duration)
+
+    def record_success(self, request, view):
+        key = self.get_cache_key(request, view)
+        if key is not None:
+            self.cache.delete(key)
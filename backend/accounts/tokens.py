@@ -0,0 +1,30 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+from .blacklist import blacklist_jti, is_blacklisted
+
+
+class BlacklistMixin:
+    """accounts.blacklist で無効化を確認・記録するトークン
+
+    simplejwt の token_blacklist アプリと違い、発行したトークンは記録せず、無効にしたものだけを記録する。
+    """
+
+    def verify(self, *args, **kwargs):
+        self.check_blacklist()
+        super().verify(*args, **kwargs)
+
+    def check_blacklist(self):
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        # 確認と記録の間に同じトークンが使われた場合は、記録が重複するのでここで弾く
+        if not blacklist_jti(self.payload[api_settings.JTI_CLAIM], datetime_from_epoch(self.payload['exp'])):
+            raise TokenError(_('Token is blacklisted'))
+
+
+class RefreshToken(BlacklistMixin, BaseRefreshToken):
+    pass
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
@@ -7,10 +8,18 @@ from .views import (
     UserProfileView,
     PasswordChangeView
 )
+from . import async_views
+
+register_view = UserRegistrationView.as_view()
+login_view = UserLoginView.as_view()
+if settings.AUTH_ASYNC_VIEWS:
+    # ASGIで動かす場合は、ハッシュの計算をスレッドプールで行う非同期版にする
+    register_view = async_views.register
+    login_view = async_views.login
 
 urlpatterns = [
-    path('register/', UserRegistrationView.as_view(), name='user-register'),
-    path('login/', UserLoginView.as_view(), name='user-login'),
+    path('register/', register_view, name='user-register'),
+    path('login/', login_view, name='user-login'),
     path('logout/', UserLogoutView.as_view(), name='user-logout'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
     path('profile/', UserProfileView.as_view(), name='user-profile'),
@@ -1,10 +1,14 @@
 from rest_framework import status, generics, permissions
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import logout
+from django.db import transaction
+from config.conditional import ConditionalGetMixin, make_etag
 from .models import User
+from .throttles import LoginEmailThrottle, LoginIPThrottle, RegisterIPThrottle
+from .tokens import RefreshToken
 from .serializers import (
     UserRegistrationSerializer,
     UserLoginSerializer,
@@ -13,123 +17,45 @@ from .serializers import (
     PasswordChangeSerializer
 )
 
-class UserRegistrationView(generics.CreateAPIView):
-    """ユーザー登録"""
-    queryset = User.objects.all()
-    serializer_class = UserRegistrationSerializer
-    permission_classes = [permissions.AllowAny]
-
-    def create(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        user = serializer.save()
-        
-        refresh = RefreshToken.for_user(user)
-        return Response({
-            'user': UserSerializer(user).data,
-            'refresh': str(refresh),
-            'access': str(refresh.access_token),
-            'message': 'ユーザー登録が完了しました。'
-        }, status=status.HTTP_201_CREATED)
-
-class UserLoginView(TokenObtainPairView):
-    """ユーザーログイン"""
-    permission_classes = [permissions.AllowAny]
-
-    def post(self, request, *args, **kwargs):
-        serializer = UserLoginSerializer(data=request.data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        user = serializer.validated_data['user']
-        
-        refresh = RefreshToken.for_user(user)
-        return Response({
-            'user': UserSerializer(user).data,
-            'refresh': str(refresh),
-            'access': str(refresh.access_token),
-            'message': 'ログインしました。'
-        })
-
-class UserLogoutView(APIView):
-    """ユーザーログアウト"""
-    permission_classes = [permissions.IsAuthenticated]
-
-    def post(self, request):
-        try:
-            refresh_token = request.data["refresh"]
-            token = RefreshToken(refresh_token)
-            token.blacklist()
-            logout(request)
-            return Response({'message': 'ログアウトしました。'}, status=status.HTTP_205_RESET_CONTENT)
-        except Exception as e:
-            return Response({'error': 'ログアウトに失敗しました。'}, status=status.HTTP_400_BAD_REQUEST)
-
-class UserProfileView(generics.RetrieveUpdateAPIView):
-    """ユーザープロフィール取得・更新"""
-    serializer_class = UserSerializer
-    permission_classes = [permissions.IsAuthenticated]
-
-    def get_object(self):
-        return self.request.user
-
-    def get_serializer_class(self):
-        if self.request.method == 'GET':
-            return UserSerializer
-        return UserProfileUpdateSerializer
-
-class PasswordChangeView(APIView):
-    """パスワード変更"""
-    permission_classes = [permissions.IsAuthenticated]
-
-from rest_framework import status, generics, permissions
-from rest_framework.response import Response
-from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework_simplejwt.views import TokenObtainPairView
-from django.contrib.auth import logout
-from .models import User
-from .serializers import (
-    UserRegistrationSerializer,
-    UserLoginSerializer,
-    UserSerializer,
-    UserProfileUpdateSerializer,
-    PasswordChangeSerializer
-)
+def token_response_data(user, message):
+    """登録・ログインのレスポンス（非同期ビューと共通）"""
+    refresh = RefreshToken.for_user(user)
+    return {
+        'user': UserSerializer(user).data,
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+        'message': message
+    }
 
 class UserRegistrationView(generics.CreateAPIView):
     """ユーザー登録"""
     queryset = User.objects.all()
     serializer_class = UserRegistrationSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [RegisterIPThrottle]
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
         
-        refresh = RefreshToken.for_user(user)
-        return Response({
-            'user': UserSerializer(user).data,
-            'refresh': str(refresh),
-            'access': str(refresh.access_token),
-            'message': 'ユーザー登録が完了しました。'
-        }, status=status.HTTP_201_CREATED)
+        return Response(token_response_data(user, 'ユーザー登録が完了しました。'), status=status.HTTP_201_CREATED)
 
 class UserLoginView(TokenObtainPairView):
     """ユーザーログイン"""
     permission_classes = [permissions.AllowAny]
+    # ハッシュを計算する前に、IPアドレスごとの試行と（メールアドレス, IPアドレス）ごとの失敗の回数で弾く
+    throttle_classes = [LoginIPThrottle, LoginEmailThrottle]
 
     def post(self, request, *args, **kwargs):
         serializer = UserLoginSerializer(data=request.data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
+        if not serializer.is_valid():
+            LoginEmailThrottle().record_failure(request, self)
+            raise ValidationError(serializer.errors)
         user = serializer.validated_data['user']
+        LoginEmailThrottle().record_success(request, self)
         
-        refresh = RefreshToken.for_user(user)
-        return Response({
-            'user': UserSerializer(user).data,
-            'refresh': str(refresh),
-            'access': str(refresh.access_token),
-            'message': 'ログインしました。'
-        })
+        return Response(token_response_data(user, 'ログインしました。'))
 
 class UserLogoutView(APIView):
     """ユーザーログアウト"""
@@ -145,7 +71,7 @@ class UserLogoutView(APIView):
         except Exception as e:
             return Response({'error': 'ログアウトに失敗しました。'}, status=status.HTTP_400_BAD_REQUEST)
 
-class UserProfileView(generics.RetrieveUpdateAPIView):
+class UserProfileView(ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     """ユーザープロフィール取得・更新"""
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -153,6 +79,20 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     def get_object(self):
         return self.request.user
 
+    def get_validators(self, request, lock=False):
+        user = request.user
+        updated_at = user.updated_at
+        if lock:
+            updated_at = User.objects.select_for_update().filter(pk=user.pk).values_list(
+                'updated_at', flat=True
+            ).first()
+        return make_etag('profile', user.pk, updated_at.isoformat(), request.accepted_media_type), updated_at
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            self.check_write_preconditions()
+            super().perform_update(serializer)
+
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return UserSerializer
@@ -170,9 +110,4 @@ class PasswordChangeView(APIView):
         user.set_password(serializer.validated_data['new_password'])
         user.save()
         
-        return Response({'message': 'パスワードを変更しました。'}, status=status.HTTP_200_OK)
-        user = request.user
-        user.set_password(serializer.validated_data['new_password'])
-        user.save()
-        
         return Response({'message': 'パスワードを変更しました。'}, status=status.HTTP_200_OK)
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""ETag / Last-Modified による条件付きリクエスト
+
+検証子はレスポンス本体をシリアライズせずに求められる値（ユーザーごとのバージョン、
+updated_at など）から作る。GET/HEADは一致すれば304、更新系は If-Match が一致しなければ412を返す。
+"""
+import datetime
+import hashlib
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = '他の操作で更新されています。最新の内容を取得してください。'
+    default_code = 'precondition_failed'
+
+
+def make_etag(*parts):
+    """検証子の材料から強いETagを作る"""
+    material = '|'.join('' if part is None else str(part) for part in parts)
+    return quote_etag(hashlib.sha1(material.encode()).hexdigest())
+
+
+def _timestamp(value):
+    if isinstance(value, datetime.datetime):
+        return int(value.timestamp())
+    return int(value) if value else None
+
+
+def check_preconditions(request, etag=None, last_modified=None):
+    """条件に一致した場合は 304 / 412 のレスポンスを返す（それ以外はNone）"""
+    return get_conditional_response(request, etag=etag, last_modified=_timestamp(last_modified))
+
+
+def set_validators(response, etag=None, last_modified=None):
+    if response.status_code in (200, 304):
+        if etag:
+            response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(_timestamp(last_modified))
+    return response
+
+
+class ConditionalGetMixin:
+    """get_validators() が返す (ETag, 最終更新日時) で条件付きリクエストを処理する
+
+    検証子は本体を作る前に求める。作成中に更新された場合は古い検証子が付くが、
+    次のリクエストで一致しないだけなので安全側になる。
+    """
+
+    def get_validators(self, request, lock=False):
+        """(ETag, 最終更新日時) を返す。lock=True は更新前の確認用（行ロックを取る）"""
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        response = check_preconditions(request, etag, last_modified)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
+
+    def check_write_preconditions(self):
+        """If-Match / If-Unmodified-Since を確認する（保存と同じトランザクション内で呼び出す）"""
+        request = self.request
+        if 'HTTP_IF_MATCH' not in request.META and 'HTTP_IF_UNMODIFIED_SINCE' not in request.META:
+            return
+        etag, last_modified = self.get_validators(request, lock=True)
+        if check_preconditions(request, etag, last_modified) is not None:
+            raise PreconditionFailed()
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        return set_validators(response, *self.get_validators(request))
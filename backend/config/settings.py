@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from decouple import config
 from datetime import timedelta
@@ -114,7 +115,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -126,6 +127,12 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    # ログイン・登録の試行回数の制限（accounts.throttles）。login_email は（メールアドレス, IPアドレス）ごとの失敗だけを数える
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': config('LOGIN_THROTTLE_IP_RATE', default='30/min'),
+        'login_email': config('LOGIN_THROTTLE_EMAIL_RATE', default='10/hour'),
+        'register_ip': config('REGISTER_THROTTLE_IP_RATE', default='10/hour'),
+    },
 }
 
 # JWT settings
@@ -150,12 +157,116 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
     'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.TokenRefreshSerializer',
     'JTI_CLAIM': 'jti',
     'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Cache settings
+# TODO_CACHE_URL / USER_CACHE_URL: redis://host:port/db ならRedis（redisパッケージが必要）、
+# file:///path ならファイル、未指定ならプロセス内メモリ
+def _cache_config(url, name='todos'):
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': url}
+    if url.startswith('file://'):
+        return {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': url[len('file://'):]}
+    return {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': name}
+
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'todos': _cache_config(config('TODO_CACHE_URL', default='')),
+    'users': _cache_config(config('USER_CACHE_URL', default=''), name='users'),
+}
+
+# User cache settings
+# JWT認証でのユーザーのキャッシュ（CACHESのエイリアス）と有効期間（秒、0で無効）。
+# プロセス内メモリの場合、他のプロセスでの変更はこの時間が過ぎるまで反映されない
+USER_CACHE_ALIAS = 'users'
+USER_CACHE_TIMEOUT = config('USER_CACHE_TIMEOUT', default=60, cast=int)
+# 読み取り専用のエンドポイント（TokenUserJWTAuthentication を指定したビュー）では、
+# DBを読まずにトークンの内容だけでユーザーを扱う（無効化したユーザーもトークンの期限までは通る）
+USER_TRUST_TOKEN_FOR_READS = config('USER_TRUST_TOKEN_FOR_READS', default=False, cast=bool)
+
+# Token blacklist settings
+# 無効化したトークンの確認の前に使うブルームフィルタ: 'auto'（USER_CACHE_URL で共有キャッシュを指定した場合だけ）/ 'on' / 'off'
+TOKEN_BLACKLIST_FILTER = config('TOKEN_BLACKLIST_FILTER', default='auto')
+# フィルタの初期の件数・偽陽性率と、期限切れを取り除くために作り直す間隔（秒）
+TOKEN_BLACKLIST_FILTER_CAPACITY = config('TOKEN_BLACKLIST_FILTER_CAPACITY', default=1000000, cast=int)
+TOKEN_BLACKLIST_FILTER_ERROR_RATE = config('TOKEN_BLACKLIST_FILTER_ERROR_RATE', default=0.001, cast=float)
+TOKEN_BLACKLIST_FILTER_REBUILD = config('TOKEN_BLACKLIST_FILTER_REBUILD', default=3600, cast=int)
+# 期限切れの記録の削除（manage.py purge_blacklisted_tokens）で1回に削除する件数
+TOKEN_BLACKLIST_PURGE_BATCH_SIZE = config('TOKEN_BLACKLIST_PURGE_BATCH_SIZE', default=10000, cast=int)
+
+# Password hashing settings
+# 新しく保存するパスワードのハッシュ: 'scrypt' / 'argon2'（argon2-cffi が必要）/ 'pbkdf2_sha256'。
+# 他の方式やコストで保存されたハッシュも検証でき、ログインに成功したときに現在の設定で保存し直す
+PASSWORD_HASHER = config('PASSWORD_HASHER', default='scrypt')
+_PASSWORD_HASHERS = {
+    'scrypt': 'accounts.hashers.ScryptPasswordHasher',
+    'argon2': 'accounts.hashers.Argon2PasswordHasher',
+    'pbkdf2_sha256': 'accounts.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    path for name, path in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER
+] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+# 各方式のコスト（変更すると、ログインしたユーザーから順に新しいコストで保存し直される）
+PASSWORD_SCRYPT_WORK_FACTOR = config('PASSWORD_SCRYPT_WORK_FACTOR', default=2 ** 14, cast=int)
+PASSWORD_SCRYPT_BLOCK_SIZE = config('PASSWORD_SCRYPT_BLOCK_SIZE', default=8, cast=int)
+PASSWORD_SCRYPT_PARALLELISM = config('PASSWORD_SCRYPT_PARALLELISM', default=1, cast=int)
+PASSWORD_ARGON2_TIME_COST = config('PASSWORD_ARGON2_TIME_COST', default=2, cast=int)
+PASSWORD_ARGON2_MEMORY_COST = config('PASSWORD_ARGON2_MEMORY_COST', default=19456, cast=int)
+PASSWORD_ARGON2_PARALLELISM = config('PASSWORD_ARGON2_PARALLELISM', default=1, cast=int)
+PASSWORD_PBKDF2_ITERATIONS = config('PASSWORD_PBKDF2_ITERATIONS', default=600000, cast=int)
+# 非同期ビューでハッシュを計算するスレッドの数
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=os.cpu_count() or 1, cast=int)
+# ASGIで動かす場合に、ログイン・登録を非同期ビューで処理する（ハッシュの計算は上のスレッドで行う）
+AUTH_ASYNC_VIEWS = config('AUTH_ASYNC_VIEWS', default=False, cast=bool)
+
+# Todo settings
+# 一覧の並び順: 'index'（order_indexの整数）または 'rank'（辞書順キー。moveエンドポイントで1行だけ更新）
+TODO_ORDERING_MODE = config('TODO_ORDERING_MODE', default='index')
+# 並び順キーがこの長さを超えたらバックグラウンドで振り直す
+TODO_RANK_MAX_LENGTH = config('TODO_RANK_MAX_LENGTH', default=32, cast=int)
+# 全文検索のバックエンド: 'auto'（PostgreSQL・SQLiteは全文検索インデックス、それ以外はicontains）またはクラスのパス
+TODO_SEARCH_BACKEND = config('TODO_SEARCH_BACKEND', default='auto')
+# Todo一覧キャッシュの保存先（CACHESのエイリアス）と有効期間（秒、0で無効）
+TODO_CACHE_ALIAS = 'todos'
+TODO_LIST_CACHE_TIMEOUT = config('TODO_LIST_CACHE_TIMEOUT', default=300, cast=int)
+# 一覧キャッシュと、一覧・統計・カテゴリ一覧の検証子（ETag）に使うユーザーごとのバージョン:
+# 'auto'（TODO_CACHE_URL で共有キャッシュを指定した場合だけ）/ 'on' / 'off'
+TODO_LIST_CACHE = config('TODO_LIST_CACHE', default='auto')
+# バージョンの保存期間（秒。期限が切れると新しいバージョンになり、次の読み込みがキャッシュミスになるだけ）
+TODO_LIST_VERSION_TIMEOUT = config('TODO_LIST_VERSION_TIMEOUT', default=86400, cast=int)
+# 差分同期: 削除記録の保存日数（これより古いカーソルは全件取得し直し）と、カーソルより前に遡る秒数
+TODO_TOMBSTONE_RETENTION_DAYS = config('TODO_TOMBSTONE_RETENTION_DAYS', default=30, cast=int)
+TODO_SYNC_SAFETY_WINDOW = config('TODO_SYNC_SAFETY_WINDOW', default=5, cast=int)
+# 変更イベント（SSE）: 配信バックエンド、接続ごとのキューの上限、ハートビート間隔・接続の最大時間（秒）
+TODO_EVENTS_BACKEND = config('TODO_EVENTS_BACKEND', default='todos.events.LocalEventBackend')
+TODO_EVENTS_REDIS_URL = config('TODO_EVENTS_REDIS_URL', default='redis://localhost:6379/0')
+TODO_EVENTS_QUEUE_SIZE = config('TODO_EVENTS_QUEUE_SIZE', default=100, cast=int)
+TODO_EVENTS_HEARTBEAT = config('TODO_EVENTS_HEARTBEAT', default=15, cast=int)
+TODO_EVENTS_MAX_AGE = config('TODO_EVENTS_MAX_AGE', default=600, cast=int)
+TODO_EVENTS_RETRY_MS = config('TODO_EVENTS_RETRY_MS', default=3000, cast=int)
+# ASGIで動かす場合に、一覧・詳細・完了切り替え・統計を非同期ビューで処理する
+TODO_ASYNC_VIEWS = config('TODO_ASYNC_VIEWS', default=False, cast=bool)
+# 一括操作（/api/todos/batch/）で1リクエストに含められる操作の数
+TODO_BATCH_MAX_OPERATIONS = config('TODO_BATCH_MAX_OPERATIONS', default=100, cast=int)
+# 一括の完了・未完了・削除で1文に含める件数（削除はこの件数ずつ繰り返す）
+TODO_BULK_CHUNK_SIZE = config('TODO_BULK_CHUNK_SIZE', default=500, cast=int)
+# アーカイブ（manage.py archive_todos）: 完了からこの日数がたったTodoを移す。1回にコミットする件数
+TODO_ARCHIVE_AFTER_DAYS = config('TODO_ARCHIVE_AFTER_DAYS', default=30, cast=int)
+TODO_ARCHIVE_BATCH_SIZE = config('TODO_ARCHIVE_BATCH_SIZE', default=1000, cast=int)
+# インポート: 1回に検証・作成する件数と、レスポンスに含めるエラーの最大件数
+TODO_IMPORT_CHUNK_SIZE = config('TODO_IMPORT_CHUNK_SIZE', default=1000, cast=int)
+TODO_IMPORT_MAX_ERRORS = config('TODO_IMPORT_MAX_ERRORS', default=100, cast=int)
+# エクスポート: DBから1回に読み込む件数（カテゴリもこの件数ごとにまとめて取得する）
+TODO_EXPORT_CHUNK_SIZE = config('TODO_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -0,0 +1,83 @@
+"""完了済みTodoのアーカイブ
+
+完了から TODO_ARCHIVE_AFTER_DAYS 日以上たったTodoを ArchivedTodo に移し、一覧のクエリや
+インデックスが走査するTodoテーブルを小さく保つ。TODO_ARCHIVE_BATCH_SIZE 件ずつコミットする。
+
+- カテゴリは名前のリストとして写し、カテゴリの関連・検索ドキュメントの行は削除する
+- 統計カウンタは総数・完了数・カテゴリ別の件数から差し引き、日別の完了数は残す
+  （今日・今週の完了数はアーカイブしても変わらない）
+- 差分同期・変更イベントには、Todoの一覧から消えたものとして伝える
+"""
+import datetime
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .cache import invalidate_todo_cache
+from .events import publish_todo_event
+from .models import ArchivedTodo, Todo, TodoCategory, Tombstone
+from .operations import delete_related_rows
+from .stats import StatsDelta
+from .sync import record_deletions
+
+FIELDS = ['id', 'name', 'description', 'priority', 'due_date', 'completed_at', 'created_at']
+
+
+def archive_cutoff(now=None, days=None):
+    """この日時より前に完了したTodoがアーカイブの対象"""
+    if days is None:
+        days = settings.TODO_ARCHIVE_AFTER_DAYS
+    return (now or timezone.now()) - datetime.timedelta(days=days)
+
+
+def archivable_todos(before):
+    return Todo.objects.filter(completed=True, completed_at__lt=before)
+
+
+def archive_chunk(user_id, before, limit):
+    """ユーザーのアーカイブ対象を古いものから最大 limit 件アーカイブし、IDのリストを返す"""
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            archivable_todos(before).filter(user_id=user_id).select_for_update()
+            .order_by('completed_at', 'id').values(*FIELDS)[:limit]
+        )
+        if not rows:
+            return []
+        ids = [row['id'] for row in rows]
+
+        delta = StatsDelta(user_id)
+        # 日別の完了数は残すので、総数・完了数だけを差し引く
+        delta.total -= len(ids)
+        delta.completed -= len(ids)
+        names = defaultdict(list)
+        links = TodoCategory.objects.filter(todo_id__in=ids).order_by('category__name').values_list(
+            'todo_id', 'category_id', 'category__name'
+        )
+        for todo_id, category_id, name in links:
+            names[todo_id].append(name)
+            delta.add_categories([category_id], total=-1, completed=-1)
+
+        ArchivedTodo.objects.bulk_create([
+            ArchivedTodo(user_id=user_id, categories=names.get(row['id'], []), archived_at=now, **row)
+            for row in rows
+        ])
+        delete_related_rows(ids)
+        Todo.objects.filter(id__in=ids)._raw_delete(Todo.objects.db)
+        delta.apply()
+        record_deletions(user_id, Tombstone.KIND_TODO, ids)
+        invalidate_todo_cache(user_id)
+        publish_todo_event(user_id, 'archived', ids)
+    return ids
+
+
+def archive_todos(user_id, before=None, batch_size=None):
+    """ユーザーの before より前に完了したTodoをすべてアーカイブし、件数を返す"""
+    before = before or archive_cutoff()
+    batch_size = batch_size or settings.TODO_ARCHIVE_BATCH_SIZE
+    count = 0
+    while True:
+        ids = archive_chunk(user_id, before, batch_size)
+        count += len(ids)
+        if len(ids) < batch_size:
+            return count
@@ -0,0 +1,181 @@
+"""ASGI向けの非同期ビュー（TODO_ASYNC_VIEWS=True のとき urls.py で同期版と差し替える）
+
+一覧・詳細・統計のGETと完了切り替えを、DRFのビュークラスを通さずに非同期で処理する。
+認証・キャッシュ・条件付きGET・レスポンスの内容は同期版と同じ（レスポンスはJSONのみ）。
+GET以外のメソッドは同期版のビューに委譲する。
+
+非同期ORMでもトランザクションは扱えないため、完了切り替えの更新だけは sync_to_async で実行する。
+なお Django 4.2 の非同期ORMは内部でスレッドプールを使うので、クエリ自体の実行方法は変わらない。
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from accounts.authentication import AsyncJWTAuthentication
+from .cache import acached_list_data, get_list_state
+from config.conditional import check_preconditions, set_validators
+from .fieldsets import TodoFieldset, categories_prefetch
+from .models import Todo
+from .serializers import TodoSerializer, TodoToggleSerializer
+from .stats import aread_stats
+from . import views
+
+renderer = JSONRenderer()
+
+_sync_list_view = views.TodoListCreateView.as_view()
+_sync_detail_view = views.TodoDetailView.as_view()
+
+
+def _render(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(renderer.render(data), status=status_code, content_type=renderer.media_type)
+
+
+def _error(exc):
+    """DRFの例外ハンドラと同じ形式のエラーレスポンス"""
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = _render(data, exc.status_code)
+    if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+        response['WWW-Authenticate'] = 'Bearer realm="api"'
+    return response
+
+
+async def _authenticated_request(request):
+    """JWTで認証したDRFのRequestを返す
+
+    トークンがなければ NotAuthenticated、不正なら同期版と同じ AuthenticationFailed / InvalidToken を送出する。
+    """
+    user = await AsyncJWTAuthentication().aauthenticate(request)
+    if user is None:
+        raise NotAuthenticated()
+    drf_request = Request(request)
+    drf_request.user = user
+    drf_request.accepted_renderer = renderer
+    drf_request.accepted_media_type = renderer.media_type
+    return drf_request
+
+
+def _csrf_exempt(view):
+    """DRFのビューと同様にCSRFチェックを外す（Cookieではなくトークンで認証するため）
+
+    Django 4.2 の csrf_exempt は非同期関数をラップすると同期ビューになってしまうので、属性だけを付ける。
+    """
+    view.csrf_exempt = True
+    return view
+
+
+def _is_read(request):
+    return request.method in ('GET', 'HEAD')
+
+
+@_csrf_exempt
+async def todo_list(request):
+    """Todo一覧取得（POSTは同期版に委譲）"""
+    if not _is_read(request):
+        return await sync_to_async(_sync_list_view)(request)
+    try:
+        drf_request = await _authenticated_request(request)
+    except APIException as exc:
+        return _error(exc)
+
+    user = drf_request.user
+    view = views.TodoListCreateView(request=drf_request, args=(), kwargs={}, format_kwarg=None)
+    version, modified = await sync_to_async(get_list_state)(user.pk)
+    etag, last_modified = views.todo_list_validators(drf_request, version, modified)
+    response = check_preconditions(request, etag, last_modified)
+    if response is not None:
+        return set_validators(response, etag, last_modified)
+
+    async def build():
+        fieldset = TodoFieldset.from_request(drf_request)
+        # カテゴリの絞り込みは選択肢の検証でクエリを発行するので、フィルターはスレッドで実行する
+        queryset = await sync_to_async(view.filter_queryset, thread_sensitive=False)(view.get_queryset())
+        queryset = fieldset.values(queryset, view)
+        paginator = view.paginator
+        page = await paginator.apaginate_queryset(queryset, drf_request, view)
+        data = await fieldset.abuild(page if page is not None else [row async for row in queryset])
+        if page is not None:
+            data = paginator.get_paginated_response(data).data
+        return data
+
+    try:
+        data = await acached_list_data(drf_request, version, build)
+    except APIException as exc:
+        return _error(exc)
+    return set_validators(_render(data), etag, last_modified)
+
+
+@_csrf_exempt
+async def todo_detail(request, pk):
+    """Todo詳細取得（更新・削除は同期版に委譲）"""
+    if not _is_read(request):
+        return await sync_to_async(_sync_detail_view)(request, pk=pk)
+    try:
+        drf_request = await _authenticated_request(request)
+    except APIException as exc:
+        return _error(exc)
+
+    row = await views.todo_detail_queryset(drf_request.user, pk).afirst()
+    if row is None:
+        return _error(NotFound())
+    etag, last_modified = views.todo_detail_validators(drf_request, pk, row)
+    response = check_preconditions(request, etag, last_modified)
+    if response is not None:
+        return set_validators(response, etag, last_modified)
+
+    todo = await Todo.objects.filter(pk=pk, user=drf_request.user).prefetch_related(
+        categories_prefetch()
+    ).afirst()
+    if todo is None:
+        return _error(NotFound())
+    data = TodoSerializer(todo, context={'request': drf_request}).data
+    return set_validators(_render(data), etag, last_modified)
+
+
+@_csrf_exempt
+async def toggle_todo(request, pk):
+    """Todo完了状態切り替え（`?minimal=true` で {id, completed, completed_at} のみ）"""
+    if request.method != 'PATCH':
+        return await sync_to_async(views.toggle_todo)(request, pk=pk)
+    try:
+        drf_request = await _authenticated_request(request)
+    except APIException as exc:
+        return _error(exc)
+
+    result = await sync_to_async(views.toggle_and_notify)(drf_request.user.pk, pk)
+    if result is None:
+        return _render({'error': 'Todoが見つかりません。'}, status.HTTP_404_NOT_FOUND)
+    if drf_request.query_params.get('minimal') in ('1', 'true'):
+        return _render(TodoToggleSerializer(result).data)
+
+    todo = await views.toggled_todo_queryset(drf_request.user.pk, pk).afirst()
+    if todo is None:
+        return _render({'error': 'Todoが見つかりません。'}, status.HTTP_404_NOT_FOUND)
+    return _render(TodoSerializer(todo, context={'request': drf_request}).data)
+
+
+@_csrf_exempt
+async def todo_stats(request):
+    """Todo統計情報"""
+    if not _is_read(request):
+        return await sync_to_async(views.todo_stats)(request)
+    try:
+        drf_request = await _authenticated_request(request)
+    except APIException as exc:
+        return _error(exc)
+
+    user = drf_request.user
+    now = timezone.now()
+    version, _ = await sync_to_async(get_list_state)(user.pk)
+    etag = None
+    if version is not None:
+        overdue_count = await views.overdue_queryset(user, now).acount()
+        etag = views.todo_stats_etag(drf_request, now, version, overdue_count)
+        response = check_preconditions(request, etag)
+        if response is not None:
+            return set_validators(response, etag)
+
+    stats = await aread_stats(user, now)
+    return set_validators(_render(views.todo_stats_data(stats)), etag)
@@ -0,0 +1,324 @@
+"""Todoの一括操作（POST /api/todos/batch/）
+
+作成・更新・完了切り替え・削除・移動・カテゴリの置き換えを順番に1つのトランザクションで実行する。
+連続する作成・完了切り替え・削除はまとめて、bulk_create や1文のUPDATE/DELETEで処理する。
+
+- atomic=True: 1件でも失敗したら全体を取り消す（実行済みの操作も 424 になる）
+- atomic=False: 操作（まとめた場合はそのまとまり）ごとにセーブポイントを作り、失敗したものだけを取り消す
+
+結果は操作ごとに {'index', 'op', 'status', 'id' / 'data' / 'errors'} を返す。
+"""
+from collections import defaultdict
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import BooleanField, DateTimeField
+from django.utils import timezone
+from rest_framework import status
+from .cache import invalidate_todo_cache
+from .events import publish_todo_event
+from .models import Category, Todo, TodoCategory
+from .operations import (
+    RankConflict, delete_todos, move_todo_between, schedule_rank_rebalance, set_todo_categories,
+    update_todos_by_case,
+)
+from .ranking import keys_between
+from .search import index_todos
+from .serializers import (
+    TodoBatchOperationSerializer,
+    TodoCreateSerializer,
+    TodoMoveSerializer,
+    TodoSetCategoriesSerializer,
+    TodoUpdateSerializer,
+)
+from .stats import StatsDelta
+
+# まとめて実行できる操作
+BULK_OPERATIONS = ('create', 'toggle', 'delete')
+
+DATA_SERIALIZERS = {
+    'create': TodoCreateSerializer,
+    'update': TodoUpdateSerializer,
+    'move': TodoMoveSerializer,
+    'set_categories': TodoSetCategoriesSerializer,
+}
+
+NOT_FOUND = {'error': 'Todoが見つかりません。'}
+NOT_EXECUTED = {'error': '他の操作が失敗したため実行されませんでした。'}
+
+
+class OperationFailed(Exception):
+    """1件の操作の失敗（その操作のセーブポイントを取り消す）"""
+
+    def __init__(self, status_code, errors):
+        self.status_code = status_code
+        self.errors = errors
+
+
+class _Rollback(Exception):
+    """atomic=True で失敗した場合に全体を取り消す"""
+
+
+def _failure(status_code, errors):
+    return {'status': status_code, 'errors': errors}
+
+
+def _validate(index, raw, operations):
+    """操作1件を検証し、(操作, 失敗した場合の結果) を返す"""
+    serializer = TodoBatchOperationSerializer(data=raw)
+    if not serializer.is_valid():
+        return None, _failure(status.HTTP_400_BAD_REQUEST, serializer.errors)
+    operation = dict(serializer.validated_data)
+
+    ref = operation.get('id')
+    if isinstance(ref, int) and not (0 <= ref < index and operations[ref].get('op') == 'create'):
+        return None, _failure(
+            status.HTTP_400_BAD_REQUEST, {'id': ['この操作より前のcreateの番号を指定してください。']}
+        )
+
+    serializer_class = DATA_SERIALIZERS.get(operation['op'])
+    if serializer_class is not None:
+        data_serializer = serializer_class(data=operation['data'], partial=operation['op'] == 'update')
+        if not data_serializer.is_valid():
+            return None, _failure(status.HTTP_400_BAD_REQUEST, data_serializer.errors)
+        operation['data'] = data_serializer.validated_data
+    return operation, None
+
+
+class BatchRunner:
+    """1リクエスト分の一括操作"""
+
+    def __init__(self, user, operations, atomic=True):
+        self.user = user
+        self.raw_operations = operations
+        self.atomic = atomic
+        self.operations = []
+        self.results = [None] * len(operations)
+        self.changed = defaultdict(list)
+
+    def run(self):
+        """結果のリストを返す（atomic=True で失敗した場合は全件を取り消す）"""
+        for index, raw in enumerate(self.raw_operations):
+            operation, failure = _validate(index, raw, self.raw_operations)
+            self.operations.append(operation)
+            if failure is not None:
+                self._set(index, failure)
+
+        if self.atomic and self.has_failures():
+            return self._abort()
+        try:
+            with transaction.atomic():
+                self._execute()
+                if self.atomic and self.has_failures():
+                    raise _Rollback
+                self._notify()
+        except _Rollback:
+            return self._abort()
+        return self.results
+
+    def has_failures(self):
+        return any(result is not None and result['status'] >= 400 for result in self.results)
+
+    def _set(self, index, result):
+        self.results[index] = {'index': index, 'op': self.raw_operations[index].get('op'), **result}
+
+    def _abort(self):
+        for index, result in enumerate(self.results):
+            if result is None or result['status'] < 400:
+                self._set(index, _failure(status.HTTP_424_FAILED_DEPENDENCY, NOT_EXECUTED))
+        return self.results
+
+    def _resolve(self, operation):
+        """操作対象のTodo IDを返す（'$<番号>' は作成したTodoのID）"""
+        ref = operation['id']
+        if not isinstance(ref, int):
+            return ref
+        created = self.results[ref]
+        if created is None or created['status'] >= 400:
+            raise OperationFailed(status.HTTP_424_FAILED_DEPENDENCY, {'error': '参照先のcreateが失敗しました。'})
+        return created['id']
+
+    def _groups(self):
+        """実行する操作を、まとめて処理できる連続した操作ごとに区切る"""
+        group = []
+        for index, operation in enumerate(self.operations):
+            if operation is None:
+                continue
+            if group and (operation['op'] != group[0][1]['op'] or operation['op'] not in BULK_OPERATIONS):
+                yield group
+                group = []
+            group.append((index, operation))
+        if group:
+            yield group
+
+    def _execute(self):
+        for group in self._groups():
+            if self.atomic and self.has_failures():
+                break
+            op = group[0][1]['op']
+            try:
+                with transaction.atomic():
+                    if op in BULK_OPERATIONS:
+                        getattr(self, f'_{op}_many')(group)
+                    else:
+                        [(index, operation)] = group
+                        self._set(index, getattr(self, f'_{op}')(operation))
+            except OperationFailed as exc:
+                self._set(group[0][0], _failure(exc.status_code, exc.errors))
+
+    def _notify(self):
+        if not self.changed:
+            return
+        invalidate_todo_cache(self.user.id)
+        for event_type, ids in self.changed.items():
+            publish_todo_event(self.user.id, event_type, ids)
+
+    def _resolve_group(self, group):
+        """まとめて処理する操作のTodo IDを解決する（参照先が失敗した操作は結果を設定して除く）"""
+        resolved = []
+        for index, operation in group:
+            try:
+                resolved.append((index, self._resolve(operation)))
+            except OperationFailed as exc:
+                self._set(index, _failure(exc.status_code, exc.errors))
+        return resolved
+
+    def _create_many(self, group):
+        """連続する作成を bulk_create と集計済みの統計更新で行う"""
+        user_id = self.user.id
+        todos = Todo.objects.filter(user_id=user_id)
+        last_rank = todos.order_by('-rank').values_list('rank', flat=True).first()
+        ranks = keys_between(last_rank, None, len(group))
+        order_index = 0
+        if settings.TODO_ORDERING_MODE != 'rank':
+            order_index = todos.aggregate(max_order=models.Max('order_index'))['max_order'] or 0
+
+        created = []
+        for offset, (index, operation) in enumerate(group):
+            data = dict(operation['data'])
+            category_ids = data.pop('category_ids', None) or []
+            if settings.TODO_ORDERING_MODE != 'rank':
+                data['order_index'] = order_index + offset + 1
+            created.append((index, Todo(user_id=user_id, rank=ranks[offset], **data), category_ids))
+        Todo.objects.bulk_create([todo for _, todo, _ in created])
+
+        wanted = set().union(*(category_ids for _, _, category_ids in created))
+        owned = set(
+            Category.objects.filter(user_id=user_id, id__in=wanted).values_list('id', flat=True)
+        ) if wanted else set()
+        delta = StatsDelta(user_id)
+        links = []
+        for index, todo, category_ids in created:
+            category_ids = owned.intersection(category_ids)
+            links.extend(TodoCategory(todo=todo, category_id=category_id) for category_id in category_ids)
+            delta.add_todo(todo)
+            delta.add_categories(category_ids, total=1)
+            self._set(index, {'status': status.HTTP_201_CREATED, 'id': todo.pk})
+            self.changed['created'].append(todo.pk)
+        TodoCategory.objects.bulk_create(links)
+        delta.apply()
+        index_todos([todo for _, todo, _ in created])
+        schedule_rank_rebalance(user_id, ranks[-1])
+
+    def _toggle_many(self, group):
+        """連続する完了切り替えを、行ロック付きの読み込み1回とCASE式のUPDATE1回で行う"""
+        user_id = self.user.id
+        resolved = self._resolve_group(group)
+        now = timezone.now()
+        flips = defaultdict(int)
+        for _, todo_id in resolved:
+            flips[todo_id] += 1
+        old = {
+            row['id']: row for row in Todo.objects.select_for_update().filter(
+                user_id=user_id, id__in=list(flips)
+            ).values('id', 'completed', 'completed_at', 'due_date')
+        }
+
+        # 各操作は順番に実行した場合と同じ結果にする（完了日時は反転するたびに付け直す）
+        values = {}
+        delta = StatsDelta(user_id)
+        category_changes = {}
+        for todo_id, row in old.items():
+            completed = row['completed'] ^ (flips[todo_id] % 2 == 1)
+            completed_at = now if completed else None
+            if completed != row['completed']:
+                category_changes[todo_id] = 1 if completed else -1
+            values[todo_id] = {'completed': completed, 'completed_at': completed_at}
+            delta.add(row['completed'], row['completed_at'], row['due_date'], sign=-1)
+            delta.add(completed, completed_at, row['due_date'])
+        if values:
+            update_todos_by_case(
+                user_id, values, now, completed=BooleanField(), completed_at=DateTimeField(null=True)
+            )
+        if category_changes:
+            for todo_id, category_id in TodoCategory.objects.filter(
+                todo_id__in=list(category_changes)
+            ).values_list('todo_id', 'category_id'):
+                delta.add_categories([category_id], completed=category_changes[todo_id])
+        delta.apply()
+
+        state = {todo_id: row['completed'] for todo_id, row in old.items()}
+        for index, todo_id in resolved:
+            if todo_id not in state:
+                self._set(index, _failure(status.HTTP_404_NOT_FOUND, NOT_FOUND))
+                continue
+            state[todo_id] = not state[todo_id]
+            self._set(index, {
+                'status': status.HTTP_200_OK,
+                'id': todo_id,
+                'data': {'completed': state[todo_id], 'completed_at': now if state[todo_id] else None},
+            })
+        self.changed['updated'].extend(values)
+
+    def _delete_many(self, group):
+        """連続する削除を delete_todos でまとめて行う"""
+        resolved = self._resolve_group(group)
+        todos = Todo.objects.filter(user_id=self.user.id, id__in=[todo_id for _, todo_id in resolved])
+        deleted_ids = set(delete_todos(self.user.id, todos))
+
+        for index, todo_id in resolved:
+            if todo_id in deleted_ids:
+                deleted_ids.discard(todo_id)
+                self._set(index, {'status': status.HTTP_204_NO_CONTENT, 'id': todo_id})
+                self.changed['deleted'].append(todo_id)
+            else:
+                self._set(index, _failure(status.HTTP_404_NOT_FOUND, NOT_FOUND))
+
+    def _get_todo(self, operation):
+        todo = Todo.objects.filter(user_id=self.user.id, pk=self._resolve(operation)).first()
+        if todo is None:
+            raise OperationFailed(status.HTTP_404_NOT_FOUND, NOT_FOUND)
+        return todo
+
+    def _update(self, operation):
+        todo = self._get_todo(operation)
+        TodoUpdateSerializer().update(todo, dict(operation['data']))
+        self.changed['updated'].append(todo.pk)
+        return {'status': status.HTTP_200_OK, 'id': todo.pk}
+
+    def _move(self, operation):
+        todo_id = self._resolve(operation)
+        before = operation['data'].get('before')
+        after = operation['data'].get('after')
+        if todo_id in (before, after):
+            raise OperationFailed(status.HTTP_400_BAD_REQUEST, {'error': '移動するTodo自身は指定できません。'})
+        try:
+            rank = move_todo_between(self.user.id, todo_id, before_id=before, after_id=after)
+        except Todo.DoesNotExist:
+            raise OperationFailed(status.HTTP_404_NOT_FOUND, NOT_FOUND)
+        except RankConflict:
+            raise OperationFailed(status.HTTP_400_BAD_REQUEST, {'error': '指定された位置に移動できません。'})
+        self.changed['reordered'].append(todo_id)
+        return {'status': status.HTTP_200_OK, 'id': todo_id, 'data': {'rank': rank}}
+
+    def _set_categories(self, operation):
+        todo = self._get_todo(operation)
+        category_ids = set_todo_categories(todo, operation['data']['category_ids'])
+        # 差分同期で変更が伝わるよう updated_at を進める
+        Todo.objects.filter(pk=todo.pk).update(updated_at=timezone.now())
+        self.changed['updated'].append(todo.pk)
+        return {'status': status.HTTP_200_OK, 'id': todo.pk, 'data': {'category_ids': sorted(category_ids, key=str)}}
+
+
+def run_batch(user, operations, atomic=True):
+    """一括操作を実行し、操作ごとの結果のリストを返す"""
+    return BatchRunner(user, operations, atomic).run()
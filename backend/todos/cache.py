@@ -0,0 +1,169 @@
+"""Todo一覧レスポンスのユーザー別キャッシュ
+
+キーはユーザー、正規化したクエリパラメータ、ユーザーごとのバージョンから作る。
+書き込み処理はコミット後にバージョンを上げるだけで、古いキーは参照されなくなり期限切れで消える。
+
+バージョンはキャッシュに保存するので、プロセス内メモリのキャッシュでは他のプロセスの書き込みが伝わらない。
+TODO_LIST_CACHE='auto' では、TODO_CACHE_URL で共有キャッシュを指定した場合だけキャッシュとバージョンを使う
+（使わない場合は、バージョンから作る一覧・統計の検証子も付けない）。
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from rest_framework.response import Response
+
+HITS_KEY = 'todos:metrics:hits'
+MISSES_KEY = 'todos:metrics:misses'
+
+
+def _cache():
+    return caches[settings.TODO_CACHE_ALIAS]
+
+
+def list_state_enabled():
+    mode = settings.TODO_LIST_CACHE
+    if mode == 'auto':
+        return not isinstance(_cache(), LocMemCache)
+    return mode == 'on'
+
+
+def _version_key(user_id):
+    return f'todos:version:{user_id}'
+
+
+def _modified_key(user_id):
+    return f'todos:modified:{user_id}'
+
+
+def _new_version():
+    # キャッシュが消えても以前のバージョンと重ならないよう、時刻から初期値を作る
+    return time.time_ns()
+
+
+def get_list_state(user_id):
+    """ユーザーのTodo一覧の (バージョン, 最終更新時刻のUNIX秒)。使わない設定の場合は (None, None)"""
+    if not list_state_enabled():
+        return None, None
+    cache = _cache()
+    timeout = settings.TODO_LIST_VERSION_TIMEOUT
+    version_key = _version_key(user_id)
+    modified_key = _modified_key(user_id)
+    values = cache.get_many([version_key, modified_key])
+    version = values.get(version_key)
+    modified = values.get(modified_key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(version_key, version, timeout=timeout):
+            version = cache.get(version_key, version)
+    if modified is None:
+        # 不明な場合は「今変更された」とみなす
+        modified = time.time()
+        cache.add(modified_key, modified, timeout=timeout)
+    return version, modified
+
+
+def get_list_version(user_id):
+    """ユーザーのTodo一覧の現在のバージョン"""
+    return get_list_state(user_id)[0]
+
+
+def _bump_version(user_id):
+    cache = _cache()
+    key = _version_key(user_id)
+    timeout = settings.TODO_LIST_VERSION_TIMEOUT
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _new_version(), timeout=timeout)
+    cache.set(_modified_key(user_id), time.time(), timeout=timeout)
+
+
+def invalidate_todo_cache(user_id):
+    """ユーザーのTodo一覧キャッシュを無効にする（トランザクション中ならコミット後）"""
+    if list_state_enabled():
+        transaction.on_commit(lambda: _bump_version(user_id))
+
+
+def _count(key):
+    cache = _cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def cache_metrics():
+    """ヒット数・ミス数・ヒット率"""
+    values = _cache().get_many([HITS_KEY, MISSES_KEY])
+    hits = values.get(HITS_KEY, 0)
+    misses = values.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total * 100, 2) if total else 0,
+    }
+
+
+def request_digest(request):
+    """空の値を除き、パラメータ名の順に並べたクエリ文字列のハッシュ"""
+    params = sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values if value != ''
+    )
+    # ページネーションのリンクは絶対URLなのでホストも含める
+    material = f'{request.get_host()}?{urlencode(params)}'
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+def list_cache_key(request, version):
+    return f'todos:list:{request.user.pk}:{version}:{request_digest(request)}'
+
+
+class CachedListMixin:
+    """list() のレスポンスデータをユーザー別にキャッシュする"""
+
+    def list(self, request, *args, **kwargs):
+        timeout = settings.TODO_LIST_CACHE_TIMEOUT
+        if not timeout or not list_state_enabled():
+            return super().list(request, *args, **kwargs)
+
+        cache = _cache()
+        # クエリより先にバージョンを読む（読み込み中の書き込みは次のバージョンになる）
+        key = list_cache_key(request, get_list_version(request.user.pk))
+        data = cache.get(key)
+        if data is not None:
+            _count(HITS_KEY)
+            return Response(data)
+
+        _count(MISSES_KEY)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, timeout)
+        return response
+
+
+async def acached_list_data(request, version, build):
+    """CachedListMixin の非同期版。build はキャッシュがない場合に一覧データを作るコルーチン関数"""
+    timeout = settings.TODO_LIST_CACHE_TIMEOUT
+    if not timeout or version is None:
+        return await build()
+
+    cache = _cache()
+    key = list_cache_key(request, version)
+    data = await cache.aget(key)
+    if data is not None:
+        await sync_to_async(_count)(HITS_KEY)
+        return data
+
+    await sync_to_async(_count)(MISSES_KEY)
+    data = await build()
+    await cache.aset(key, data, timeout)
+    return data
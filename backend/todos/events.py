@@ -0,0 +1,188 @@
+"""Todoの変更イベントの配信（Server-Sent Events用）
+
+書き込み処理はコミット後に publish_todo_event() でイベントを送り、SSEの接続ごとに
+プロセス内の有限キューへ配る。他のワーカーへの配信はバックエンドを差し替えて行う。
+
+- LocalEventBackend: 同じプロセス内だけに配信する（開発・単一ワーカー用）
+- RedisEventBackend: Redis の Pub/Sub で全ワーカーに配信する（redisパッケージが必要）
+
+イベントには変更の種類とTodoのIDだけを含める。クライアントは受け取ったら
+差分同期（/api/todos/changes/）で内容を取得する。
+"""
+import asyncio
+import itertools
+import json
+import logging
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# キューがあふれた接続に送るイベント（取りこぼしがあるので差分同期し直す）
+RESYNC_EVENT = {'type': 'resync'}
+
+_event_ids = itertools.count(1)
+
+
+class Subscription:
+    """SSE接続1本分の受信キュー。イベントループのスレッドでだけ操作する"""
+
+    def __init__(self, user_id, loop, maxsize):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, event):
+        if self.queue.full():
+            # 読み出しが追いつかない接続は溜まった分を捨て、再同期だけを通知する
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = RESYNC_EVENT
+        self.queue.put_nowait(event)
+
+
+class EventBroker:
+    """プロセス内のユーザーごとの購読者一覧"""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(
+            str(user_id), asyncio.get_running_loop(), settings.TODO_EVENTS_QUEUE_SIZE
+        )
+        with self._lock:
+            self._subscriptions[subscription.user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def dispatch(self, user_id, event):
+        """どのスレッドからでも呼び出せる"""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(str(user_id), ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # イベントループが終了している接続
+                self.unsubscribe(subscription)
+
+
+broker = EventBroker()
+
+
+class LocalEventBackend:
+    """同じプロセス内の接続にだけ配信する"""
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publish(self, user_id, event):
+        self.broker.dispatch(user_id, event)
+
+    def start(self):
+        pass
+
+
+class RedisEventBackend:
+    """Redis の Pub/Sub で全ワーカーに配信する
+
+    受信用のスレッドはSSEの接続を受けたワーカーでだけ起動する。
+    """
+    channel = 'todos:events'
+
+    def __init__(self, broker):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('RedisEventBackend には redis パッケージが必要です。')
+        self.broker = broker
+        self.client = redis.Redis.from_url(settings.TODO_EVENTS_REDIS_URL)
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def publish(self, user_id, event):
+        self.client.publish(self.channel, json.dumps({'user_id': str(user_id), 'event': event}))
+
+    def start(self):
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._listen, daemon=True).start()
+
+    def _listen(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        for message in pubsub.listen():
+            try:
+                payload = json.loads(message['data'])
+                self.broker.dispatch(payload['user_id'], payload['event'])
+            except (ValueError, KeyError, TypeError):
+                logger.warning('不正なイベントを無視しました: %r', message)
+
+
+@lru_cache(maxsize=None)
+def get_event_backend():
+    return import_string(settings.TODO_EVENTS_BACKEND)(broker)
+
+
+def publish_todo_event(user_id, event_type, ids, **extra):
+    """Todoの変更イベント（created / updated / toggled / reordered / deleted）をコミット後に配信する"""
+    event = {'type': event_type, 'ids': [str(todo_id) for todo_id in ids], **extra}
+
+    def send():
+        try:
+            get_event_backend().publish(user_id, event)
+        except Exception:
+            # 配信に失敗しても書き込み自体は成功させる（クライアントは差分同期で追いつく）
+            logger.exception('Todoイベントの配信に失敗しました: user=%s', user_id)
+
+    transaction.on_commit(send)
+
+
+def format_event(event):
+    """SSEの1イベント分のテキスト"""
+    return f'id: {next(_event_ids)}\nevent: {event["type"]}\ndata: {json.dumps(event)}\n\n'
+
+
+async def event_stream(user_id):
+    """ユーザーのイベントをSSE形式で返す非同期ジェネレータ
+
+    一定時間ごとにハートビートのコメントを送り、TODO_EVENTS_MAX_AGE 秒で接続を閉じる
+    （切断を検知できないサーバーでも接続が残り続けないようにするため。
+    EventSourceは自動的に再接続する）。
+    """
+    get_event_backend().start()
+    subscription = broker.subscribe(user_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.TODO_EVENTS_MAX_AGE
+    try:
+        yield f'retry: {settings.TODO_EVENTS_RETRY_MS}\n\n'
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                event = await asyncio.wait_for(
+                    subscription.queue.get(), timeout=min(settings.TODO_EVENTS_HEARTBEAT, remaining)
+                )
+            except asyncio.TimeoutError:
+                yield ': heartbeat\n\n'
+                continue
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
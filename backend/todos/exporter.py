@@ -0,0 +1,171 @@
+"""Todoのエクスポート（NDJSON / CSV / JSON）
+
+モデルのインスタンスは作らず、values() を iterator(chunk_size) で読みながら
+チャンクごとにカテゴリ名を1クエリで取得して書き出す。メモリ使用量は件数に比例しない。
+出力の形式はインポート（todos.importer）でそのまま読み込める。
+"""
+import csv
+import datetime
+import json
+from collections import defaultdict
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from .filters import TodoFilter
+from .models import Category, Todo, TodoCategory
+from .search import get_search_backend
+
+FIELDS = [
+    'id', 'name', 'description', 'completed', 'priority', 'due_date', 'completed_at',
+    'order_index', 'rank', 'created_at', 'updated_at',
+]
+COLUMNS = FIELDS + ['categories']
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+}
+
+
+class ExportRenderer(BaseRenderer):
+    """エクスポートの形式の選択用（`?format=` / Accept）
+
+    本文は StreamingHttpResponse で返すので、このレンダラーが描画するのはエラーのレスポンスだけ。
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False).encode()
+
+
+class NDJSONRenderer(ExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+EXPORT_RENDERERS = [NDJSONRenderer, CSVRenderer, JSONRenderer]
+
+
+def export_queryset(user, params):
+    """TodoFilter の条件と search で絞り込んだエクスポート対象（不正な条件は ValidationError）"""
+    queryset = Todo.objects.filter(user=user)
+    filterset = TodoFilter(params, queryset=queryset)
+    filterset.filters['category'].queryset = Category.objects.filter(user=user)
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    queryset = filterset.qs
+    text = params.get('search', '')
+    if text:
+        queryset = get_search_backend().search(queryset, text, user.pk)
+    # 一覧と同じ並び順（同じ値の行の順番が変わらないよう id を加える）
+    if settings.TODO_ORDERING_MODE == 'rank':
+        return queryset.order_by('rank', '-created_at', 'id')
+    return queryset.order_by('order_index', '-created_at', 'id')
+
+
+def iter_rows(queryset, chunk_size=None):
+    """エクスポートする行（dict）を返す。カテゴリ名はチャンクごとにまとめて取得する"""
+    chunk_size = chunk_size or settings.TODO_EXPORT_CHUNK_SIZE
+    chunk = []
+    for row in queryset.values(*FIELDS).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield from _with_categories(chunk)
+            chunk = []
+    yield from _with_categories(chunk)
+
+
+def _with_categories(rows):
+    if not rows:
+        return
+    names = defaultdict(list)
+    links = TodoCategory.objects.filter(todo_id__in=[row['id'] for row in rows]).order_by(
+        'category__name'
+    ).values_list('todo_id', 'category__name')
+    for todo_id, name in links:
+        names[todo_id].append(name)
+    for row in rows:
+        row['categories'] = names.get(row['id'], [])
+        yield row
+
+
+class ExportJSONEncoder(DjangoJSONEncoder):
+    """日時はCSVと同じく isoformat() のまま書き出す（DjangoJSONEncoder はミリ秒に切り詰めてしまう）"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _json(row):
+    return json.dumps(row, cls=ExportJSONEncoder, ensure_ascii=False)
+
+
+def _csv_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, list):
+        return ';'.join(value)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+class _Echo:
+    """csv.writer の出力をそのまま返す（書き込み先を持たない）"""
+
+    def write(self, value):
+        return value
+
+
+def _batched(lines, size):
+    """小さな文字列を size 件ずつ連結して返す（レスポンスの書き込み回数を減らす）"""
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def _ndjson_lines(rows):
+    for row in rows:
+        yield _json(row) + '\n'
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow([_csv_value(row[column]) for column in COLUMNS])
+
+
+def _json_lines(rows):
+    yield '['
+    separator = ''
+    for row in rows:
+        yield separator + _json(row)
+        separator = ','
+    yield ']\n'
+
+
+WRITERS = {
+    'ndjson': _ndjson_lines,
+    'csv': _csv_lines,
+    'json': _json_lines,
+}
+
+
+def export_lines(queryset, fmt, chunk_size=None):
+    """エクスポートの本文を文字列のイテレータで返す"""
+    chunk_size = chunk_size or settings.TODO_EXPORT_CHUNK_SIZE
+    return _batched(WRITERS[fmt](iter_rows(queryset, chunk_size)), chunk_size)
@@ -0,0 +1,171 @@
+"""Todo一覧のフィールド選択（?fields= / ?expand=）と、シリアライザを通さない一覧の組み立て
+
+一覧は values() で必要な列だけを読み、カテゴリはページ分を1クエリで取得して dict を組み立てる。
+日時・UUIDは TodoSerializer / CategorySerializer のフィールドで変換するので、
+フィールドを指定しない場合は TodoSerializer と同じJSONになる。
+
+- ?fields=id,name,completed  出力するフィールド（カンマ区切り）
+- ?expand=categories         categories をカテゴリのオブジェクトで返す（指定しない場合はIDのリスト）。
+                             ?fields= を指定しない場合は TodoSerializer と同じく常に展開する
+"""
+from django.db.models import Prefetch
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from .models import Category, TodoCategory
+from .serializers import CategorySerializer, TodoSerializer
+
+EXPANDABLE_FIELDS = ('categories',)
+
+
+def categories_prefetch():
+    """Todoのカテゴリを一覧の組み立てと同じ順番（名前順）で読み込むprefetch"""
+    return Prefetch('categories', queryset=Category.objects.order_by('name', 'id'))
+
+
+def _datetime_converter(field):
+    """DateTimeField.to_representation と同じ変換（タイムゾーンは値ごとではなく最初に1回だけ取得する）"""
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = getattr(field, 'timezone', field.default_timezone())
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        if not timezone.is_aware(value):
+            return field.to_representation(value)
+        text = value.astimezone(field_timezone).isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+    return convert
+
+
+def _converters(serializer):
+    """{フィールド名: 値の変換関数} を出力順で返す（変換が不要なフィールドはNone）"""
+    converters = {}
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.DateTimeField):
+            converters[name] = _datetime_converter(field)
+        elif isinstance(field, serializers.UUIDField):
+            converters[name] = field.to_representation
+        else:
+            converters[name] = None
+    return converters
+
+
+def _split(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+class TodoFieldset:
+    """1リクエスト分の出力フィールド"""
+
+    def __init__(self, fields, expand):
+        self.todo_converters = _converters(TodoSerializer())
+        self.fields = fields
+        self.expand = expand
+        self.category_converters = _converters(CategorySerializer()) if 'categories' in expand else None
+
+    @classmethod
+    def default(cls):
+        """TodoSerializer と同じ出力"""
+        return cls(list(_converters(TodoSerializer())), {'categories'})
+
+    @classmethod
+    def from_request(cls, request):
+        all_fields = list(_converters(TodoSerializer()))
+        requested = _split(request.query_params.get('fields'))
+        expand = set(_split(request.query_params.get('expand')))
+
+        unknown = expand - set(EXPANDABLE_FIELDS)
+        if unknown:
+            raise ValidationError({'expand': [f'展開できないフィールドです: {", ".join(sorted(unknown))}']})
+        if not requested:
+            return cls.default()
+        unknown = set(requested) - set(all_fields)
+        if unknown:
+            raise ValidationError({'fields': [f'存在しないフィールドです: {", ".join(sorted(unknown))}']})
+        # 出力の順番は TodoSerializer に揃える
+        return cls([name for name in all_fields if name in requested], expand)
+
+    def columns(self, ordering=()):
+        """values() で読む列（idと、キーセット方式のカーソルに使う並び順の列を含める）"""
+        columns = [name for name in self.fields if name != 'categories']
+        for name in ['id', *(field.lstrip('-') for field in ordering)]:
+            if name not in columns:
+                columns.append(name)
+        return columns
+
+    def values(self, queryset, view):
+        ordering = OrderingFilter().get_ordering(view.request, queryset, view) or []
+        return queryset.prefetch_related(None).values(*self.columns(ordering))
+
+    def category_links(self, todo_ids):
+        """(todo_id, カテゴリの値...) の行。categories を出力しない場合はNone"""
+        if 'categories' not in self.fields:
+            return None
+        links = TodoCategory.objects.filter(todo_id__in=todo_ids).order_by('category__name', 'category_id')
+        if self.category_converters is None:
+            return links.values_list('todo_id', 'category_id')
+        return links.values_list(
+            'todo_id', *[f'category__{name}' for name in self.category_converters]
+        )
+
+    def build(self, rows):
+        """values() の行から一覧の dict のリストを作る"""
+        rows = list(rows)
+        links = self.category_links([row['id'] for row in rows])
+        return self._assemble(rows, [] if links is None else list(links))
+
+    async def abuild(self, rows):
+        links = self.category_links([row['id'] for row in rows])
+        return self._assemble(rows, [] if links is None else [link async for link in links])
+
+    def _category_map(self, links):
+        categories = {}
+        built = {}
+        for todo_id, *values in links:
+            if self.category_converters is None:
+                category = str(values[0])
+            else:
+                # 複数のTodoで共通のカテゴリは1回だけ組み立てる
+                category = built.get(values[0])
+                if category is None:
+                    category = built[values[0]] = {
+                        name: value if convert is None or value is None else convert(value)
+                        for (name, convert), value in zip(self.category_converters.items(), values)
+                    }
+            categories.setdefault(todo_id, []).append(category)
+        return categories
+
+    def _assemble(self, rows, links):
+        categories = self._category_map(links)
+        fields = [
+            (name, None if name == 'categories' else self.todo_converters[name]) for name in self.fields
+        ]
+        data = []
+        for row in rows:
+            item = {}
+            for name, convert in fields:
+                if name == 'categories':
+                    item[name] = categories.get(row['id'], [])
+                    continue
+                value = row[name]
+                item[name] = value if convert is None or value is None else convert(value)
+            data.append(item)
+        return data
+
+
+class TodoFieldsetListMixin:
+    """一覧を TodoFieldset で組み立てる（TodoSerializer を通さない）"""
+
+    def list(self, request, *args, **kwargs):
+        fieldset = TodoFieldset.from_request(request)
+        queryset = fieldset.values(self.filter_queryset(self.get_queryset()), self)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(fieldset.build(page))
+        return Response(fieldset.build(queryset))
@@ -1,6 +1,8 @@
+import json
 import django_filters
+from django.db import connection
 from django.utils import timezone
-from .models import Todo, Category
+from .models import ArchivedTodo, Todo, Category
 
 class TodoFilter(django_filters.FilterSet):
     """Todoフィルター"""
@@ -78,4 +80,29 @@ class TodoFilter(django_filters.FilterSet):
             return queryset.filter(
                 due_date__date__range=[start_of_week.date(), end_of_week.date()]
             )
-        return queryset
\ No newline at end of file
+        return queryset
+
+class ArchivedTodoFilter(django_filters.FilterSet):
+    """アーカイブ済みTodoのフィルター"""
+    
+    priority = django_filters.ChoiceFilter(
+        field_name='priority',
+        choices=ArchivedTodo._meta.get_field('priority').choices
+    )
+    
+    # カテゴリ名（アーカイブ時点の名前）
+    category = django_filters.CharFilter(method='filter_category')
+    
+    # 完了日フィルター
+    completed_at_gte = django_filters.DateFilter(field_name='completed_at__date', lookup_expr='gte')
+    completed_at_lte = django_filters.DateFilter(field_name='completed_at__date', lookup_expr='lte')
+
+    class Meta:
+        model = ArchivedTodo
+        fields = ['priority', 'category', 'completed_at_gte', 'completed_at_lte']
+
+    def filter_category(self, queryset, name, value):
+        if connection.features.supports_json_field_contains:
+            return queryset.filter(categories__contains=[value])
+        # JSONの包含検索がないDB（SQLite）は、保存されたJSONの文字列に引用符付きの名前が含まれるかで判定する
+        return queryset.filter(categories__icontains=json.dumps(value))
@@ -0,0 +1,253 @@
+"""Todoのインポート（NDJSON / CSV / JSON）
+
+入力は行ごとに読み込み、TODO_IMPORT_CHUNK_SIZE 件ずつ検証して bulk_create する。
+チャンクごとにコミットするので、メモリ使用量・トランザクションの大きさは件数に比例しない
+（JSON配列だけは全体を読み込む）。不正な行は飛ばし、行番号とエラーを返す。
+
+1行の形式: {"name", "description", "completed", "priority", "due_date", "categories"}
+categories はカテゴリ名のリスト（CSVでは ; 区切り）で、存在しないカテゴリは作成する。
+"""
+import csv
+import json
+import os
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from .cache import invalidate_todo_cache
+from .events import publish_todo_event
+from .models import Category, Todo, TodoCategory
+from .operations import schedule_rank_rebalance
+from .ranking import key_sequence
+from .search import index_todos
+from .serializers import TodoImportSerializer
+from .stats import StatsDelta
+
+FORMATS = ('ndjson', 'csv', 'json')
+
+CONTENT_TYPES = {
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'text/csv': 'csv',
+    'application/json': 'json',
+}
+
+EXTENSIONS = {
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.csv': 'csv',
+    '.json': 'json',
+}
+
+
+class ImportFormatError(ValueError):
+    """入力全体を読み込めない（形式が不明、CSVのヘッダーがないなど）"""
+
+
+def format_for_filename(filename):
+    fmt = EXTENSIONS.get(os.path.splitext(filename or '')[1].lower())
+    if fmt is None:
+        raise ImportFormatError('ファイルの形式を判別できません（.ndjson / .csv / .json）。')
+    return fmt
+
+
+def _decode(lines):
+    """バイト列の行を (行番号, 文字列, UTF-8として読めたか) にする
+
+    読めない行も行全体を捨てずに、読めない部分だけを置き換えた文字列にする（CSVの列の区切りを保つため）。
+    """
+    for line_no, line in enumerate(lines, 1):
+        encoding = 'utf-8-sig' if line_no == 1 else 'utf-8'
+        try:
+            yield line_no, line.decode(encoding), True
+        except UnicodeDecodeError:
+            yield line_no, line.decode(encoding, 'replace'), False
+
+
+def read_ndjson(lines):
+    """バイト列の行から (行番号, レコード) を返す。読めない行はレコードの代わりにエラー"""
+    for line_no, line, decoded in _decode(lines):
+        if not decoded:
+            yield line_no, ImportFormatError('UTF-8として読み込めません。')
+            continue
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError:
+            yield line_no, ImportFormatError('JSONとして読み込めません。')
+
+
+def read_csv(lines):
+    """ヘッダー行のあるCSV。空の列は省略したものとして扱う
+
+    UTF-8として読めない行を含むレコードと、CSVとして読めないレコードはエラーにして続きを読む。
+    """
+    undecodable = set()
+
+    def text_lines():
+        for line_no, line, decoded in _decode(lines):
+            if not decoded:
+                undecodable.add(line_no)
+            yield line
+
+    reader = csv.DictReader(text_lines())
+    try:
+        fieldnames = reader.fieldnames
+    except csv.Error as exc:
+        raise ImportFormatError(f'CSVのヘッダーを読み込めません（{exc}）。')
+    if undecodable:
+        raise ImportFormatError('CSVのヘッダーをUTF-8として読み込めません。')
+    if not fieldnames or 'name' not in fieldnames:
+        raise ImportFormatError("CSVの1行目には'name'を含むヘッダーが必要です。")
+
+    last_line = reader.line_num
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as exc:
+            # DictReader.line_num は読めたレコードでしか進まないので、元の reader の行番号を使う
+            last_line = reader.reader.line_num
+            yield last_line, ImportFormatError(f'CSVとして読み込めません（{exc}）。')
+            continue
+        # 複数行にわたるレコードもあるので、前のレコードの次の行からこのレコードの行までを確かめる
+        bad_lines = sorted(line_no for line_no in undecodable if line_no > last_line)
+        undecodable.difference_update(bad_lines)
+        last_line = reader.line_num
+        if bad_lines:
+            yield bad_lines[0], ImportFormatError('UTF-8として読み込めません。')
+            continue
+        record = {key: value for key, value in row.items() if key and value not in ('', None)}
+        if 'categories' in record:
+            record['categories'] = [name for name in record['categories'].split(';') if name.strip()]
+        yield last_line, record
+
+
+def read_json(lines):
+    """JSON配列（全体を読み込む）"""
+    try:
+        data = json.loads(b''.join(lines).decode('utf-8-sig'))
+    except ValueError:
+        raise ImportFormatError('JSONとして読み込めません。')
+    if not isinstance(data, list):
+        raise ImportFormatError('JSONはTodoの配列である必要があります。')
+    return enumerate(data, 1)
+
+
+READERS = {
+    'ndjson': read_ndjson,
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+def read_records(lines, fmt):
+    return READERS[fmt](lines)
+
+
+class TodoImporter:
+    """1ユーザー分のインポート。チャンクごとに検証・作成する"""
+
+    def __init__(self, user, chunk_size=None):
+        self.user = user
+        self.chunk_size = chunk_size or settings.TODO_IMPORT_CHUNK_SIZE
+        self.created = 0
+        self.skipped = 0
+        self.errors = []
+        # フィールドの複製を行ごとに作らないよう、1つのシリアライザで検証する
+        self.serializer = TodoImportSerializer()
+        self.categories = dict(Category.objects.filter(user=user).values_list('name', 'id'))
+
+        todos = Todo.objects.filter(user=user)
+        last_rank = todos.order_by('-rank').values_list('rank', flat=True).first()
+        self.ranks = key_sequence(last_rank)
+        self.order_index = None
+        if settings.TODO_ORDERING_MODE != 'rank':
+            self.order_index = todos.aggregate(max_order=models.Max('order_index'))['max_order'] or 0
+
+    def run(self, records):
+        """(行番号, レコード) のイテラブルを取り込み、結果を返す"""
+        chunk = []
+        try:
+            for line_no, record in records:
+                chunk.append((line_no, record))
+                if len(chunk) >= self.chunk_size:
+                    self.import_chunk(chunk)
+                    chunk = []
+            if chunk:
+                self.import_chunk(chunk)
+        finally:
+            # 途中で失敗しても、コミット済みのチャンクは反映する
+            if self.created:
+                invalidate_todo_cache(self.user.id)
+                # 件数が多いのでIDは送らず、差分同期し直してもらう
+                publish_todo_event(self.user.id, 'resync', [])
+        return {'created': self.created, 'skipped': self.skipped, 'errors': self.errors}
+
+    def _error(self, line_no, errors):
+        self.skipped += 1
+        if len(self.errors) < settings.TODO_IMPORT_MAX_ERRORS:
+            self.errors.append({'line': line_no, 'errors': errors})
+
+    def _validate(self, chunk):
+        rows = []
+        for line_no, record in chunk:
+            if isinstance(record, Exception):
+                self._error(line_no, {'error': str(record)})
+                continue
+            if not isinstance(record, dict):
+                self._error(line_no, {'error': 'Todoはオブジェクトで指定してください。'})
+                continue
+            try:
+                rows.append(self.serializer.run_validation(record))
+            except ValidationError as exc:
+                self._error(line_no, exc.detail)
+        return rows
+
+    def _ensure_categories(self, names):
+        """カテゴリ名をIDにする。ないものは作成する（同時に作成された場合は既存のものを使う）"""
+        missing = {name for name in names if name not in self.categories}
+        if missing:
+            Category.objects.bulk_create(
+                [Category(user=self.user, name=name) for name in missing], ignore_conflicts=True
+            )
+            self.categories.update(
+                Category.objects.filter(user=self.user, name__in=missing).values_list('name', 'id')
+            )
+
+    def import_chunk(self, chunk):
+        rows = self._validate(chunk)
+        if not rows:
+            return
+        now = timezone.now()
+        with transaction.atomic():
+            self._ensure_categories({name for row in rows for name in row['categories']})
+            todos = []
+            links = []
+            delta = StatsDelta(self.user.id)
+            for row in rows:
+                row = dict(row)
+                category_ids = {self.categories[name] for name in row.pop('categories')}
+                todo = Todo(user=self.user, rank=next(self.ranks), **row)
+                if todo.completed:
+                    todo.completed_at = now
+                if self.order_index is not None:
+                    self.order_index += 1
+                    todo.order_index = self.order_index
+                todos.append(todo)
+                links.extend(TodoCategory(todo=todo, category_id=category_id) for category_id in category_ids)
+                delta.add_todo(todo)
+                delta.add_categories(category_ids, total=1, completed=int(todo.completed))
+            Todo.objects.bulk_create(todos)
+            TodoCategory.objects.bulk_create(links)
+            delta.apply()
+            index_todos(todos)
+            schedule_rank_rebalance(self.user.id, todos[-1].rank)
+        self.created += len(todos)
+
+
+def import_todos(user, records, chunk_size=None):
+    """(行番号, レコード) のイテラブルからTodoを作成し、{'created', 'skipped', 'errors'} を返す"""
+    return TodoImporter(user, chunk_size).run(records)
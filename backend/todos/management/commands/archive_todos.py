@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from todos.archive import archivable_todos, archive_cutoff, archive_todos
+
+
+class Command(BaseCommand):
+    help = '完了から一定の日数がたったTodoをアーカイブ（ArchivedTodo）に移します。定期的に実行してください'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='完了からの日数（省略時は TODO_ARCHIVE_AFTER_DAYS）')
+        parser.add_argument('--user', dest='emails', action='append', default=[],
+                            help='対象ユーザーのメールアドレス（複数指定可。省略時は全ユーザー）')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='1回にコミットする件数（省略時は TODO_ARCHIVE_BATCH_SIZE）')
+
+    def handle(self, *args, **options):
+        before = archive_cutoff(days=options['days'])
+        users = archivable_todos(before).order_by().values_list('user_id', flat=True).distinct()
+        if options['emails']:
+            users = users.filter(user__email__in=options['emails'])
+        batch_size = options['batch_size'] or settings.TODO_ARCHIVE_BATCH_SIZE
+
+        total = 0
+        user_ids = list(users)
+        for user_id in user_ids:
+            total += archive_todos(user_id, before, batch_size)
+        self.stdout.write(self.style.SUCCESS(f'{len(user_ids)}人のユーザーの{total}件のTodoをアーカイブしました。'))
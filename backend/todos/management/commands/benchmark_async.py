@@ -0,0 +1,155 @@
+import asyncio
+import io
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from django.urls import path
+from accounts.tokens import RefreshToken
+from todos import async_views, views
+from todos.models import Todo
+
+HOST = 'localhost'
+
+
+class URLConf:
+    """計測に使うエンドポイントだけの URLconf（同期版と非同期版を切り替えるため）"""
+
+    def __init__(self, list_view, detail_view, stats_view):
+        self.urlpatterns = [
+            path('todos/', list_view),
+            path('todos/stats/', stats_view),
+            path('todos/<uuid:pk>/', detail_view),
+        ]
+
+
+SYNC_URLCONF = URLConf(views.TodoListCreateView.as_view(), views.TodoDetailView.as_view(), views.todo_stats)
+ASYNC_URLCONF = URLConf(async_views.todo_list, async_views.todo_detail, async_views.todo_stats)
+
+
+class Command(BaseCommand):
+    help = (
+        'DBの応答に遅延がある状態で、一覧・詳細・統計のGETを WSGI（同期ビュー）、ASGI（同期ビュー）、'
+        'ASGI（非同期ビュー）で同時に処理した時の性能を比較します（作成したデータは最後に削除します）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help='方式ごとのリクエスト数')
+        parser.add_argument('--concurrency', type=int, default=100, help='ASGIで同時に処理するリクエスト数')
+        parser.add_argument('--threads', type=int, default=8, help='WSGIサーバーのスレッド数')
+        parser.add_argument('--latency-ms', type=float, default=5.0, help='クエリ1回ごとに加える遅延（ミリ秒）')
+        parser.add_argument('--items', type=int, default=50, help='ユーザーのTodoの件数')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.create_user(
+            email=f'benchmark-{uuid.uuid4().hex}@example.com', username=f'benchmark-{uuid.uuid4().hex}',
+        )
+        try:
+            todos = Todo.objects.bulk_create([
+                Todo(user=user, name=f'Todo {i}', order_index=i, rank=f'{i:06d}1') for i in range(options['items'])
+            ])
+            token = str(RefreshToken.for_user(user).access_token)
+            paths = ['/todos/', '/todos/stats/'] + [f'/todos/{todo.pk}/' for todo in todos[:10]]
+            targets = [paths[i % len(paths)] for i in range(options['requests'])]
+
+            self.stdout.write(
+                f'{options["requests"]}リクエスト、クエリごとに {options["latency_ms"]:g} ms の遅延'
+            )
+            with self.latency(options['latency_ms'] / 1000):
+                with override_settings(ROOT_URLCONF=SYNC_URLCONF):
+                    self.report(f'WSGI（同期ビュー、{options["threads"]}スレッド）',
+                                self.run_wsgi(targets, token, options['threads']))
+                    self.report(f'ASGI（同期ビュー、同時{options["concurrency"]}）',
+                                asyncio.run(self.run_asgi(targets, token, options['concurrency'])))
+                with override_settings(ROOT_URLCONF=ASYNC_URLCONF):
+                    self.report(f'ASGI（非同期ビュー、同時{options["concurrency"]}）',
+                                asyncio.run(self.run_asgi(targets, token, options['concurrency'])))
+        finally:
+            user.delete()
+
+    def latency(self, seconds):
+        """計測中に作られたDB接続のクエリごとに遅延を加える（ネットワーク越しのDBの代わり）"""
+        def delay(execute, sql, params, many, context):
+            time.sleep(seconds)
+            return execute(sql, params, many, context)
+
+        def add_delay(sender, connection, **kwargs):
+            connection.execute_wrappers.append(delay)
+
+        class Latency:
+            def __enter__(self):
+                connection_created.connect(add_delay, dispatch_uid='benchmark_async_latency')
+
+            def __exit__(self, *exc_info):
+                connection_created.disconnect(dispatch_uid='benchmark_async_latency')
+
+        return Latency()
+
+    def run_wsgi(self, targets, token, threads):
+        handler = WSGIHandler()
+
+        def request(target):
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': target, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+                'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': HOST, 'HTTP_AUTHORIZATION': f'Bearer {token}', 'REMOTE_ADDR': '127.0.0.1',
+                'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': io.StringIO(),
+            }
+            statuses = []
+            start = time.perf_counter()
+            response = handler(environ, lambda status, headers: statuses.append(status))
+            b''.join(response)
+            response.close()
+            return int(statuses[0].split()[0]), time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            start = time.perf_counter()
+            results = list(executor.map(request, targets))
+            return results, time.perf_counter() - start
+
+    async def run_asgi(self, targets, token, concurrency):
+        handler = ASGIHandler()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request(target):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': target, 'raw_path': target.encode(), 'query_string': b'',
+                'root_path': '', 'client': ('127.0.0.1', 0), 'server': (HOST, 80),
+                'headers': [(b'host', HOST.encode()), (b'authorization', f'Bearer {token}'.encode())],
+            }
+            statuses = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            async with semaphore:
+                start = time.perf_counter()
+                await handler(scope, receive, send)
+                return statuses[0], time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(request(target) for target in targets))
+        return results, time.perf_counter() - start
+
+    def report(self, label, measured):
+        results, elapsed = measured
+        failed = [status for status, _ in results if status != 200]
+        if failed:
+            raise CommandError(f'{label}: {len(failed)}件のリクエストが失敗しました（ステータス {failed[0]}）。')
+        latencies = sorted(seconds * 1000 for _, seconds in results)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        self.stdout.write(
+            f'  {label}: {len(results) / elapsed:.0f} 回/秒、'
+            f'応答時間 中央値 {statistics.median(latencies):.1f} ms / 95% {p95:.1f} ms'
+        )
@@ -0,0 +1,65 @@
+import statistics
+import time
+import uuid
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from todos.fieldsets import TodoFieldset, categories_prefetch
+from todos.models import Category, Todo, TodoCategory
+from todos.serializers import TodoSerializer
+
+
+class Command(BaseCommand):
+    help = 'Todo一覧1ページ分の組み立て時間を TodoSerializer と values() の組み立てで比較します（データは作成後に取り消します）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=1000, help='1ページの件数')
+        parser.add_argument('--categories', type=int, default=5, help='ユーザーのカテゴリ数（各Todoに最大3件付ける）')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            queryset = self.create_data(options['items'], options['categories'])
+            serializer_times, serializer_json = self.measure(options['repeat'], lambda: TodoSerializer(
+                queryset.prefetch_related(categories_prefetch()), many=True
+            ).data)
+            fieldset_times, fieldset_json = self.measure(options['repeat'], lambda: TodoFieldset.default().build(
+                queryset.values(*TodoFieldset.default().columns())
+            ))
+            transaction.set_rollback(True)
+
+        if serializer_json != fieldset_json:
+            raise CommandError('TodoSerializer と出力が一致しません。')
+        serializer_ms = statistics.median(serializer_times) * 1000
+        fieldset_ms = statistics.median(fieldset_times) * 1000
+        self.stdout.write(f'{options["items"]}件 × {options["repeat"]}回（中央値、クエリを含む）')
+        self.stdout.write(f'  TodoSerializer: {serializer_ms:.1f} ms')
+        self.stdout.write(f'  values() の組み立て: {fieldset_ms:.1f} ms')
+        self.stdout.write(self.style.SUCCESS(f'  {serializer_ms / fieldset_ms:.1f}倍（出力は一致）'))
+
+    def create_data(self, items, category_count):
+        user = get_user_model().objects.create_user(
+            email=f'benchmark-{uuid.uuid4().hex}@example.com', username=f'benchmark-{uuid.uuid4().hex}',
+        )
+        categories = Category.objects.bulk_create([
+            Category(user=user, name=f'カテゴリ{i}') for i in range(category_count)
+        ])
+        todos = Todo.objects.bulk_create([
+            Todo(user=user, name=f'Todo {i}', description='説明' * (i % 5), order_index=i, rank=f'{i:06d}1')
+            for i in range(items)
+        ])
+        TodoCategory.objects.bulk_create([
+            TodoCategory(todo=todo, category=categories[(i + j) % category_count])
+            for i, todo in enumerate(todos) for j in range(min(i % 4, category_count))
+        ])
+        return Todo.objects.filter(user=user).order_by('order_index', '-created_at')
+
+    def measure(self, repeat, build):
+        renderer = JSONRenderer()
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = build()
+            times.append(time.perf_counter() - start)
+        return times, renderer.render(data)
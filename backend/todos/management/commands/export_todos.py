@@ -0,0 +1,45 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+from rest_framework.exceptions import ValidationError
+from todos.exporter import WRITERS, export_lines, export_queryset
+
+
+class Command(BaseCommand):
+    help = 'ユーザーのTodoを NDJSON / CSV / JSON で書き出します（少しずつ読み込むので件数が多くても使えます）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='対象ユーザーのメールアドレス')
+        parser.add_argument('--format', choices=list(WRITERS), default='ndjson')
+        parser.add_argument('--output', '-o', default='-', help="出力先のパス（省略時・'-' は標準出力）")
+        parser.add_argument('--filter', dest='filters', action='append', default=[], metavar='NAME=VALUE',
+                            help='一覧と同じ絞り込み条件（例: --filter completed=false、複数指定可）')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='1回に読み込む件数（省略時は TODO_EXPORT_CHUNK_SIZE）')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'ユーザーが見つかりません: {options["email"]}')
+
+        params = QueryDict(mutable=True)
+        for item in options['filters']:
+            name, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f'絞り込み条件は NAME=VALUE で指定してください: {item}')
+            params.appendlist(name, value)
+        try:
+            queryset = export_queryset(user, params)
+        except ValidationError as exc:
+            raise CommandError(f'絞り込み条件が不正です: {exc.detail}')
+
+        lines = export_lines(queryset, options['format'], options['chunk_size'])
+        if options['output'] == '-':
+            for text in lines:
+                self.stdout.write(text, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+            for text in lines:
+                f.write(text)
+        self.stdout.write(self.style.SUCCESS(f'{options["output"]} に書き出しました。'))
@@ -0,0 +1,39 @@
+import sys
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from todos.importer import FORMATS, ImportFormatError, format_for_filename, import_todos, read_records
+
+
+class Command(BaseCommand):
+    help = 'NDJSON / CSV / JSON ファイルからTodoをインポートします（NDJSON・CSVは1行ずつ読み込みます）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='インポート先ユーザーのメールアドレス')
+        parser.add_argument('path', help="ファイルのパス（'-' で標準入力）")
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help='ファイルの形式（省略時は拡張子で判別）')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='1回に作成する件数（省略時は TODO_IMPORT_CHUNK_SIZE）')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'ユーザーが見つかりません: {options["email"]}')
+
+        path = options['path']
+        try:
+            fmt = options['format'] or format_for_filename(path)
+            if path == '-':
+                result = import_todos(user, read_records(sys.stdin.buffer, fmt), options['chunk_size'])
+            else:
+                with open(path, 'rb') as f:
+                    result = import_todos(user, read_records(f, fmt), options['chunk_size'])
+        except (ImportFormatError, OSError) as exc:
+            raise CommandError(str(exc))
+
+        for error in result['errors']:
+            self.stderr.write(f'{error["line"]}行目: {error["errors"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{result["created"]}件のTodoをインポートしました（スキップ: {result["skipped"]}件）。'
+        ))
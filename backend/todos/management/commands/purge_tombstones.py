@@ -0,0 +1,18 @@
+import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from todos.sync import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = '保存期間を過ぎた削除記録（差分同期用）を削除します。定期的に実行してください'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='保存日数（省略時は TODO_TOMBSTONE_RETENTION_DAYS）')
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else settings.TODO_TOMBSTONE_RETENTION_DAYS
+        count = purge_tombstones(timezone.now() - datetime.timedelta(days=days))
+        self.stdout.write(self.style.SUCCESS(f'{count}件の削除記録を削除しました。'))
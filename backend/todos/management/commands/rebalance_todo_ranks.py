@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.db.models.functions import Length
+from todos.models import Todo
+from todos.operations import rebalance_ranks
+
+
+class Command(BaseCommand):
+    help = 'Todoの並び順キーを等間隔の短いキーに振り直します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', dest='emails', action='append', default=[],
+                            help='対象ユーザーのメールアドレス（複数指定可）')
+        parser.add_argument('--all', action='store_true',
+                            help='キーの長さに関係なく全ユーザーを振り直す')
+
+    def handle(self, *args, **options):
+        users = Todo.objects.order_by().values('user_id')
+        if options['emails']:
+            users = users.filter(user__email__in=options['emails'])
+        users = users.annotate(max_length=Max(Length('rank')))
+        if not options['all'] and not options['emails']:
+            users = users.filter(max_length__gt=settings.TODO_RANK_MAX_LENGTH)
+
+        count = 0
+        for row in users.iterator():
+            rebalance_ranks(row['user_id'])
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'{count}人のユーザーの並び順キーを振り直しました。'))
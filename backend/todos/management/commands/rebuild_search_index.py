@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from todos.models import Todo, TodoSearchDocument
+from todos.search import index_todos
+
+
+class Command(BaseCommand):
+    help = 'Todoの全文検索インデックスを作り直します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', dest='emails', action='append', default=[],
+                            help='対象ユーザーのメールアドレス（複数指定可）')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        todos = Todo.objects.order_by().only('id', 'user_id', 'name', 'description')
+        documents = TodoSearchDocument.objects.all()
+        if options['emails']:
+            todos = todos.filter(user__email__in=options['emails'])
+            documents = documents.filter(user__email__in=options['emails'])
+
+        count = 0
+        batch = []
+        with transaction.atomic():
+            documents.delete()
+            for todo in todos.iterator(chunk_size=options['batch_size']):
+                batch.append(todo)
+                if len(batch) >= options['batch_size']:
+                    index_todos(batch)
+                    count += len(batch)
+                    batch = []
+            index_todos(batch)
+            count += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'{count}件のTodoの検索インデックスを作り直しました。'))
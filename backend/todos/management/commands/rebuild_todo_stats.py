@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from todos.stats import compute_expected, current_counters, diff_counters, rebuild_user_stats
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Todo統計カウンタを元テーブルから再構築し、整合性を検証します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', dest='emails', action='append', default=[],
+                            help='対象ユーザーのメールアドレス（複数指定可、省略時は全ユーザー）')
+        parser.add_argument('--verify-only', action='store_true',
+                            help='再構築せずに差分の検出だけを行う')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['emails']:
+            users = users.filter(email__in=options['emails'])
+
+        mismatched_users = 0
+        for user_id, email in users.values_list('pk', 'email').iterator():
+            if not options['verify_only']:
+                rebuild_user_stats(user_id)
+
+            mismatches = diff_counters(compute_expected(user_id), current_counters(user_id))
+            if mismatches:
+                mismatched_users += 1
+                self.stdout.write(self.style.WARNING(f'{email}: {len(mismatches)}件の不一致'))
+                for key, expected, actual in mismatches:
+                    self.stdout.write(f'  {key}: 期待値={expected} 現在値={actual}')
+
+        if mismatched_users:
+            raise CommandError(f'{mismatched_users}人のユーザーで統計カウンタが一致しません。')
+        self.stdout.write(self.style.SUCCESS('統計カウンタは元テーブルと一致しています。'))
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['user', '-created_at'], name='category_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['user', 'order_index', '-created_at'], name='todo_user_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['user', 'completed', 'due_date'], name='todo_user_completed_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['user', 'completed', 'completed_at'], name='todo_user_completed_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(condition=models.Q(('completed', False)), fields=['user', 'due_date'], name='todo_user_pending_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todocategory',
+            index=models.Index(fields=['category', 'todo'], name='todocategory_category_todo_idx'),
+        ),
+    ]
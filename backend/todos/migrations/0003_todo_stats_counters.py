@@ -0,0 +1,98 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:45
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def backfill_stats(apps, schema_editor):
+    """既存のTodoから統計カウンタを作成する"""
+    Todo = apps.get_model('todos', 'Todo')
+    TodoCategory = apps.get_model('todos', 'TodoCategory')
+    TodoStats = apps.get_model('todos', 'TodoStats')
+    TodoDailyStats = apps.get_model('todos', 'TodoDailyStats')
+    utc = datetime.timezone.utc
+
+    todos = Todo.objects.order_by()
+    TodoStats.objects.bulk_create([
+        TodoStats(user_id=row['user_id'], total=row['total'], completed=row['done'])
+        for row in todos.values('user_id').annotate(total=Count('id'), done=Count('id', filter=Q(completed=True)))
+    ])
+    TodoStats.objects.bulk_create([
+        TodoStats(user_id=row['todo__user_id'], category_id=row['category_id'], total=row['total'], completed=row['done'])
+        for row in TodoCategory.objects.order_by().values('todo__user_id', 'category_id').annotate(
+            total=Count('id'), done=Count('id', filter=Q(todo__completed=True))
+        )
+    ])
+
+    days = {}
+    completed_days = todos.filter(completed=True, completed_at__isnull=False).annotate(
+        day=TruncDate('completed_at', tzinfo=utc)
+    ).values('user_id', 'day').annotate(count=Count('id'))
+    for row in completed_days:
+        days.setdefault((row['user_id'], row['day']), [0, 0])[0] = row['count']
+    due_days = todos.filter(completed=False, due_date__isnull=False).annotate(
+        day=TruncDate('due_date', tzinfo=utc)
+    ).values('user_id', 'day').annotate(count=Count('id'))
+    for row in due_days:
+        days.setdefault((row['user_id'], row['day']), [0, 0])[1] = row['count']
+    TodoDailyStats.objects.bulk_create([
+        TodoDailyStats(user_id=user_id, day=day, completed=completed, due_pending=due_pending)
+        for (user_id, day), (completed, due_pending) in days.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('todos', '0002_user_scoped_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TodoStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.IntegerField(default=0, verbose_name='総数')),
+                ('completed', models.IntegerField(default=0, verbose_name='完了数')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='todos.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='todo_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Todo統計',
+                'verbose_name_plural': 'Todo統計',
+            },
+        ),
+        migrations.CreateModel(
+            name='TodoDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='日付')),
+                ('completed', models.IntegerField(default=0, verbose_name='完了数')),
+                ('due_pending', models.IntegerField(default=0, verbose_name='期限の未完了数')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='todo_daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Todo日別統計',
+                'verbose_name_plural': 'Todo日別統計',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='todostats',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('user',), name='todostats_user_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='todostats',
+            constraint=models.UniqueConstraint(fields=('user', 'category'), name='todostats_user_category_unique'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='tododailystats',
+            unique_together={('user', 'day')},
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:49
+
+from django.db import migrations, models
+from todos.ranking import rank_sequence
+
+
+def assign_ranks(apps, schema_editor):
+    """既存のTodoに、現在の並び順（order_index, -created_at）どおりのキーを振る"""
+    Todo = apps.get_model('todos', 'Todo')
+    user_ids = Todo.objects.order_by().values_list('user_id', flat=True).distinct()
+    for user_id in user_ids.iterator():
+        todos = list(
+            Todo.objects.filter(user_id=user_id).order_by('order_index', '-created_at', 'id').only('id')
+        )
+        for todo, rank in zip(todos, rank_sequence(len(todos))):
+            todo.rank = rank
+        Todo.objects.bulk_update(todos, ['rank'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0003_todo_stats_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='todo',
+            name='rank',
+            field=models.CharField(blank=True, default='', max_length=255, verbose_name='並び順キー'),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['user', 'rank'], name='todo_user_rank_idx'),
+        ),
+        migrations.RunPython(assign_ranks, migrations.RunPython.noop),
+    ]
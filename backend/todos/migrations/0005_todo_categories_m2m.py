@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0004_todo_rank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='todo',
+            name='categories',
+            field=models.ManyToManyField(blank=True, related_name='todos', through='todos.TodoCategory', to='todos.category', verbose_name='カテゴリ'),
+        ),
+    ]
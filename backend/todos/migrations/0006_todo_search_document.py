@@ -0,0 +1,110 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:52
+
+import re
+import unicodedata
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# このマイグレーションの時点の todos.search のコピー（後でトークン化を変えてもこのマイグレーションは変わらない。
+# 変えた場合は manage.py rebuild_search_index でインデックスを作り直す）
+DOCUMENT_TABLE = 'todos_todosearchdocument'
+FTS_TABLE = 'todos_todosearch_fts'
+_CJK = '぀-ヿ㐀-䶿一-鿿豈-﫿ｦ-ﾟ'
+_TOKEN_RE = re.compile(rf'([{_CJK}]+)|([^\W_{_CJK}]+)')
+
+
+def tokenize_document(text):
+    tokens = []
+    for cjk, word in _TOKEN_RE.findall(unicodedata.normalize('NFKC', text or '').casefold()):
+        if word:
+            tokens.append(word)
+        elif len(cjk) == 1:
+            tokens.append(cjk)
+        else:
+            tokens.extend([cjk[i:i + 2] for i in range(len(cjk) - 1)] + [cjk[-1]])
+    return tokens
+
+
+def document_text(name, description):
+    return ' '.join(tokenize_document(name) + tokenize_document(description))
+
+
+def create_search_index(apps, schema_editor):
+    """DBごとの全文検索インデックスを作成する"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE INDEX todosearch_body_gin_idx ON {DOCUMENT_TABLE} "
+            f"USING GIN (to_tsvector('simple', body))"
+        )
+    elif vendor == 'sqlite':
+        # 外部コンテンツのFTS5テーブル。ドキュメントテーブルの変更はトリガーで反映する
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"body, content='{DOCUMENT_TABLE}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {DOCUMENT_TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, body) VALUES (new.id, new.body); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {DOCUMENT_TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, body) VALUES ('delete', old.id, old.body); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON {DOCUMENT_TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, body) VALUES ('delete', old.id, old.body); "
+            f"INSERT INTO {FTS_TABLE}(rowid, body) VALUES (new.id, new.body); END"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS todosearch_body_gin_idx')
+    elif vendor == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def backfill_documents(apps, schema_editor):
+    """既存のTodoの検索ドキュメントを作成する"""
+    Todo = apps.get_model('todos', 'Todo')
+    TodoSearchDocument = apps.get_model('todos', 'TodoSearchDocument')
+    batch = []
+    for todo in Todo.objects.order_by().values('id', 'user_id', 'name', 'description').iterator(chunk_size=1000):
+        batch.append(TodoSearchDocument(
+            todo_id=todo['id'], user_id=todo['user_id'], body=document_text(todo['name'], todo['description'])
+        ))
+        if len(batch) >= 1000:
+            TodoSearchDocument.objects.bulk_create(batch)
+            batch = []
+    TodoSearchDocument.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('todos', '0005_todo_categories_m2m'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TodoSearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('body', models.TextField(blank=True, verbose_name='検索テキスト')),
+                ('todo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='todos.todo')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Todo検索ドキュメント',
+                'verbose_name_plural': 'Todo検索ドキュメント',
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('todos', '0007_sync_tombstones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTodo',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=500, verbose_name='タスク名')),
+                ('description', models.TextField(blank=True, verbose_name='説明')),
+                ('priority', models.CharField(choices=[('low', '低'), ('medium', '中'), ('high', '高')], default='medium', max_length=10, verbose_name='優先度')),
+                ('due_date', models.DateTimeField(blank=True, null=True, verbose_name='期限')),
+                ('categories', models.JSONField(blank=True, default=list, verbose_name='カテゴリ名')),
+                ('completed_at', models.DateTimeField(verbose_name='完了日時')),
+                ('created_at', models.DateTimeField(verbose_name='作成日時')),
+                ('archived_at', models.DateTimeField(verbose_name='アーカイブ日時')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'アーカイブ済みTodo',
+                'verbose_name_plural': 'アーカイブ済みTodo',
+                'indexes': [models.Index(fields=['user', '-completed_at'], name='archived_user_completed_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+DOCUMENT_TABLE = 'todos_todosearchdocument'
+
+
+def create_user_index(apps, schema_editor):
+    """PostgreSQL: 検索をユーザーごとに絞り込めるよう、user_id をGINインデックスに含める"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # uuid などスカラー型をGINインデックスに含めるための拡張
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS btree_gin')
+    schema_editor.execute(
+        f"CREATE INDEX todosearch_user_body_gin_idx ON {DOCUMENT_TABLE} "
+        f"USING GIN (user_id, to_tsvector('simple', body))"
+    )
+    schema_editor.execute('DROP INDEX IF EXISTS todosearch_body_gin_idx')
+
+
+def drop_user_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f"CREATE INDEX todosearch_body_gin_idx ON {DOCUMENT_TABLE} "
+        f"USING GIN (to_tsvector('simple', body))"
+    )
+    schema_editor.execute('DROP INDEX IF EXISTS todosearch_user_body_gin_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0008_archived_todo'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_user_index, drop_user_index),
+    ]
@@ -4,13 +4,60 @@ from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
-class Todo(models.Model):
+class TrackedFieldsMixin:
+    """DBから読み込んだ時点のフィールド値を保持し、変更されたカラムだけを保存する"""
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def get_loaded_values(self):
+        """読み込み時（または直近の保存時）の値。DB由来でないインスタンスはNone"""
+        return getattr(self, '_loaded_values', None)
+
+    def get_dirty_fields(self):
+        """変更されたフィールドを {attname: 読み込み時の値} で返す"""
+        loaded = self.get_loaded_values() or {}
+        return {
+            name: value for name, value in loaded.items()
+            if getattr(self, name) != value
+        }
+
+    def is_dirty(self, *names):
+        dirty = self.get_dirty_fields()
+        return any(self._meta.get_field(name).attname in dirty for name in names)
+
+    def save(self, *args, **kwargs):
+        # update_fieldsが指定されていなければ、変更されたカラムと自動更新カラムだけを書き込む
+        if (
+            not args and not self._state.adding
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+            and self.get_loaded_values() is not None
+        ):
+            auto_fields = [
+                field.attname for field in self._meta.concrete_fields
+                if getattr(field, 'auto_now', False)
+            ]
+            kwargs['update_fields'] = list(self.get_dirty_fields()) + auto_fields
+        super().save(*args, **kwargs)
+
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields if field.attname not in deferred
+        }
+
+class Todo(TrackedFieldsMixin, models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='todos')
     name = models.CharField(max_length=500, verbose_name='タスク名')
     description = models.TextField(blank=True, verbose_name='説明')
     completed = models.BooleanField(default=False, verbose_name='完了状態')
     order_index = models.IntegerField(default=0, verbose_name='並び順')
+    rank = models.CharField(max_length=255, default='', blank=True, verbose_name='並び順キー')
     priority = models.CharField(
         max_length=10,
         choices=[
@@ -22,6 +69,9 @@ class Todo(models.Model):
         verbose_name='優先度'
     )
     due_date = models.DateTimeField(null=True, blank=True, verbose_name='期限')
+    categories = models.ManyToManyField(
+        'Category', through='TodoCategory', related_name='todos', blank=True, verbose_name='カテゴリ'
+    )
     completed_at = models.DateTimeField(null=True, blank=True, verbose_name='完了日時')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='作成日時')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
@@ -30,6 +80,22 @@ class Todo(models.Model):
         ordering = ['order_index', '-created_at']
         verbose_name = 'Todo'
         verbose_name_plural = 'Todos'
+        indexes = [
+            # 一覧のデフォルト並び順
+            models.Index(fields=['user', 'order_index', '-created_at'], name='todo_user_order_idx'),
+            models.Index(fields=['user', 'rank'], name='todo_user_rank_idx'),
+            # 差分同期（updated_atがカーソル以降のもの）
+            models.Index(fields=['user', 'updated_at'], name='todo_user_updated_idx'),
+            # 期限・完了状態での絞り込み、統計
+            models.Index(fields=['user', 'completed', 'due_date'], name='todo_user_completed_due_idx'),
+            models.Index(fields=['user', 'completed', 'completed_at'], name='todo_user_completed_at_idx'),
+            # 期限切れ判定は未完了のTodoのみが対象
+            models.Index(
+                fields=['user', 'due_date'],
+                condition=models.Q(completed=False),
+                name='todo_user_pending_due_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.user.email}"
@@ -37,17 +103,33 @@ class Todo(models.Model):
     # todos/models.py の Todo モデル内
 
     def save(self, *args, **kwargs):
-        is_new_object = not self.pk
+        from django.db import transaction
+        from .stats import StatsDelta
+
+        is_new_object = self._state.adding
+        old_values = None
         old_completed = None
 
         if not is_new_object:
-            try:
-                old_todo = Todo.objects.get(pk=self.pk)
-                old_completed = old_todo.completed
-            except Todo.DoesNotExist:
-                # 非常にまれなケースだが、既存のオブジェクトが見つからなかった場合の処理
-                pass
+            old_values = self.get_loaded_values()
+            if old_values is None or not {'completed', 'completed_at', 'due_date'} <= old_values.keys():
+                # DBから読み込まれていないインスタンスの場合のみ現在の値を取得する
+                old_values = Todo.objects.filter(pk=self.pk).values(
+                    'completed', 'completed_at', 'due_date'
+                ).first()
+            if old_values is not None:
+                old_completed = old_values['completed']
+        # 検索インデックスはname・descriptionが変わったときだけ更新する
+        reindex = is_new_object or self.get_loaded_values() is None or self.is_dirty('name', 'description')
         
+        # 並び順キーが未指定なら末尾に追加する（(user, rank)のインデックスで1行だけ読む）
+        if is_new_object and not self.rank:
+            from .ranking import key_after
+            last_rank = Todo.objects.filter(user_id=self.user_id).order_by('-rank').values_list(
+                'rank', flat=True
+            ).first()
+            self.rank = key_after(last_rank)
+
         # 完了状態が変更された場合、または新規作成時に完了状態がTrueの場合
         if self.completed and (is_new_object or old_completed is not self.completed):
             from django.utils import timezone
@@ -55,7 +137,40 @@ class Todo(models.Model):
         elif not self.completed and old_completed is not self.completed:
             self.completed_at = None
             
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            # 統計カウンタを同じトランザクションで更新
+            delta = StatsDelta(self.user_id)
+            if old_values is not None:
+                delta.add(old_values['completed'], old_values['completed_at'], old_values['due_date'], sign=-1)
+                if old_completed != self.completed:
+                    delta.add_todo_categories(self.pk, completed=1 if self.completed else -1)
+            delta.add_todo(self)
+            delta.apply()
+
+            if reindex:
+                from .search import index_todos
+                index_todos([self])
+
+            if is_new_object:
+                from .operations import schedule_rank_rebalance
+                schedule_rank_rebalance(self.user_id, self.rank)
+
+    def delete(self, *args, **kwargs):
+        from django.db import transaction
+        from .stats import StatsDelta
+
+        with transaction.atomic():
+            delta = StatsDelta(self.user_id)
+            delta.add_todo(self, sign=-1)
+            delta.add_categories(
+                self.todo_categories.values_list('category_id', flat=True),
+                total=-1, completed=-1 if self.completed else 0,
+            )
+            result = super().delete(*args, **kwargs)
+            delta.apply()
+        return result
 
 class Category(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -69,6 +184,10 @@ class Category(models.Model):
         unique_together = ['user', 'name']
         verbose_name = 'カテゴリ'
         verbose_name_plural = 'カテゴリ'
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='category_user_created_idx'),
+            models.Index(fields=['user', 'updated_at'], name='category_user_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.user.email}"
@@ -81,4 +200,98 @@ class TodoCategory(models.Model):
     class Meta:
         unique_together = ['todo', 'category']
         verbose_name = 'Todoカテゴリ'
-        verbose_name_plural = 'Todoカテゴリ'
\ No newline at end of file
+        verbose_name_plural = 'Todoカテゴリ'
+        indexes = [
+            # カテゴリ側からの集計・絞り込み用（todo側はunique制約のインデックスを使う）
+            models.Index(fields=['category', 'todo'], name='todocategory_category_todo_idx'),
+        ]
+
+class TodoStats(models.Model):
+    """Todo件数のカウンタ（category=Noneの行がユーザー全体の集計）"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='todo_stats')
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, null=True, blank=True, related_name='stats'
+    )
+    total = models.IntegerField(default=0, verbose_name='総数')
+    completed = models.IntegerField(default=0, verbose_name='完了数')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
+
+    class Meta:
+        verbose_name = 'Todo統計'
+        verbose_name_plural = 'Todo統計'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user'], condition=models.Q(category__isnull=True), name='todostats_user_unique'
+            ),
+            models.UniqueConstraint(fields=['user', 'category'], name='todostats_user_category_unique'),
+        ]
+
+class TodoDailyStats(models.Model):
+    """日別（UTC）のTodo件数バケット"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='todo_daily_stats')
+    day = models.DateField(verbose_name='日付')
+    completed = models.IntegerField(default=0, verbose_name='完了数')  # この日に完了したTodo
+    due_pending = models.IntegerField(default=0, verbose_name='期限の未完了数')  # この日が期限の未完了Todo
+
+    class Meta:
+        unique_together = ['user', 'day']
+        verbose_name = 'Todo日別統計'
+        verbose_name_plural = 'Todo日別統計'
+
+class TodoSearchDocument(models.Model):
+    """全文検索用にTodoのname・descriptionをトークン化したテキスト（todos.search を参照）"""
+    todo = models.OneToOneField(Todo, on_delete=models.CASCADE, related_name='search_document')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    body = models.TextField(blank=True, verbose_name='検索テキスト')
+
+    class Meta:
+        verbose_name = 'Todo検索ドキュメント'
+        verbose_name_plural = 'Todo検索ドキュメント'
+
+class Tombstone(models.Model):
+    """削除されたTodo・カテゴリの記録（差分同期で削除を伝えるため。古いものは purge_tombstones で削除）"""
+    KIND_TODO = 'todo'
+    KIND_CATEGORY = 'category'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(
+        max_length=10,
+        choices=[(KIND_TODO, 'Todo'), (KIND_CATEGORY, 'カテゴリ')],
+        verbose_name='種類',
+    )
+    object_id = models.UUIDField(verbose_name='削除されたID')
+    deleted_at = models.DateTimeField(verbose_name='削除日時')
+
+    class Meta:
+        verbose_name = '削除記録'
+        verbose_name_plural = '削除記録'
+        indexes = [
+            models.Index(fields=['user', 'deleted_at'], name='tombstone_user_deleted_idx'),
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+        ]
+
+class ArchivedTodo(models.Model):
+    """アーカイブした完了済みTodo（todos.archive を参照）
+
+    一覧・インデックスの対象から外すため Todo とは別のテーブルに置く。カテゴリは名前のリストで持ち、
+    Todo・カテゴリへの外部キーは持たない（カテゴリを改名・削除してもこの行は書き換えない）。
+    """
+    id = models.UUIDField(primary_key=True, editable=False)  # 元のTodoのID
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    name = models.CharField(max_length=500, verbose_name='タスク名')
+    description = models.TextField(blank=True, verbose_name='説明')
+    priority = models.CharField(
+        max_length=10, choices=Todo._meta.get_field('priority').choices, default='medium', verbose_name='優先度'
+    )
+    due_date = models.DateTimeField(null=True, blank=True, verbose_name='期限')
+    categories = models.JSONField(default=list, blank=True, verbose_name='カテゴリ名')
+    completed_at = models.DateTimeField(verbose_name='完了日時')
+    created_at = models.DateTimeField(verbose_name='作成日時')
+    archived_at = models.DateTimeField(verbose_name='アーカイブ日時')
+
+    class Meta:
+        verbose_name = 'アーカイブ済みTodo'
+        verbose_name_plural = 'アーカイブ済みTodo'
+        indexes = [
+            models.Index(fields=['user', '-completed_at'], name='archived_user_completed_idx'),
+        ]
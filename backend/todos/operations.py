@@ -0,0 +1,441 @@
+"""Todoへの書き込みをSQLの集合操作として行う処理"""
+import logging
+import threading
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections, models, transaction
+from django.db.models import Case, CharField, Count, IntegerField, Value, When
+from django.utils import timezone
+from .cache import invalidate_todo_cache
+from .models import Category, Todo, TodoCategory, Tombstone
+from .ranking import key_between, rank_sequence
+from .stats import StatsDelta
+from .sync import record_deletions
+
+logger = logging.getLogger(__name__)
+
+
+def _case_batch_size(params_per_row):
+    """CASE式のUPDATEを1文で送れる件数（パラメータ数に上限があるDBのみ分割する）"""
+    max_params = connection.features.max_query_params
+    if not max_params:
+        return None
+    return max(1, (max_params - 3) // params_per_row)
+
+
+def update_todos_by_case(user_id, values, now, **fields):
+    """{Todo ID: {フィールド名: 値}} をフィールドごとのCASE式でまとめて更新する
+
+    ユーザーのTodoだけを更新し、更新した件数を返す。統計カウンタ・キャッシュ・イベントは呼び出し側で扱う。
+    """
+    ids = list(values)
+    batch_size = _case_batch_size(2 * len(fields) + 1) or max(1, len(ids))
+    updated = 0
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        updates = {
+            name: Case(
+                *[When(id=todo_id, then=Value(values[todo_id][name])) for todo_id in batch],
+                output_field=output_field,
+            )
+            for name, output_field in fields.items()
+        }
+        updated += Todo.objects.filter(user_id=user_id, id__in=batch).update(**updates, updated_at=now)
+    return updated
+
+
+def set_todo_categories(todo, category_ids, created=False):
+    """Todoのカテゴリを category_ids に合わせる（他ユーザーのカテゴリは無視する）
+
+    所有チェックは1クエリ、既存の関連との差分だけを bulk_create / 削除する。
+    created=True の場合は既存の関連がないものとして読み込みを省略する。
+    """
+    with transaction.atomic():
+        wanted = set(
+            Category.objects.filter(user_id=todo.user_id, id__in=set(category_ids)).values_list('id', flat=True)
+        )
+        current = set() if created else set(
+            TodoCategory.objects.filter(todo=todo).values_list('category_id', flat=True)
+        )
+        added = wanted - current
+        removed = current - wanted
+        if removed:
+            TodoCategory.objects.filter(todo=todo, category_id__in=removed).delete()
+        if added:
+            TodoCategory.objects.bulk_create([
+                TodoCategory(todo=todo, category_id=category_id) for category_id in added
+            ])
+
+        delta = StatsDelta(todo.user_id)
+        delta.add_categories(added, total=1, completed=int(todo.completed))
+        delta.add_categories(removed, total=-1, completed=-int(todo.completed))
+        delta.apply()
+    return wanted
+
+
+def _toggle_returning(todo_id, user_id, now):
+    """PostgreSQL: 1文のUPDATE ... RETURNINGで切り替え、前後の値を返す"""
+    qn = connection.ops.quote_name
+    opts = Todo._meta
+    table = qn(opts.db_table)
+    column = {name: qn(opts.get_field(name).column) for name in (
+        'id', 'user', 'completed', 'completed_at', 'due_date', 'updated_at'
+    )}
+    # CTEのFOR UPDATEで行をロックし、更新前のcompleted_atも同じ文で取得する
+    sql = (
+        f'WITH old AS ('
+        f'SELECT {column["id"]}, {column["completed_at"]} FROM {table} '
+        f'WHERE {column["id"]} = %s AND {column["user"]} = %s FOR UPDATE'
+        f') '
+        f'UPDATE {table} AS t SET '
+        f'{column["completed"]} = NOT t.{column["completed"]}, '
+        f'{column["completed_at"]} = CASE WHEN t.{column["completed"]} THEN NULL ELSE %s END, '
+        f'{column["updated_at"]} = %s '
+        f'FROM old WHERE t.{column["id"]} = old.{column["id"]} '
+        f'RETURNING t.{column["completed"]}, t.{column["completed_at"]}, '
+        f't.{column["due_date"]}, old.{column["completed_at"]}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [todo_id, user_id, now, now])
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    completed, completed_at, due_date, old_completed_at = row
+    return {
+        'completed': completed,
+        'completed_at': completed_at,
+        'due_date': due_date,
+        'old_completed_at': old_completed_at,
+    }
+
+
+def _toggle_orm(todo_id, user_id, now):
+    """その他のDB: 行ロックを取ってからUPDATEする"""
+    old = Todo.objects.select_for_update().filter(id=todo_id, user_id=user_id).values(
+        'completed', 'completed_at', 'due_date'
+    ).first()
+    if old is None:
+        return None
+    completed = not old['completed']
+    completed_at = now if completed else None
+    Todo.objects.filter(id=todo_id).update(
+        completed=completed, completed_at=completed_at, updated_at=now
+    )
+    return {
+        'completed': completed,
+        'completed_at': completed_at,
+        'due_date': old['due_date'],
+        'old_completed_at': old['completed_at'],
+    }
+
+
+def toggle_todo_completed(todo_id, user_id):
+    """Todoの完了状態を反転し、{'id', 'completed', 'completed_at'} を返す（存在しなければNone）"""
+    now = timezone.now()
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            result = _toggle_returning(todo_id, user_id, now)
+        else:
+            result = _toggle_orm(todo_id, user_id, now)
+        if result is None:
+            return None
+
+        completed = result['completed']
+        delta = StatsDelta(user_id)
+        delta.add(not completed, result['old_completed_at'], result['due_date'], sign=-1)
+        delta.add(completed, result['completed_at'], result['due_date'])
+        delta.add_todo_categories(todo_id, completed=1 if completed else -1)
+        delta.apply()
+
+    return {
+        'id': todo_id,
+        'completed': completed,
+        'completed_at': result['completed_at'],
+    }
+
+
+def apply_todo_order(user_id, orders):
+    """{Todo ID: order_index} を所有チェック1回とCASE式のUPDATEで反映する
+
+    並び順キーも、送られてきたTodoが現在使っているキーを新しい順番で割り当て直す。
+    戻り値は (更新件数, 見つからなかったIDのリスト)。
+    """
+    with transaction.atomic():
+        owned = dict(Todo.objects.filter(user_id=user_id, id__in=list(orders)).values_list('id', 'rank'))
+        unknown_ids = [todo_id for todo_id in orders if todo_id not in owned]
+        if not owned:
+            return 0, unknown_ids
+
+        ordered_ids = sorted(owned, key=lambda todo_id: (orders[todo_id], owned[todo_id]))
+        values = {
+            todo_id: {'order_index': orders[todo_id], 'rank': rank}
+            for todo_id, rank in zip(ordered_ids, sorted(owned.values()))
+        }
+        updated = update_todos_by_case(
+            user_id, values, timezone.now(), order_index=IntegerField(), rank=CharField()
+        )
+    return updated, unknown_ids
+
+
+def _chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _add_category_counts(delta, todo_ids, total=0, completed=0):
+    """Todoに付いているカテゴリのカウンタを、カテゴリごとの件数の集計1クエリで加減算する"""
+    counts = TodoCategory.objects.filter(todo_id__in=todo_ids).values('category_id').annotate(
+        count=Count('id')
+    ).order_by()
+    for row in counts:
+        delta.add_categories([row['category_id']], total=total * row['count'], completed=completed * row['count'])
+
+
+def _set_completed_returning(user_id, todo_ids, completed, now):
+    """PostgreSQL: 状態が変わる行だけを1文の UPDATE ... RETURNING で更新し、(id, 更新前のcompleted_at, due_date) を返す"""
+    qn = connection.ops.quote_name
+    opts = Todo._meta
+    table = qn(opts.db_table)
+    column = {name: qn(opts.get_field(name).column) for name in (
+        'id', 'user', 'completed', 'completed_at', 'due_date', 'updated_at'
+    )}
+    sql = (
+        f'WITH old AS ('
+        f'SELECT {column["id"]}, {column["completed_at"]} FROM {table} '
+        f'WHERE {column["user"]} = %s AND {column["id"]} = ANY(%s) AND {column["completed"]} = %s FOR UPDATE'
+        f') '
+        f'UPDATE {table} AS t SET {column["completed"]} = %s, {column["completed_at"]} = %s, '
+        f'{column["updated_at"]} = %s '
+        f'FROM old WHERE t.{column["id"]} = old.{column["id"]} '
+        f'RETURNING t.{column["id"]}, old.{column["completed_at"]}, t.{column["due_date"]}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [
+            user_id, list(todo_ids), not completed, completed, now if completed else None, now,
+        ])
+        return cursor.fetchall()
+
+
+def _set_completed_orm(user_id, todo_ids, completed, now):
+    """その他のDB: 状態が変わる行をロックして読み、IDを指定してUPDATEする"""
+    rows = list(
+        Todo.objects.select_for_update().filter(user_id=user_id, id__in=todo_ids, completed=not completed)
+        .values_list('id', 'completed_at', 'due_date')
+    )
+    if rows:
+        Todo.objects.filter(id__in=[row[0] for row in rows]).update(
+            completed=completed, completed_at=now if completed else None, updated_at=now
+        )
+    return rows
+
+
+def set_todos_completed(user_id, todo_ids, completed):
+    """Todoを一括で完了・未完了にし、実際に状態が変わったTodoのIDのリストを返す
+
+    既に同じ状態のTodoは更新しない（完了日時も変わらない）。統計カウンタは変わった行の値から求める。
+    """
+    now = timezone.now()
+    changed = []
+    delta = StatsDelta(user_id)
+    with transaction.atomic():
+        for batch in _chunks(todo_ids, settings.TODO_BULK_CHUNK_SIZE):
+            if connection.vendor == 'postgresql':
+                rows = _set_completed_returning(user_id, batch, completed, now)
+            else:
+                rows = _set_completed_orm(user_id, batch, completed, now)
+            for todo_id, old_completed_at, due_date in rows:
+                delta.add(not completed, old_completed_at, due_date, sign=-1)
+                delta.add(completed, now if completed else None, due_date)
+            batch_ids = [row[0] for row in rows]
+            if batch_ids:
+                _add_category_counts(delta, batch_ids, completed=1 if completed else -1)
+            changed.extend(batch_ids)
+        delta.apply()
+    return changed
+
+
+def related_querysets(todo_ids):
+    """Todoを参照する行の (関連, クエリセット) のリスト（DO_NOTHING の関連は含めない）
+
+    SQLで直接処理できるのは CASCADE と SET_NULL だけ。それ以外の on_delete や、参照する行を
+    さらに参照するモデルがある関連は、Djangoの delete() と結果が変わるので ImproperlyConfigured にする。
+    """
+    result = []
+    for relation in Todo._meta.related_objects:
+        model, field, on_delete = relation.related_model, relation.field, relation.on_delete
+        if on_delete is models.DO_NOTHING:
+            continue
+        if relation.many_to_many or on_delete not in (models.CASCADE, models.SET_NULL):
+            raise ImproperlyConfigured(
+                f'{model.__name__}.{field.name} の on_delete には対応していません'
+                f'（CASCADE / SET_NULL / DO_NOTHING のいずれかにしてください）。'
+            )
+        if on_delete is models.CASCADE and model._meta.related_objects:
+            raise ImproperlyConfigured(
+                f'{model.__name__} を参照するモデルがあるため、{model.__name__} の行をSQLで直接削除できません。'
+            )
+        result.append((relation, model._base_manager.filter(**{f'{field.name}__in': todo_ids})))
+    return result
+
+
+def delete_related_rows(todo_ids):
+    """Todoを参照する行を、モデルのインスタンスを読み込まずに削除する（SET_NULL の関連はNULLにする）
+
+    対応していない関連があれば、何も変更せずに ImproperlyConfigured を送出する。
+    """
+    for relation, queryset in related_querysets(todo_ids):
+        if relation.on_delete is models.CASCADE:
+            queryset._raw_delete(queryset.db)
+        else:
+            queryset.update(**{relation.field.name: None})
+
+
+def _delete_returning(queryset, limit):
+    """PostgreSQL: 1文の DELETE ... RETURNING で最大 limit 件を削除し、削除した行の値を返す"""
+    qn = connection.ops.quote_name
+    opts = Todo._meta
+    column = {name: qn(opts.get_field(name).column) for name in ('id', 'completed', 'completed_at', 'due_date')}
+    subquery, params = queryset.select_for_update().order_by().values('pk')[:limit].query.sql_with_params()
+    sql = (
+        f'DELETE FROM {qn(opts.db_table)} WHERE {column["id"]} IN ({subquery}) '
+        f'RETURNING {column["id"]}, {column["completed"]}, {column["completed_at"]}, {column["due_date"]}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _delete_chunk(queryset, limit):
+    """最大 limit 件を削除し、(削除した行, 削除した (todo_id, category_id) の関連) を返す"""
+    if connection.vendor == 'postgresql':
+        # 外部キー制約はコミット時に確認される（DEFERRABLE）ので、関連の行より先にTodoを削除できる
+        rows = _delete_returning(queryset, limit)
+    else:
+        # その他のDB: 削除する行をロックして読み、関連の行を消してからIDを指定して削除する
+        rows = list(
+            queryset.select_for_update().order_by()
+            .values_list('id', 'completed', 'completed_at', 'due_date')[:limit]
+        )
+    ids = [row[0] for row in rows]
+    if not ids:
+        return [], []
+    links = list(TodoCategory.objects.filter(todo_id__in=ids).values_list('todo_id', 'category_id'))
+    delete_related_rows(ids)
+    if connection.vendor != 'postgresql':
+        Todo.objects.filter(id__in=ids)._raw_delete(queryset.db)
+    return rows, links
+
+
+def delete_todos(user_id, queryset):
+    """queryset のTodoを TODO_BULK_CHUNK_SIZE 件ずつ削除し、削除したIDのリストを返す
+
+    Djangoの delete() と違い、Todoや関連する行をモデルのインスタンスとして読み込まない。
+    関連テーブル（カテゴリの関連・検索ドキュメント）の行はSQLで直接削除し、
+    統計カウンタ・削除記録（差分同期用）も同じトランザクションで更新する。
+    """
+    deleted = []
+    limit = settings.TODO_BULK_CHUNK_SIZE
+    with transaction.atomic():
+        while True:
+            rows, links = _delete_chunk(queryset, limit)
+            if not rows:
+                break
+            delta = StatsDelta(user_id)
+            completed_ids = set()
+            for todo_id, completed, completed_at, due_date in rows:
+                delta.add(completed, completed_at, due_date, sign=-1)
+                if completed:
+                    completed_ids.add(todo_id)
+            for todo_id, category_id in links:
+                delta.add_categories([category_id], total=-1, completed=-int(todo_id in completed_ids))
+            delta.apply()
+            ids = [row[0] for row in rows]
+            record_deletions(user_id, Tombstone.KIND_TODO, ids)
+            deleted.extend(ids)
+            if len(rows) < limit:
+                break
+    return deleted
+
+
+class RankConflict(Exception):
+    """指定された前後のTodoの間にキーを作れない（並び順キーの重複など）"""
+
+
+def _neighbour_ranks(user_id, todo_id, before_id, after_id):
+    """移動先の直前・直後のキーを返す。指定がない側は隣の行を1行だけ読む"""
+    ids = [neighbour for neighbour in (before_id, after_id) if neighbour]
+    ranks = dict(Todo.objects.filter(user_id=user_id, id__in=ids).values_list('id', 'rank'))
+    if len(ranks) != len(ids):
+        raise Todo.DoesNotExist
+    others = Todo.objects.filter(user_id=user_id).exclude(id=todo_id)
+
+    lower = ranks.get(after_id)
+    upper = ranks.get(before_id)
+    if after_id and not before_id:
+        upper = others.filter(rank__gt=lower).order_by('rank').values_list('rank', flat=True).first()
+    elif before_id and not after_id:
+        lower = others.filter(rank__lt=upper).order_by('-rank').values_list('rank', flat=True).first()
+    return lower, upper
+
+
+def move_todo_between(user_id, todo_id, before_id=None, after_id=None):
+    """Todoを after_id の直後・before_id の直前に移動し、新しいキーを返す
+
+    書き込むのは移動したTodoの1行だけ。存在しないIDが含まれる場合は Todo.DoesNotExist。
+    """
+    for attempt in range(2):
+        with transaction.atomic():
+            if not Todo.objects.filter(user_id=user_id, id=todo_id).exists():
+                raise Todo.DoesNotExist
+            lower, upper = _neighbour_ranks(user_id, todo_id, before_id, after_id)
+            if lower is None or upper is None or lower < upper:
+                rank = key_between(lower, upper)
+                Todo.objects.filter(user_id=user_id, id=todo_id).update(rank=rank, updated_at=timezone.now())
+                schedule_rank_rebalance(user_id, rank)
+                return rank
+        # キーが重複していて間に入れられない場合は、振り直してからもう一度試す
+        rebalance_ranks(user_id)
+    raise RankConflict
+
+
+def rebalance_ranks(user_id):
+    """ユーザーの全Todoに等間隔の短いキーを振り直す"""
+    with transaction.atomic():
+        ids = list(
+            Todo.objects.select_for_update().filter(user_id=user_id)
+            .order_by('rank', 'order_index', '-created_at', 'id').values_list('id', flat=True)
+        )
+        values = {todo_id: {'rank': rank} for todo_id, rank in zip(ids, rank_sequence(len(ids)))}
+        invalidate_todo_cache(user_id)
+        return update_todos_by_case(user_id, values, timezone.now(), rank=CharField())
+
+
+_pending_rebalances = set()
+_pending_lock = threading.Lock()
+
+
+def _run_rebalance(user_id):
+    try:
+        rebalance_ranks(user_id)
+    except Exception:
+        logger.exception('並び順キーの振り直しに失敗しました: user=%s', user_id)
+    finally:
+        with _pending_lock:
+            _pending_rebalances.discard(user_id)
+        connections.close_all()
+
+
+def schedule_rank_rebalance(user_id, rank):
+    """キーが長くなりすぎた場合、コミット後にバックグラウンドで振り直す"""
+    if len(rank) <= settings.TODO_RANK_MAX_LENGTH:
+        return
+
+    def start():
+        with _pending_lock:
+            if user_id in _pending_rebalances:
+                return
+            _pending_rebalances.add(user_id)
+        threading.Thread(target=_run_rebalance, args=(user_id,), daemon=True).start()
+
+    transaction.on_commit(start)
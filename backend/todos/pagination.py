@@ -0,0 +1,181 @@
+import base64
+import json
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class TodoPagination(PageNumberPagination):
+    """Todo一覧のページネーション
+
+    通常はページ番号方式。`?cursor=` が指定された場合はキーセット方式に切り替え、
+    COUNTクエリもOFFSETも使わずに並び順のキーでシークする。
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = '無効なカーソルです。'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        return self.keyset_page(list(self.keyset_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset の非同期版（件数の取得・ページの読み込みに非同期ORMを使う）"""
+        self.request = request
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        if self.cursor_mode:
+            self.page_size = page_size
+            queryset = self.keyset_queryset(queryset, request, view)
+            return self.keyset_page([instance async for instance in queryset])
+
+        # Paginatorの件数だけを先に非同期で求めておけば、ページの切り出しはクエリを発行しない
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [instance async for instance in self.page.object_list]
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+    def keyset_queryset(self, queryset, request, view):
+        """キーセット方式で1ページ分（+1件）を取得するクエリセット"""
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.nullable_fields = {field.name for field in queryset.model._meta.concrete_fields if field.null}
+        position = self.decode_cursor(request, queryset)
+
+        queryset = queryset.order_by(*[self.order_expression(field) for field in self.ordering])
+        if position is not None:
+            queryset = queryset.filter(self.seek_filter(position))
+        # 1件多く取得して次ページの有無を判定する
+        return queryset[:self.page_size + 1]
+
+    def keyset_page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        self.next_position = self.get_position(self.page[-1]) if self.has_next else None
+        return self.page
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_ordering(self, request, queryset, view):
+        """OrderingFilterと同じ並び順に、一意性を保証するidを付け足す"""
+        ordering = list(OrderingFilter().get_ordering(request, queryset, view) or ['id'])
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering.append('id')
+        return ordering
+
+    def order_expression(self, field):
+        name = field.lstrip('-')
+        descending = field.startswith('-')
+        if name in self.nullable_fields:
+            # NULLの位置をDBに依存させず、昇順・降順とも末尾に固定する
+            expression = F(name)
+            return expression.desc(nulls_last=True) if descending else expression.asc(nulls_last=True)
+        return F(name).desc() if descending else F(name).asc()
+
+    def seek_filter(self, position):
+        """(a, b, c) > (x, y, z) を並び方向を考慮して展開したQを返す"""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            if name in self.nullable_fields:
+                if value is None:
+                    # NULLは末尾なので、これより後ろは同じくNULLの行のみ
+                    equal &= Q(**{f'{name}__isnull': True})
+                    continue
+                after = Q(**{f'{name}__{lookup}': value}) | Q(**{f'{name}__isnull': True})
+            else:
+                after = Q(**{f'{name}__{lookup}': value})
+            condition |= equal & after
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_position(self, instance):
+        """ページ末尾の行（モデルのインスタンスまたは values() の dict）の並び順の値"""
+        position = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            value = instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            elif value is not None and not isinstance(value, (int, float, bool)):
+                value = str(value)
+            position.append(value)
+        return position
+
+    def encode_cursor(self, position):
+        payload = json.dumps({'o': self.ordering, 'p': position}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def cursor_field(self, queryset, name):
+        """並び順の値を検証するフィールド（モデルのフィールドまたはアノテーションの出力フィールド）"""
+        if name == 'pk':
+            return queryset.model._meta.pk
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        return queryset.model._meta.get_field(name)
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            ordering, position = payload['o'], payload['p']
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+        # 並び順が変わった場合は古いカーソルを受け付けない
+        if ordering != self.ordering or not isinstance(position, list) or len(position) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        # 改ざんされた値をそのままクエリに渡さないよう、フィールドの型に変換して確かめる
+        decoded = []
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            if value is None:
+                if name not in self.nullable_fields:
+                    raise NotFound(self.invalid_cursor_message)
+                decoded.append(None)
+                continue
+            try:
+                value = self.cursor_field(queryset, name).to_python(value)
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            decoded.append(value)
+        return decoded
@@ -0,0 +1,92 @@
+"""並び順用の辞書順キー（フラクショナルインデックス）
+
+キーは 0〜1 の小数の桁を36進数で並べた文字列として扱い、任意の2つのキーの間に
+新しいキーを作れる。DBの照合順序に左右されないよう数字と英小文字だけを使い、
+末尾が '0' のキーは作らない（'a' と 'a0' が同じ値になってしまうため）。
+"""
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+BASE = len(DIGITS)
+
+
+def _digit(char):
+    return DIGITS.index(char)
+
+
+def _midpoint(a, b):
+    """a < b となる2つの桁列の中間（bがNoneなら1.0とみなす）"""
+    if b is not None:
+        # 共通の接頭辞はそのまま残す（aは足りない桁を'0'とみなす）
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else '0') == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _midpoint(a[n:], b[n:])
+
+    digit_a = _digit(a[0]) if a else 0
+    digit_b = _digit(b[0]) if b is not None else BASE
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b) // 2]
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def key_between(a, b):
+    """a と b の間のキー。a=None は先頭、b=None は末尾を表す"""
+    a = a or ''
+    if b is not None and a >= b:
+        raise ValueError(f'{a!r} < {b!r} である必要があります。')
+    return _midpoint(a, b)
+
+
+def key_after(a):
+    """a の直後に追加するキー。末尾への追加でキーが伸びにくいよう、桁を1つ繰り上げる"""
+    if not a:
+        return key_between(None, None)
+    for i, char in enumerate(a):
+        digit = _digit(char)
+        if digit < BASE - 1:
+            return a[:i] + DIGITS[digit + 1]
+    return a + DIGITS[1]
+
+
+def keys_between(a, b, n):
+    """a と b の間に等間隔に近いn個のキーを作る"""
+    if n <= 0:
+        return []
+    if n == 1:
+        return [key_between(a, b)]
+    middle = n // 2
+    c = key_between(a, b)
+    return keys_between(a, c, middle) + [c] + keys_between(c, b, n - middle - 1)
+
+
+def _encode(value, width):
+    chars = []
+    for _ in range(width):
+        value, remainder = divmod(value, BASE)
+        chars.append(DIGITS[remainder])
+    return ''.join(reversed(chars)).rstrip('0')
+
+
+def rank_sequence(n):
+    """n個のキーを等間隔で作る（再配置用）
+
+    末尾への追加が短いキーで済むよう、キー空間の前半だけを使う。
+    """
+    width = 1
+    while BASE ** width < 4 * (n + 1):
+        width += 1
+    step = (BASE ** width // 2) // (n + 1)
+    return [_encode(step * (i + 1), width) for i in range(n)]
+
+
+def key_sequence(a, width=6):
+    """a の後ろに続くキーを順に返すイテレータ（件数が分からない連続追加用）
+
+    a の直後のキーを接頭辞とし、固定幅の連番を付ける。連番は奇数だけを使うので
+    末尾が '0' にならない。1つの接頭辞で BASE ** width // 2 個まで作れる。
+    """
+    prefix = key_after(a)
+    for i in range(BASE ** width // 2):
+        yield prefix + _encode(2 * i + 1, width)
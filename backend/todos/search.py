@@ -0,0 +1,183 @@
+"""Todoの全文検索
+
+name・descriptionを正規化してトークン化したテキストを TodoSearchDocument に保存し、
+DBごとの全文検索インデックスで検索する。
+
+- PostgreSQL: (user_id, to_tsvector('simple', body)) のGINインデックス（btree_gin）
+- SQLite: FTS5（外部コンテンツテーブル + トリガーで同期）
+- その他: 従来どおりの icontains
+
+日本語は単語の区切りがないため、かな・漢字の連続は2文字ずつのn-gram（bigram）に分割する。
+"""
+import re
+import unicodedata
+from functools import lru_cache
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+from .models import TodoSearchDocument
+
+_CJK = '぀-ヿ㐀-䶿一-鿿豈-﫿ｦ-ﾟ'
+_TOKEN_RE = re.compile(rf'([{_CJK}]+)|([^\W_{_CJK}]+)')
+
+FTS_TABLE = 'todos_todosearch_fts'
+
+
+def _normalize(text):
+    return unicodedata.normalize('NFKC', text or '').casefold()
+
+
+def _bigrams(run):
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def tokenize_document(text):
+    """インデックス用のトークン列。かな・漢字はbigramと末尾の1文字、それ以外は単語単位"""
+    tokens = []
+    for cjk, word in _TOKEN_RE.findall(_normalize(text)):
+        if word:
+            tokens.append(word)
+        elif len(cjk) == 1:
+            tokens.append(cjk)
+        else:
+            # 末尾の1文字も入れておくと、1文字の検索語が前方一致で見つかる
+            tokens.extend(_bigrams(cjk) + [cjk[-1]])
+    return tokens
+
+
+def tokenize_query(text):
+    """検索語を (トークン, 前方一致かどうか) のリストにする"""
+    terms = []
+    for cjk, word in _TOKEN_RE.findall(_normalize(text)):
+        if word:
+            terms.append((word, True))
+        elif len(cjk) == 1:
+            terms.append((cjk, True))
+        else:
+            terms.extend((bigram, False) for bigram in _bigrams(cjk))
+    return terms
+
+
+def document_text(name, description):
+    return ' '.join(tokenize_document(name) + tokenize_document(description))
+
+
+class IcontainsSearchBackend:
+    """インデックスを使わない検索（DRFのSearchFilterと同じ条件）"""
+
+    def index(self, todos):
+        pass
+
+    def search(self, queryset, text, user_id):
+        queryset = queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+        for term in text.replace(',', ' ').split():
+            queryset = queryset.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        return queryset
+
+
+class DocumentSearchBackend:
+    """TodoSearchDocument にトークン化したテキストを保存するバックエンドの共通処理"""
+
+    def index(self, todos):
+        documents = [
+            TodoSearchDocument(
+                todo_id=todo.pk, user_id=todo.user_id, body=document_text(todo.name, todo.description)
+            )
+            for todo in todos
+        ]
+        if documents:
+            TodoSearchDocument.objects.bulk_create(
+                documents, update_conflicts=True, unique_fields=['todo'], update_fields=['body'],
+            )
+
+    def match_query(self, terms):
+        raise NotImplementedError
+
+    def match_sql(self):
+        """(ユーザーの一致するtodo_idを返すSQL, 関連度を返す相関サブクエリのSQL)
+
+        前者のパラメータは [検索クエリ, ユーザーID]、後者は [検索クエリ]。
+        """
+        raise NotImplementedError
+
+    def search(self, queryset, text, user_id):
+        terms = tokenize_query(text)
+        if not terms:
+            return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+        query = self.match_query(terms)
+        match_sql, rank_sql = self.match_sql()
+        user_param = TodoSearchDocument._meta.get_field('user').get_db_prep_value(user_id, connection)
+        return queryset.filter(id__in=RawSQL(match_sql, [query, user_param])).annotate(
+            search_rank=RawSQL(rank_sql, [query], output_field=FloatField())
+        )
+
+
+class SQLiteFTSSearchBackend(DocumentSearchBackend):
+    """SQLite FTS5 による検索。関連度は bm25（符号を反転して大きいほど関連が高い）"""
+
+    def match_query(self, terms):
+        return ' AND '.join(f'"{token}"' + ('*' if prefix else '') for token, prefix in terms)
+
+    def match_sql(self):
+        document = TodoSearchDocument._meta.db_table
+        match_sql = (
+            f'SELECT d.todo_id FROM {FTS_TABLE} f JOIN {document} d ON d.id = f.rowid '
+            f'WHERE {FTS_TABLE} MATCH %s AND d.user_id = %s'
+        )
+        rank_sql = (
+            f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} f JOIN {document} d ON d.id = f.rowid '
+            f'WHERE {FTS_TABLE} MATCH %s AND d.todo_id = todos_todo.id'
+        )
+        return match_sql, rank_sql
+
+
+class PostgresSearchBackend(DocumentSearchBackend):
+    """PostgreSQL の tsvector による検索。関連度は ts_rank"""
+
+    def match_query(self, terms):
+        return ' & '.join(f"'{token}'" + (':*' if prefix else '') for token, prefix in terms)
+
+    def match_sql(self):
+        document = TodoSearchDocument._meta.db_table
+        match_sql = (
+            f"SELECT todo_id FROM {document} "
+            f"WHERE to_tsvector('simple', body) @@ to_tsquery('simple', %s) AND user_id = %s"
+        )
+        rank_sql = (
+            f"SELECT ts_rank(to_tsvector('simple', body), to_tsquery('simple', %s)) "
+            f"FROM {document} WHERE {document}.todo_id = todos_todo.id"
+        )
+        return match_sql, rank_sql
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path, vendor):
+    if path == 'auto':
+        if vendor == 'postgresql':
+            return PostgresSearchBackend()
+        if vendor == 'sqlite':
+            return SQLiteFTSSearchBackend()
+        return IcontainsSearchBackend()
+    return import_string(path)()
+
+
+def get_search_backend():
+    return _load_backend(settings.TODO_SEARCH_BACKEND, connection.vendor)
+
+
+def index_todos(todos):
+    """Todoの検索インデックスを更新する（書き込み処理から呼び出す）"""
+    get_search_backend().index(todos)
+
+
+class TodoSearchFilter(BaseFilterBackend):
+    """`?search=` による全文検索。結果には関連度 search_rank を付与する"""
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '')
+        return get_search_backend().search(queryset, text, request.user.pk)
@@ -1,5 +1,9 @@
+import uuid
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
-from .models import Todo, Category, TodoCategory
+from .models import ArchivedTodo, Todo, Category
+from .operations import set_todo_categories
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -11,8 +15,27 @@ class CategorySerializer(serializers.ModelSerializer):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
 
-class TodoSerializer(serializers.ModelSerializer):
-    categories = CategorySerializer(many=True, read_only=True, source='todo_categories.category')
+class TodoCategoriesMixin:
+    """category_ids を受け取り、カテゴリの関連付けを差分で保存する"""
+
+    def create(self, validated_data):
+        category_ids = validated_data.pop('category_ids', None)
+        with transaction.atomic():
+            todo = super().create(validated_data)
+            if category_ids:
+                set_todo_categories(todo, category_ids, created=True)
+        return todo
+
+    def update(self, instance, validated_data):
+        category_ids = validated_data.pop('category_ids', None)
+        with transaction.atomic():
+            todo = super().update(instance, validated_data)
+            if category_ids is not None:
+                set_todo_categories(todo, category_ids)
+        return todo
+
+class TodoSerializer(TodoCategoriesMixin, serializers.ModelSerializer):
+    categories = CategorySerializer(many=True, read_only=True)
     category_ids = serializers.ListField(
         child=serializers.UUIDField(), write_only=True, required=False
     )
@@ -20,47 +43,17 @@ class TodoSerializer(serializers.ModelSerializer):
     class Meta:
         model = Todo
         fields = [
-            'id', 'name', 'description', 'completed', 'order_index',
+            'id', 'name', 'description', 'completed', 'order_index', 'rank',
             'priority', 'due_date', 'completed_at', 'created_at', 'updated_at',
             'categories', 'category_ids'
         ]
-        read_only_fields = ['id', 'completed_at', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'rank', 'completed_at', 'created_at', 'updated_at']
 
     def create(self, validated_data):
-        category_ids = validated_data.pop('category_ids', [])
         validated_data['user'] = self.context['request'].user
-        todo = super().create(validated_data)
-        
-        # カテゴリの関連付け
-        for category_id in category_ids:
-            try:
-                category = Category.objects.get(id=category_id, user=todo.user)
-                TodoCategory.objects.create(todo=todo, category=category)
-            except Category.DoesNotExist:
-                pass
-        
-        return todo
-
-    def update(self, instance, validated_data):
-        category_ids = validated_data.pop('category_ids', None)
-        todo = super().update(instance, validated_data)
-        
-        # カテゴリの更新
-        if category_ids is not None:
-            # 既存のカテゴリ関連を削除
-            TodoCategory.objects.filter(todo=todo).delete()
-            
-            # 新しいカテゴリ関連を作成
-            for category_id in category_ids:
-                try:
-                    category = Category.objects.get(id=category_id, user=todo.user)
-                    TodoCategory.objects.create(todo=todo, category=category)
-                except Category.DoesNotExist:
-                    pass
-        
-        return todo
+        return super().create(validated_data)
 
-class TodoCreateSerializer(serializers.ModelSerializer):
+class TodoCreateSerializer(TodoCategoriesMixin, serializers.ModelSerializer):
     category_ids = serializers.ListField(
         child=serializers.UUIDField(), write_only=True, required=False
     )
@@ -69,7 +62,7 @@ class TodoCreateSerializer(serializers.ModelSerializer):
         model = Todo
         fields = ['name', 'description', 'priority', 'due_date', 'category_ids']
 
-class TodoUpdateSerializer(serializers.ModelSerializer):
+class TodoUpdateSerializer(TodoCategoriesMixin, serializers.ModelSerializer):
     category_ids = serializers.ListField(
         child=serializers.UUIDField(), write_only=True, required=False
     )
@@ -88,17 +81,92 @@ class TodoReorderSerializer(serializers.Serializer):
         for item in value:
             if 'id' not in item or 'order_index' not in item:
                 raise serializers.ValidationError("各アイテムには'id'と'order_index'が必要です。")
+            try:
+                uuid.UUID(item['id'])
+            except (ValueError, TypeError, AttributeError):
+                raise serializers.ValidationError("idはUUIDである必要があります。")
             try:
                 int(item['order_index'])
             except (ValueError, TypeError):
                 raise serializers.ValidationError("order_indexは整数である必要があります。")
         return value
 
+class TodoMoveSerializer(serializers.Serializer):
+    """1件のTodoの移動先（after の直後 / before の直前）"""
+    before = serializers.UUIDField(required=False, allow_null=True)
+    after = serializers.UUIDField(required=False, allow_null=True)
+
+    def validate(self, attrs):
+        if not attrs.get('before') and not attrs.get('after'):
+            raise serializers.ValidationError("'before'または'after'のどちらかを指定してください。")
+        return attrs
+
+class TodoToggleSerializer(serializers.Serializer):
+    """完了状態切り替えの軽量レスポンス"""
+    id = serializers.UUIDField()
+    completed = serializers.BooleanField()
+    completed_at = serializers.DateTimeField(allow_null=True)
+
 class TodoBulkUpdateSerializer(serializers.Serializer):
     """複数のTodoを一括更新"""
     todo_ids = serializers.ListField(child=serializers.UUIDField())
     action = serializers.ChoiceField(choices=['complete', 'incomplete', 'delete'])
 
+class TodoImportSerializer(serializers.Serializer):
+    """インポートするTodo1件（categories はカテゴリ名のリスト）"""
+    name = serializers.CharField(max_length=500)
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+    completed = serializers.BooleanField(required=False, default=False)
+    priority = serializers.ChoiceField(choices=['low', 'medium', 'high'], required=False, default='medium')
+    due_date = serializers.DateTimeField(required=False, allow_null=True, default=None)
+    categories = serializers.ListField(
+        child=serializers.CharField(max_length=100), required=False, default=list
+    )
+
+class TodoSetCategoriesSerializer(serializers.Serializer):
+    """Todoのカテゴリの置き換え"""
+    category_ids = serializers.ListField(child=serializers.UUIDField())
+
+class TodoBatchOperationSerializer(serializers.Serializer):
+    """一括操作の1件分。id には同じリクエスト内で作成したTodoを '$<番号>' で指定できる"""
+    op = serializers.ChoiceField(choices=['create', 'update', 'toggle', 'delete', 'move', 'set_categories'])
+    id = serializers.CharField(required=False)
+    data = serializers.DictField(required=False, default=dict)
+
+    def validate_id(self, value):
+        if value.startswith('$'):
+            try:
+                return int(value[1:])
+            except ValueError:
+                raise serializers.ValidationError("'$'の後には操作の番号を指定してください。")
+        try:
+            return uuid.UUID(value)
+        except ValueError:
+            raise serializers.ValidationError("idはUUIDである必要があります。")
+
+    def validate(self, attrs):
+        if attrs['op'] != 'create' and 'id' not in attrs:
+            raise serializers.ValidationError({'id': 'この操作にはidが必要です。'})
+        return attrs
+
+class TodoBatchSerializer(serializers.Serializer):
+    """Todoの一括操作（atomic=False の場合は失敗した操作だけを取り消す）"""
+    operations = serializers.ListField(
+        child=serializers.DictField(), allow_empty=False, max_length=settings.TODO_BATCH_MAX_OPERATIONS
+    )
+    atomic = serializers.BooleanField(default=True)
+
+class ArchivedTodoSerializer(serializers.ModelSerializer):
+    """アーカイブ済みTodo（読み取り専用。categories はカテゴリ名のリスト）"""
+
+    class Meta:
+        model = ArchivedTodo
+        fields = [
+            'id', 'name', 'description', 'priority', 'due_date', 'categories',
+            'completed_at', 'created_at', 'archived_at'
+        ]
+        read_only_fields = fields
+
 class TodoStatsSerializer(serializers.Serializer):
     """Todo統計情報"""
     total_todos = serializers.IntegerField()
@@ -0,0 +1,255 @@
+"""Todo統計カウンタの増分更新と再構築
+
+TodoStats（ユーザー全体・カテゴリ別の総数と完了数）と TodoDailyStats（UTC日付ごとの
+完了数・期限の未完了数）を書き込み処理と同じトランザクションで更新する。
+日付に依存する値（期限切れ・今日/今週の完了数）は日別バケットから求める。
+アーカイブしたTodo（todos.archive）は総数・完了数・カテゴリ別の件数からは除き、
+日別の完了数にだけ含める。
+"""
+import datetime
+from collections import Counter, defaultdict
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from .models import ArchivedTodo, Todo, Category, TodoCategory, TodoStats, TodoDailyStats
+
+UTC = datetime.timezone.utc
+
+
+def bucket_day(value):
+    """日時を日別バケットのキー（UTC日付）に変換"""
+    return value.astimezone(UTC).date() if value else None
+
+
+def _bump(model, lookup, **deltas):
+    """カウンタ行をF式で加算し、行がなければ作成する"""
+    deltas = {name: value for name, value in deltas.items() if value}
+    if not deltas:
+        return
+    updates = {name: F(name) + value for name, value in deltas.items()}
+    if model.objects.filter(**lookup).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # 同時に作成された場合は加算し直す
+        model.objects.filter(**lookup).update(**updates)
+
+
+class StatsDelta:
+    """1回の書き込みで発生するカウンタの増減を集めて、まとめて適用する"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.total = 0
+        self.completed = 0
+        self.completed_days = Counter()
+        self.due_days = Counter()
+        self.categories = defaultdict(lambda: [0, 0])
+        self.todo_categories = []
+
+    def add(self, completed, completed_at, due_date, sign=1):
+        self.total += sign
+        if completed:
+            self.completed += sign
+            if completed_at:
+                self.completed_days[bucket_day(completed_at)] += sign
+        elif due_date:
+            self.due_days[bucket_day(due_date)] += sign
+
+    def add_todo(self, todo, sign=1):
+        self.add(todo.completed, todo.completed_at, todo.due_date, sign)
+
+    def add_categories(self, category_ids, total=0, completed=0):
+        for category_id in category_ids:
+            counts = self.categories[category_id]
+            counts[0] += total
+            counts[1] += completed
+
+    def add_todo_categories(self, todo_id, total=0, completed=0):
+        """Todoに紐づく全カテゴリを、IDを読み込まずにJOINで加減算する"""
+        self.todo_categories.append((todo_id, total, completed))
+
+    def add_queryset(self, queryset, sign=1):
+        """クエリセットのTodoを集計クエリだけで加減算する（行は読み込まない）"""
+        queryset = queryset.order_by()
+        counts = queryset.aggregate(
+            total_todos=Count('id'),
+            completed_todos=Count('id', filter=Q(completed=True)),
+        )
+        self.total += sign * counts['total_todos']
+        self.completed += sign * counts['completed_todos']
+
+        completed_days = queryset.filter(completed=True, completed_at__isnull=False).annotate(
+            day=TruncDate('completed_at', tzinfo=UTC)
+        ).values('day').annotate(count=Count('id'))
+        for row in completed_days:
+            self.completed_days[row['day']] += sign * row['count']
+
+        due_days = queryset.filter(completed=False, due_date__isnull=False).annotate(
+            day=TruncDate('due_date', tzinfo=UTC)
+        ).values('day').annotate(count=Count('id'))
+        for row in due_days:
+            self.due_days[row['day']] += sign * row['count']
+
+        categories = TodoCategory.objects.filter(todo__in=queryset.values('pk')).values(
+            'category_id'
+        ).annotate(
+            total=Count('id'),
+            completed=Count('id', filter=Q(todo__completed=True)),
+        ).order_by()
+        for row in categories:
+            self.add_categories([row['category_id']], sign * row['total'], sign * row['completed'])
+
+    def is_empty(self):
+        return not (
+            self.total or self.completed
+            or any(self.completed_days.values()) or any(self.due_days.values())
+            or any(total or completed for total, completed in self.categories.values())
+            or any(total or completed for _, total, completed in self.todo_categories)
+        )
+
+    def apply(self):
+        if self.is_empty():
+            return
+        with transaction.atomic():
+            _bump(
+                TodoStats, {'user_id': self.user_id, 'category': None},
+                total=self.total, completed=self.completed,
+            )
+            for day in set(self.completed_days) | set(self.due_days):
+                _bump(
+                    TodoDailyStats, {'user_id': self.user_id, 'day': day},
+                    completed=self.completed_days[day], due_pending=self.due_days[day],
+                )
+            for category_id, (total, completed) in self.categories.items():
+                _bump(
+                    TodoStats, {'user_id': self.user_id, 'category_id': category_id},
+                    total=total, completed=completed,
+                )
+            for todo_id, total, completed in self.todo_categories:
+                updates = {name: F(name) + value for name, value in (('total', total), ('completed', completed)) if value}
+                if updates:
+                    TodoStats.objects.filter(
+                        user_id=self.user_id, category__todo_categories__todo_id=todo_id
+                    ).update(**updates)
+
+
+def _stats_queries(user, now):
+    """統計に必要なクエリ（評価はしない）。user は TokenUser でもよい（pkだけを使う）"""
+    today_start = now.astimezone(UTC).replace(hour=0, minute=0, second=0, microsecond=0)
+    today = today_start.date()
+    week_start = today - datetime.timedelta(days=today.weekday())
+    return {
+        'totals': TodoStats.objects.filter(user_id=user.pk, category__isnull=True).values('total', 'completed'),
+        'daily': TodoDailyStats.objects.filter(user_id=user.pk),
+        'daily_aggregates': {
+            'overdue_before_today': Sum('due_pending', filter=Q(day__lt=today)),
+            'today_completed': Sum('completed', filter=Q(day=today)),
+            'week_completed': Sum('completed', filter=Q(day__gte=week_start)),
+        },
+        # 今日が期限のものは時刻まで見る必要があるので、その分だけ元テーブルを数える
+        'overdue_today': Todo.objects.filter(
+            user_id=user.pk, completed=False, due_date__gte=today_start, due_date__lt=now
+        ),
+        'categories': Category.objects.filter(user_id=user.pk).values('name', 'stats__total', 'stats__completed'),
+    }
+
+
+def _build_stats(totals, daily, overdue_today, categories):
+    totals = totals or {'total': 0, 'completed': 0}
+    categories_stats = {}
+    for category in categories:
+        total = category['stats__total'] or 0
+        completed = category['stats__completed'] or 0
+        categories_stats[category['name']] = {
+            'total': total,
+            'completed': completed,
+            'pending': total - completed
+        }
+
+    return {
+        'total_todos': totals['total'],
+        'completed_todos': totals['completed'],
+        'overdue_todos': (daily['overdue_before_today'] or 0) + overdue_today,
+        'today_completed': daily['today_completed'] or 0,
+        'week_completed': daily['week_completed'] or 0,
+        'categories_stats': categories_stats,
+    }
+
+
+def read_stats(user, now):
+    """カウンタテーブルから統計情報を組み立てる"""
+    queries = _stats_queries(user, now)
+    return _build_stats(
+        queries['totals'].first(),
+        queries['daily'].aggregate(**queries['daily_aggregates']),
+        queries['overdue_today'].count(),
+        list(queries['categories']),
+    )
+
+
+async def aread_stats(user, now):
+    """read_stats の非同期版"""
+    queries = _stats_queries(user, now)
+    return _build_stats(
+        await queries['totals'].afirst(),
+        await queries['daily'].aaggregate(**queries['daily_aggregates']),
+        await queries['overdue_today'].acount(),
+        [category async for category in queries['categories']],
+    )
+
+
+def compute_expected(user_id):
+    """元テーブルからカウンタのあるべき値を計算する"""
+    delta = StatsDelta(user_id)
+    delta.add_queryset(Todo.objects.filter(user_id=user_id))
+    archived_days = ArchivedTodo.objects.filter(user_id=user_id).annotate(
+        day=TruncDate('completed_at', tzinfo=UTC)
+    ).values('day').annotate(count=Count('id')).order_by()
+    for row in archived_days:
+        delta.completed_days[row['day']] += row['count']
+    return delta
+
+
+def current_counters(user_id):
+    """カウンタテーブルの現在値を StatsDelta と同じ形で返す"""
+    current = StatsDelta(user_id)
+    for row in TodoStats.objects.filter(user_id=user_id).values('category_id', 'total', 'completed'):
+        if row['category_id'] is None:
+            current.total = row['total']
+            current.completed = row['completed']
+        else:
+            current.add_categories([row['category_id']], row['total'], row['completed'])
+    for row in TodoDailyStats.objects.filter(user_id=user_id).values('day', 'completed', 'due_pending'):
+        current.completed_days[row['day']] += row['completed']
+        current.due_days[row['day']] += row['due_pending']
+    return current
+
+
+def diff_counters(expected, current):
+    """期待値と現在値の差分を (項目, 期待値, 現在値) のリストで返す"""
+    mismatches = []
+    if (expected.total, expected.completed) != (current.total, current.completed):
+        mismatches.append(('total', (expected.total, expected.completed), (current.total, current.completed)))
+    days = set(expected.completed_days) | set(expected.due_days) | set(current.completed_days) | set(current.due_days)
+    for day in sorted(days):
+        want = (expected.completed_days[day], expected.due_days[day])
+        have = (current.completed_days[day], current.due_days[day])
+        if want != have:
+            mismatches.append((f'day:{day}', want, have))
+    for category_id in set(expected.categories) | set(current.categories):
+        want = tuple(expected.categories.get(category_id, (0, 0)))
+        have = tuple(current.categories.get(category_id, (0, 0)))
+        if want != have:
+            mismatches.append((f'category:{category_id}', want, have))
+    return mismatches
+
+
+def rebuild_user_stats(user_id):
+    """ユーザーのカウンタを元テーブルから作り直す"""
+    with transaction.atomic():
+        TodoStats.objects.filter(user_id=user_id).delete()
+        TodoDailyStats.objects.filter(user_id=user_id).delete()
+        compute_expected(user_id).apply()
@@ -0,0 +1,65 @@
+"""差分同期
+
+カーソル（前回の同期時刻）以降に作成・更新されたTodoとカテゴリ、削除されたIDを返す。
+updated_at はコミット前に決まるため、同期時刻より少し前（TODO_SYNC_SAFETY_WINDOW秒）から
+取り直す。クライアントには同じ行が重複して届くことがあるが、IDで上書きすればよい。
+"""
+import datetime
+from django.conf import settings
+from django.utils import timezone
+from .models import Category, Todo, Tombstone
+
+UTC = datetime.timezone.utc
+
+
+class CursorExpired(Exception):
+    """削除記録の保存期間より古いカーソル（全件の取得し直しが必要）"""
+
+
+def encode_cursor(moment):
+    return str(int(moment.timestamp() * 1_000_000))
+
+
+def decode_cursor(value):
+    """カーソル文字列を日時に戻す（不正な値は ValueError）"""
+    return datetime.datetime.fromtimestamp(int(value) / 1_000_000, tz=UTC)
+
+
+def record_deletions(user_id, kind, object_ids):
+    """削除したTodo・カテゴリの削除記録を作成する（削除と同じトランザクションで呼び出す）"""
+    now = timezone.now()
+    Tombstone.objects.bulk_create([
+        Tombstone(user_id=user_id, kind=kind, object_id=object_id, deleted_at=now)
+        for object_id in object_ids
+    ])
+
+
+def purge_tombstones(before):
+    """before より前の削除記録を削除し、件数を返す"""
+    return Tombstone.objects.filter(deleted_at__lt=before).delete()[0]
+
+
+def changes_since(user, since=None):
+    """since 以降の変更を返す。since=None の場合は全件（削除記録なし）"""
+    now = timezone.now()
+    todos = Todo.objects.filter(user=user)
+    categories = Category.objects.filter(user=user)
+    deleted = {'todos': [], 'categories': []}
+
+    if since is not None:
+        if since < now - datetime.timedelta(days=settings.TODO_TOMBSTONE_RETENTION_DAYS):
+            raise CursorExpired
+        threshold = since - datetime.timedelta(seconds=settings.TODO_SYNC_SAFETY_WINDOW)
+        todos = todos.filter(updated_at__gt=threshold)
+        categories = categories.filter(updated_at__gt=threshold)
+        tombstones = Tombstone.objects.filter(user=user, deleted_at__gt=threshold).values_list('kind', 'object_id')
+        for kind, object_id in tombstones:
+            key = 'todos' if kind == Tombstone.KIND_TODO else 'categories'
+            deleted[key].append(object_id)
+
+    return {
+        'todos': todos.order_by('updated_at', 'id'),
+        'categories': categories.order_by('updated_at', 'id'),
+        'deleted': deleted,
+        'cursor': encode_cursor(now),
+    }
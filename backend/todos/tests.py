@@ -0,0 +1,441 @@
+import base64
+import datetime
+import io
+import json
+import tempfile
+import unittest
+import uuid
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, models
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from todos import async_views, views
+from todos.archive import archive_todos
+from todos.cache import get_list_state
+from todos.exporter import WRITERS, export_lines, export_queryset
+from todos.fieldsets import categories_prefetch
+from todos.models import ArchivedTodo, Category, Todo, TodoCategory
+from todos.operations import delete_todos
+from todos.pagination import TodoPagination
+from todos.search import get_search_backend
+from todos.serializers import TodoSerializer
+from todos.stats import compute_expected, current_counters, diff_counters
+from todos.views import overdue_queryset
+
+User = get_user_model()
+
+
+def create_user(email='user@example.com'):
+    return User.objects.create_user(email=email, username=email, password=None)
+
+
+def api_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+class QueryPlanTests(TestCase):
+    """よく使うクエリがユーザー別のインデックスを使うこと（全件走査にならないこと）"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+        other = create_user('other@example.com')
+        now = timezone.now()
+        Todo.objects.bulk_create([
+            Todo(
+                user=user, name=f'todo {i}', order_index=i, rank=f'{i:04d}', completed=i % 3 == 0,
+                completed_at=now if i % 3 == 0 else None, due_date=now + datetime.timedelta(days=i - 10),
+            )
+            for user in (cls.user, other) for i in range(30)
+        ])
+
+    def queries(self):
+        now = timezone.now()
+        return {
+            # 一覧のデフォルト並び順
+            'list': (Todo.objects.filter(user=self.user).order_by('order_index', '-created_at'),
+                     'todo_user_order_idx'),
+            # 統計・一覧の期限切れ
+            'overdue': (overdue_queryset(self.user, now).order_by(), 'todo_user_pending_due_idx'),
+            # 完了済みの一括削除（統計情報がないと completed の選択性が分からないので、ユーザー別のどれかを使えばよい）
+            'completed': (Todo.objects.filter(user=self.user, completed=True).order_by(), 'todo_user_'),
+        }
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite の EXPLAIN QUERY PLAN')
+    def test_sqlite_plans_use_user_indexes(self):
+        for name, (queryset, index) in self.queries().items():
+            with self.subTest(name):
+                plan = queryset.explain()
+                self.assertNotIn('SCAN todos_todo', plan)
+                self.assertIn(f'USING INDEX {index}', plan)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'PostgreSQL の EXPLAIN')
+    def test_postgresql_plans_use_user_indexes(self):
+        # 行数が少ないとインデックスがあっても全件走査が選ばれるので、全件走査を選ばないようにして確かめる
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        for name, (queryset, index) in self.queries().items():
+            with self.subTest(name):
+                plan = queryset.explain()
+                self.assertNotIn('Seq Scan on todos_todo', plan)
+                self.assertIn(index, plan)
+
+
+class TodoStatsTests(TestCase):
+    """統計エンドポイントのクエリ数と、書き込みの経路ごとの統計カウンタの整合性"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = api_client(self.user)
+        self.past = (timezone.now() - datetime.timedelta(days=2)).isoformat()
+
+    def create_todo(self, **data):
+        response = self.client.post(reverse('todo-list-create'), {'name': 'todo', **data}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return Todo.objects.filter(user=self.user).latest('created_at')
+
+    def assertCountersMatch(self):
+        self.assertEqual(diff_counters(compute_expected(self.user.pk), current_counters(self.user.pk)), [])
+
+    def test_query_count_is_constant(self):
+        empty = create_user('empty@example.com')
+        categories = [Category.objects.create(user=self.user, name=f'category {i}') for i in range(5)]
+        for i in range(20):
+            self.create_todo(due_date=self.past, category_ids=[str(categories[i % 5].pk)])
+        for todo in Todo.objects.filter(user=self.user)[:7]:
+            todo.completed = True
+            todo.save()
+
+        # バージョンを使う場合は、ETag のための期限切れ件数が1クエリ増える
+        for mode, queries in (('off', 4), ('on', 5)):
+            for user in (empty, self.user):
+                client = api_client(user)
+                with self.subTest(mode=mode, user=user.email), override_settings(TODO_LIST_CACHE=mode):
+                    with self.assertNumQueries(queries):
+                        response = client.get(reverse('todo-stats'))
+                    self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_todos'], 20)
+        self.assertEqual(response.data['completed_todos'], 7)
+        self.assertEqual(response.data['overdue_todos'], 13)
+        self.assertEqual(len(response.data['categories_stats']), 5)
+
+    def test_counters_match_after_each_write_path(self):
+        work = Category.objects.create(user=self.user, name='work')
+        home = Category.objects.create(user=self.user, name='home')
+        todos = [self.create_todo(due_date=self.past, category_ids=[str(work.pk)]) for _ in range(6)]
+        self.assertCountersMatch()
+
+        steps = [
+            ('update', lambda: self.client.patch(
+                reverse('todo-detail', args=[todos[0].pk]),
+                {'completed': True, 'category_ids': [str(work.pk), str(home.pk)]}, format='json',
+            )),
+            ('toggle', lambda: self.client.patch(reverse('todo-toggle', args=[todos[1].pk]))),
+            ('bulk complete', lambda: self.client.post(
+                reverse('todo-bulk-update'), {'todo_ids': [str(todo.pk) for todo in todos[2:4]], 'action': 'complete'},
+                format='json',
+            )),
+            ('bulk incomplete', lambda: self.client.post(
+                reverse('todo-bulk-update'), {'todo_ids': [str(todos[2].pk)], 'action': 'incomplete'}, format='json',
+            )),
+            ('bulk delete', lambda: self.client.post(
+                reverse('todo-bulk-update'), {'todo_ids': [str(todos[4].pk)], 'action': 'delete'}, format='json',
+            )),
+            ('batch', lambda: self.client.post(reverse('todo-batch'), {'operations': [
+                {'op': 'create', 'data': {'name': 'batch', 'due_date': self.past, 'category_ids': [str(home.pk)]}},
+                {'op': 'toggle', 'id': '$0'},
+                {'op': 'update', 'id': str(todos[5].pk), 'data': {'completed': True}},
+                {'op': 'delete', 'id': str(todos[2].pk)},
+            ]}, format='json')),
+            ('import', lambda: self.client.post(reverse('todo-import'), [
+                {'name': 'imported', 'completed': True, 'due_date': self.past, 'categories': ['work', 'new']},
+                {'name': 'imported 2', 'categories': ['home']},
+            ], format='json')),
+            ('delete', lambda: self.client.delete(reverse('todo-detail', args=[todos[3].pk]))),
+            ('clear completed', lambda: self.client.delete(reverse('todo-clear-completed'))),
+            ('category delete', lambda: self.client.delete(reverse('category-detail', args=[home.pk]))),
+        ]
+        for name, step in steps:
+            with self.subTest(name):
+                response = step()
+                self.assertLess(response.status_code, 300, response.data)
+                self.assertCountersMatch()
+
+        self.create_todo(category_ids=[str(work.pk)])
+        todo = Todo.objects.filter(user=self.user).latest('created_at')
+        todo.completed = True
+        todo.save()
+        self.assertEqual(archive_todos(self.user.pk, before=timezone.now() + datetime.timedelta(seconds=1)), 1)
+        self.assertCountersMatch()
+
+
+class ToggleTodoTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.client = api_client(self.user)
+        self.todo = Todo.objects.create(user=self.user, name='todo')
+
+    def test_returns_toggled_todo(self):
+        response = self.client.patch(reverse('todo-toggle', args=[self.todo.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], str(self.todo.pk))
+        self.assertTrue(response.data['completed'])
+
+    def test_other_users_todo_is_not_found(self):
+        response = api_client(create_user('other@example.com')).patch(reverse('todo-toggle', args=[self.todo.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_deleted_after_toggle_is_not_found(self):
+        # 切り替えと再取得の間に削除された場合
+        pk = uuid.uuid4()
+        result = {'id': pk, 'completed': True, 'completed_at': timezone.now()}
+        with mock.patch('todos.views.toggle_and_notify', return_value=result):
+            response = self.client.patch(reverse('todo-toggle', args=[pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(TODO_LIST_CACHE_TIMEOUT=0)
+@mock.patch.object(TodoPagination, 'page_size', 100)
+class TodoListQueryTests(TestCase):
+    """一覧のクエリ数が件数・カテゴリ数によらず一定であること"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = api_client(self.user)
+        self.categories = [Category.objects.create(user=self.user, name=f'category {i}') for i in range(3)]
+
+    def create_todos(self, count):
+        todos = Todo.objects.bulk_create([
+            Todo(user=self.user, name=f'todo {i}', order_index=i, rank=f'{i:04d}') for i in range(count)
+        ])
+        TodoCategory.objects.bulk_create([
+            TodoCategory(todo=todo, category=category) for todo in todos for category in self.categories
+        ])
+
+    def get_list(self, query, queries):
+        # 件数・ページ・カテゴリ（カテゴリを出力する場合）
+        with self.assertNumQueries(queries):
+            response = self.client.get(reverse('todo-list-create') + query)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_constant_queries(self):
+        for count in (1, 100):
+            Todo.objects.filter(user=self.user).delete()
+            self.create_todos(count)
+            for query, queries in (
+                ('', 3),
+                ('?fields=id,name,categories&expand=categories', 3),
+                ('?fields=id,name,categories', 3),
+                ('?fields=id,name', 2),
+            ):
+                with self.subTest(count=count, query=query):
+                    data = self.get_list(query, queries)
+                    self.assertEqual(len(data['results']), count)
+
+    def test_fast_path_matches_serializer(self):
+        self.create_todos(5)
+        todo = Todo.objects.filter(user=self.user).first()
+        todo.due_date = timezone.now()
+        todo.completed = True
+        todo.save()
+
+        data = self.get_list('', 3)
+        todos = Todo.objects.filter(user=self.user).prefetch_related(categories_prefetch())
+        expected = json.loads(JSONRenderer().render(TodoSerializer(todos, many=True).data))
+        self.assertEqual(data['results'], expected)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.other = create_user('other@example.com')
+        for user in (self.user, self.other):
+            Todo.objects.create(user=user, name='買い物リストを作る', description='牛乳とパン')
+            Todo.objects.create(user=user, name='Write report')
+
+    def search(self, text):
+        response = api_client(self.user).get(reverse('todo-list-create'), {'search': text, 'fields': 'name'})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.data['results']]
+
+    def test_matches_only_own_todos(self):
+        self.assertEqual(self.search('買い物'), ['買い物リストを作る'])
+        self.assertEqual(self.search('牛乳'), ['買い物リストを作る'])
+        self.assertEqual(self.search('rep'), ['Write report'])
+        self.assertEqual(self.search('存在しない'), [])
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'PostgreSQL の EXPLAIN')
+    def test_postgresql_search_uses_user_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        queryset = get_search_backend().search(Todo.objects.filter(user=self.user), '買い物', self.user.pk)
+        self.assertIn('todosearch_user_body_gin_idx', queryset.explain())
+
+
+class ListCacheTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.client = api_client(self.user)
+        caches['todos'].clear()
+
+    def test_auto_is_off_for_process_local_cache(self):
+        # プロセス内メモリのキャッシュでは他のプロセスの書き込みが伝わらないので、キャッシュも検証子も使わない
+        self.assertEqual(get_list_state(self.user.pk), (None, None))
+        response = self.client.get(reverse('todo-list-create'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('ETag', self.client.get(reverse('todo-stats')))
+
+    @override_settings(TODO_LIST_CACHE='on', TODO_LIST_VERSION_TIMEOUT=60)
+    def test_on_uses_versions_with_finite_timeout(self):
+        response = self.client.get(reverse('todo-list-create'))
+        etag = response['ETag']
+        self.assertEqual(
+            self.client.get(reverse('todo-list-create'), HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        cache = caches['todos']
+        for key in (f'todos:version:{self.user.pk}', f'todos:modified:{self.user.pk}'):
+            # 期限なし（timeout=None）の場合は None になる
+            expires = cache._expire_info[cache.make_key(key)]
+            self.assertIsNotNone(expires)
+            self.assertLessEqual(expires, timezone.now().timestamp() + 60)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('todo-list-create'), {'name': 'todo'}, format='json')
+        response = self.client.get(reverse('todo-list-create'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+
+
+class ExportTests(TestCase):
+    def test_datetimes_keep_microseconds_in_every_format(self):
+        user = create_user()
+        completed_at = datetime.datetime(2026, 10, 18, 9, 30, 15, 123456, tzinfo=datetime.timezone.utc)
+        todo = Todo.objects.create(user=user, name='todo', completed=True)
+        # save() は completed_at を現在時刻にするので、update() で値を決める
+        Todo.objects.filter(pk=todo.pk).update(completed_at=completed_at)
+        queryset = export_queryset(user, {})
+        for fmt in WRITERS:
+            with self.subTest(fmt=fmt):
+                body = ''.join(export_lines(queryset, fmt))
+                self.assertIn(completed_at.isoformat(), body)
+
+
+class RelatedRowsTests(TestCase):
+    def test_unsupported_on_delete_is_rejected_without_changes(self):
+        user = create_user()
+        todo = Todo.objects.create(user=user, name='todo', completed=True)
+        Todo.objects.filter(pk=todo.pk).update(completed_at=timezone.now() - datetime.timedelta(days=365))
+        # SQLで直接消すと PROTECT を無視してしまう関連
+        protected = mock.Mock(
+            related_model=TodoCategory, field=TodoCategory._meta.get_field('todo'),
+            on_delete=models.PROTECT, many_to_many=False,
+        )
+        with mock.patch.object(Todo._meta, 'related_objects', [protected]):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'TodoCategory.todo'):
+                archive_todos(user.pk, before=timezone.now())
+            with self.assertRaisesMessage(ImproperlyConfigured, 'TodoCategory.todo'):
+                delete_todos(user.pk, Todo.objects.filter(user=user))
+        self.assertTrue(Todo.objects.filter(pk=todo.pk).exists())
+        self.assertFalse(ArchivedTodo.objects.exists())
+
+
+class AsyncAuthenticationTests(TestCase):
+    def test_bad_authorization_header_matches_sync_view(self):
+        factory = AsyncRequestFactory()
+        # 値が2つあるヘッダーと、検証できないトークン
+        for header in ('Bearer a b', 'Bearer not-a-token'):
+            with self.subTest(header=header):
+                expected = APIClient().get(reverse('todo-list-create'), HTTP_AUTHORIZATION=header)
+                self.assertEqual(expected.status_code, 401)
+                for view in (async_views.todo_list, async_views.todo_stats):
+                    response = async_to_sync(view)(factory.get('/', headers={'Authorization': header}))
+                    self.assertEqual(response.status_code, 401)
+                    self.assertEqual(json.loads(response.content), expected.json())
+                    self.assertEqual(response['WWW-Authenticate'], expected['WWW-Authenticate'])
+                response = async_to_sync(views.todo_events)(factory.get('/', headers={'Authorization': header}))
+                self.assertEqual(response.status_code, 401)
+
+
+@mock.patch.object(TodoPagination, 'page_size', 1)
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.client = api_client(self.user)
+        for i in range(2):
+            Todo.objects.create(user=self.user, name=f'todo {i}')
+
+    def get(self, cursor):
+        return self.client.get(reverse('todo-list-create'), {'cursor': cursor})
+
+    def next_cursor(self, data):
+        return parse_qs(urlsplit(data['next']).query)['cursor'][0]
+
+    def test_next_cursor_returns_next_page(self):
+        first = self.get('').data
+        cursor = self.next_cursor(first)
+        second = self.get(cursor).data
+        self.assertEqual(len(second['results']), 1)
+        self.assertNotEqual(second['results'][0]['id'], first['results'][0]['id'])
+        self.assertIsNone(second['next'])
+
+    def test_tampered_cursor_is_not_found(self):
+        cursor = self.next_cursor(self.get('').data)
+        payload = json.loads(base64.urlsafe_b64decode(cursor))
+        self.assertEqual(payload['o'][-1], 'id')
+        tampered = []
+        for index in range(len(payload['p'])):
+            for value in ('abc', [1], {'a': 1}):
+                position = list(payload['p'])
+                position[index] = value
+                tampered.append(position)
+        tampered += [payload['p'][:-1] + [None], payload['p'][:-1] + ['not-a-uuid'], 5]
+        for position in tampered:
+            with self.subTest(position=position):
+                encoded = base64.urlsafe_b64encode(json.dumps({'o': payload['o'], 'p': position}).encode()).decode()
+                self.assertEqual(self.get(encoded).status_code, 404)
+
+
+class ImportTests(TestCase):
+    NDJSON = b'{"name": "a"}\n\xff{"name": "b"}\n{"name": "c"}\n'
+    CSV = b'name,description\na,x\n\xff,y\nb,z\r1\nc,"two\n\xfflines"\nd,w\n'
+
+    def setUp(self):
+        self.user = create_user()
+
+    def names(self):
+        return sorted(Todo.objects.filter(user=self.user).values_list('name', flat=True))
+
+    def test_undecodable_lines_are_line_errors(self):
+        client = api_client(self.user)
+        for content_type, body, names, lines in (
+            ('application/x-ndjson', self.NDJSON, ['a', 'c'], [2]),
+            ('text/csv', self.CSV, ['a', 'd'], [3, 4, 6]),
+        ):
+            with self.subTest(content_type=content_type):
+                Todo.objects.filter(user=self.user).delete()
+                response = client.post(reverse('todo-import'), body, content_type=content_type)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual([error['line'] for error in response.data['errors']], lines)
+                self.assertEqual(self.names(), names)
+
+    def test_command_reports_undecodable_lines(self):
+        with tempfile.NamedTemporaryFile(suffix='.csv') as f:
+            f.write(self.CSV)
+            f.flush()
+            stderr = io.StringIO()
+            call_command('import_todos', self.user.email, f.name, stdout=io.StringIO(), stderr=stderr)
+        self.assertEqual(self.names(), ['a', 'd'])
+        self.assertIn('3行目', stderr.getvalue())
@@ -1,25 +1,54 @@
+from django.conf import settings
 from django.urls import path
+from . import async_views
 from .views import (
     TodoListCreateView,
     TodoDetailView,
     toggle_todo,
     reorder_todos,
+    move_todo,
     bulk_update_todos,
+    batch_todos,
+    import_todos,
+    export_todos,
     clear_completed_todos,
     todo_stats,
+    todo_changes,
+    todo_events,
+    todo_cache_stats,
+    ArchivedTodoListView,
     CategoryListCreateView,
     CategoryDetailView
 )
 
+todo_list_view = TodoListCreateView.as_view()
+todo_detail_view = TodoDetailView.as_view()
+todo_toggle_view = toggle_todo
+todo_stats_view = todo_stats
+if settings.TODO_ASYNC_VIEWS:
+    # ASGIで動かす場合は、よく呼ばれるエンドポイントを非同期版にする
+    todo_list_view = async_views.todo_list
+    todo_detail_view = async_views.todo_detail
+    todo_toggle_view = async_views.toggle_todo
+    todo_stats_view = async_views.todo_stats
+
 urlpatterns = [
     # Todo関連
-    path('todos/', TodoListCreateView.as_view(), name='todo-list-create'),
-    path('todos/<uuid:pk>/', TodoDetailView.as_view(), name='todo-detail'),
-    path('todos/<uuid:pk>/toggle/', toggle_todo, name='todo-toggle'),
+    path('todos/', todo_list_view, name='todo-list-create'),
+    path('todos/<uuid:pk>/', todo_detail_view, name='todo-detail'),
+    path('todos/<uuid:pk>/toggle/', todo_toggle_view, name='todo-toggle'),
+    path('todos/<uuid:pk>/move/', move_todo, name='todo-move'),
     path('todos/reorder/', reorder_todos, name='todo-reorder'),
     path('todos/bulk-update/', bulk_update_todos, name='todo-bulk-update'),
+    path('todos/batch/', batch_todos, name='todo-batch'),
+    path('todos/import/', import_todos, name='todo-import'),
+    path('todos/export/', export_todos, name='todo-export'),
     path('todos/clear-completed/', clear_completed_todos, name='todo-clear-completed'),
-    path('todos/stats/', todo_stats, name='todo-stats'),
+    path('todos/stats/', todo_stats_view, name='todo-stats'),
+    path('todos/changes/', todo_changes, name='todo-changes'),
+    path('todos/events/', todo_events, name='todo-events'),
+    path('todos/cache-stats/', todo_cache_stats, name='todo-cache-stats'),
+    path('todos/archive/', ArchivedTodoListView.as_view(), name='todo-archive'),
     
     # Category関連
     path('categories/', CategoryListCreateView.as_view(), name='category-list-create'),
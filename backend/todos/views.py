@@ -1,38 +1,95 @@
+import uuid
 from rest_framework import generics, status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import (
+    api_view, authentication_classes, parser_classes, permission_classes, renderer_classes,
+)
+from rest_framework.exceptions import AuthenticationFailed, UnsupportedMediaType
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
-from django.db.models import Q, Count
+from rest_framework.filters import OrderingFilter, SearchFilter
+from django.http import JsonResponse, StreamingHttpResponse
+from accounts.authentication import AsyncJWTAuthentication, TokenUserJWTAuthentication
+from django.db.models import Q, Count, Max
 from django.utils import timezone
-from datetime import timedelta
 from todos.models import Todo 
-from django.db import models 
-from .models import Todo, Category
+from django.conf import settings
+from django.db import models, transaction
+from .models import ArchivedTodo, Todo, Category, Tombstone
 from .serializers import (
+    ArchivedTodoSerializer,
     TodoSerializer,
     TodoCreateSerializer,
     TodoUpdateSerializer,
     TodoReorderSerializer,
+    TodoMoveSerializer,
     TodoBulkUpdateSerializer,
+    TodoBatchSerializer,
     TodoStatsSerializer,
+    TodoToggleSerializer,
     CategorySerializer
 )
-from .filters import TodoFilter
+from .filters import ArchivedTodoFilter, TodoFilter
+from .batch import run_batch
+from .importer import CONTENT_TYPES as IMPORT_CONTENT_TYPES, ImportFormatError, format_for_filename, read_records
+from .importer import import_todos as run_import
+from .exporter import CONTENT_TYPES as EXPORT_CONTENT_TYPES, EXPORT_RENDERERS, export_lines, export_queryset
+from .operations import (
+    RankConflict, apply_todo_order, delete_todos, move_todo_between, set_todos_completed, toggle_todo_completed,
+)
+from .stats import bucket_day, read_stats
+from .sync import CursorExpired, changes_since, decode_cursor, record_deletions
+from .events import event_stream, publish_todo_event
+from .pagination import TodoPagination
+from .cache import CachedListMixin, cache_metrics, get_list_state, invalidate_todo_cache, request_digest
+from config.conditional import ConditionalGetMixin, check_preconditions, make_etag, set_validators
+from .search import TodoSearchFilter
+from .fieldsets import TodoFieldsetListMixin, categories_prefetch
+
+def todo_list_validators(request, version, modified):
+    if version is None:
+        return None, None
+    etag = make_etag('todos', request.user.pk, version, request_digest(request), request.accepted_media_type)
+    return etag, modified
+
+def todo_detail_queryset(user, pk):
+    """Todo詳細の検証子を求めるクエリ（カテゴリの名前変更・削除も反映されるよう件数と最終更新日時を含める）"""
+    return Todo.objects.filter(pk=pk, user=user).annotate(
+        category_count=Count('categories'), category_updated=Max('categories__updated_at')
+    ).values('updated_at', 'category_count', 'category_updated')
+
+def todo_detail_validators(request, pk, row):
+    if row is None:
+        return None, None
+    etag = make_etag(
+        'todo', pk, row['updated_at'].isoformat(), row['category_count'],
+        row['category_updated'] and row['category_updated'].isoformat(), request.accepted_media_type,
+    )
+    return etag, max(filter(None, [row['updated_at'], row['category_updated']]))
+
+class TodoListCreateView(ConditionalGetMixin, CachedListMixin, TodoFieldsetListMixin, generics.ListCreateAPIView):
+    """Todo一覧取得・作成
 
-class TodoListCreateView(generics.ListCreateAPIView):
-    """Todo一覧取得・作成"""
+    一覧は `?fields=` / `?expand=categories` で出力するフィールドを選べる（todos.fieldsets を参照）。
+    """
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    pagination_class = TodoPagination
+    filter_backends = [DjangoFilterBackend, TodoSearchFilter, OrderingFilter]
     filterset_class = TodoFilter
-    search_fields = ['name', 'description']
-    ordering_fields = ['created_at', 'updated_at', 'due_date', 'priority', 'order_index']
-    ordering = ['order_index', '-created_at']
+    ordering_fields = ['created_at', 'updated_at', 'due_date', 'priority', 'order_index', 'rank', 'search_rank']
+
+    @property
+    def ordering(self):
+        if settings.TODO_ORDERING_MODE == 'rank':
+            return ['rank', '-created_at']
+        return ['order_index', '-created_at']
 
     def get_queryset(self):
-        return Todo.objects.filter(user=self.request.user).prefetch_related(
-            'todo_categories__category'
-        )
+        return Todo.objects.filter(user=self.request.user).prefetch_related(categories_prefetch())
+
+    def get_validators(self, request, lock=False):
+        # 一覧はユーザーごとのバージョンで判定する（クエリは実行しない）
+        return todo_list_validators(request, *get_list_state(request.user.pk))
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -40,41 +97,88 @@ class TodoListCreateView(generics.ListCreateAPIView):
         return TodoSerializer
 
     def perform_create(self, serializer):
+        # 並び順キー方式では、Todo.save が末尾のキーを割り当てるので集計は不要
+        if settings.TODO_ORDERING_MODE == 'rank':
+            serializer.save(user=self.request.user)
         # order_indexが指定されていない場合、最大値+1を設定
-        if 'order_index' not in serializer.validated_data:
+        elif 'order_index' not in serializer.validated_data:
             max_order = Todo.objects.filter(user=self.request.user).aggregate(
                 max_order=models.Max('order_index')
             )['max_order'] or 0
             serializer.save(user=self.request.user, order_index=max_order + 1)
         else:
             serializer.save(user=self.request.user)
+        invalidate_todo_cache(self.request.user.id)
+        publish_todo_event(self.request.user.id, 'created', [serializer.instance.pk])
 
-class TodoDetailView(generics.RetrieveUpdateDestroyAPIView):
-    """Todo詳細取得・更新・削除"""
+class TodoDetailView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
+    """Todo詳細取得・更新・削除
+
+    If-Match を付けた更新・削除は、取得時から変更されていない場合だけ行う。
+    """
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Todo.objects.filter(user=self.request.user).prefetch_related(
-            'todo_categories__category'
-        )
+        return Todo.objects.filter(user=self.request.user).prefetch_related(categories_prefetch())
+
+    def get_validators(self, request, lock=False):
+        if lock:
+            list(Todo.objects.select_for_update().filter(pk=self.kwargs['pk'], user=request.user).values_list('pk'))
+        row = todo_detail_queryset(request.user, self.kwargs['pk']).first()
+        return todo_detail_validators(request, self.kwargs['pk'], row)
 
     def get_serializer_class(self):
         if self.request.method in ['PUT', 'PATCH']:
             return TodoUpdateSerializer
         return TodoSerializer
 
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            self.check_write_preconditions()
+            super().perform_update(serializer)
+        invalidate_todo_cache(self.request.user.id)
+        publish_todo_event(self.request.user.id, 'updated', [serializer.instance.pk])
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            self.check_write_preconditions()
+            todo_id = instance.pk
+            super().perform_destroy(instance)
+            record_deletions(self.request.user.id, Tombstone.KIND_TODO, [todo_id])
+        invalidate_todo_cache(self.request.user.id)
+        publish_todo_event(self.request.user.id, 'deleted', [todo_id])
+
+def toggled_todo_queryset(user_id, pk):
+    """切り替え後のTodo（切り替えと取得の間に削除された場合は空）"""
+    return Todo.objects.filter(pk=pk, user_id=user_id).prefetch_related(categories_prefetch())
+
+def toggle_and_notify(user_id, pk):
+    """完了状態を切り替え、キャッシュの無効化とイベントの配信を行う（Todoがなければ None）"""
+    result = toggle_todo_completed(pk, user_id)
+    if result is not None:
+        invalidate_todo_cache(user_id)
+        publish_todo_event(user_id, 'toggled', [pk], completed=result['completed'])
+    return result
+
 @api_view(['PATCH'])
 @permission_classes([permissions.IsAuthenticated])
 def toggle_todo(request, pk):
-    """Todo完了状態切り替え"""
-    try:
-        todo = Todo.objects.get(id=pk, user=request.user)
-        todo.completed = not todo.completed
-        todo.save()
-        serializer = TodoSerializer(todo)
-        return Response(serializer.data)
-    except Todo.DoesNotExist:
+    """Todo完了状態切り替え
+
+    `?minimal=true` を指定すると {id, completed, completed_at} のみを返す。
+    """
+    result = toggle_and_notify(request.user.id, pk)
+    if result is None:
         return Response({'error': 'Todoが見つかりません。'}, status=status.HTTP_404_NOT_FOUND)
+    
+    if request.query_params.get('minimal') in ('1', 'true'):
+        return Response(TodoToggleSerializer(result).data)
+    
+    todo = toggled_todo_queryset(request.user.id, pk).first()
+    if todo is None:
+        return Response({'error': 'Todoが見つかりません。'}, status=status.HTTP_404_NOT_FOUND)
+    serializer = TodoSerializer(todo)
+    return Response(serializer.data)
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -84,20 +188,45 @@ def reorder_todos(request):
     serializer.is_valid(raise_exception=True)
     
     todo_orders = serializer.validated_data['todo_orders']
+    orders = {uuid.UUID(item['id']): int(item['order_index']) for item in todo_orders}
+    
+    # 所有チェックは1クエリ、更新はCASE式のUPDATEでまとめて行う
+    updated_count, unknown_ids = apply_todo_order(request.user.id, orders)
+    invalidate_todo_cache(request.user.id)
+    if updated_count:
+        publish_todo_event(request.user.id, 'reordered', [todo_id for todo_id in orders if todo_id not in unknown_ids])
     
-    # バルクアップデートで効率的に更新
-    todos_to_update = []
-    for item in todo_orders:
-        try:
-            todo = Todo.objects.get(id=item['id'], user=request.user)
-            todo.order_index = int(item['order_index'])
-            todos_to_update.append(todo)
-        except Todo.DoesNotExist:
-            continue
+    return Response({
+        'message': '並び順を更新しました。',
+        'updated_count': updated_count,
+        'unknown_ids': unknown_ids,
+    })
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def move_todo(request, pk):
+    """Todo1件の移動（並び順キー方式）
+
+    after に指定したTodoの直後、before に指定したTodoの直前に移動する。
+    更新されるのは移動したTodoの1行だけ。
+    """
+    serializer = TodoMoveSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    before = serializer.validated_data.get('before')
+    after = serializer.validated_data.get('after')
+    if pk in (before, after):
+        return Response({'error': '移動するTodo自身は指定できません。'}, status=status.HTTP_400_BAD_REQUEST)
     
-    Todo.objects.bulk_update(todos_to_update, ['order_index'])
+    try:
+        rank = move_todo_between(request.user.id, pk, before_id=before, after_id=after)
+    except Todo.DoesNotExist:
+        return Response({'error': 'Todoが見つかりません。'}, status=status.HTTP_404_NOT_FOUND)
+    except RankConflict:
+        return Response({'error': '指定された位置に移動できません。'}, status=status.HTTP_400_BAD_REQUEST)
+    invalidate_todo_cache(request.user.id)
+    publish_todo_event(request.user.id, 'reordered', [pk])
     
-    return Response({'message': '並び順を更新しました。'})
+    return Response({'id': pk, 'rank': rank})
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
@@ -109,88 +238,216 @@ def bulk_update_todos(request):
     todo_ids = serializer.validated_data['todo_ids']
     action = serializer.validated_data['action']
     
-    todos = Todo.objects.filter(id__in=todo_ids, user=request.user)
+    # 件数は実際に状態が変わった（削除した）Todoの数
+    if action == 'delete':
+        todos = Todo.objects.filter(id__in=todo_ids, user=request.user)
+        affected_ids = delete_todos(request.user.id, todos)
+        message = f'{len(affected_ids)}件のTodoを削除しました。'
+    else:
+        completed = action == 'complete'
+        affected_ids = set_todos_completed(request.user.id, todo_ids, completed)
+        message = f'{len(affected_ids)}件のTodoを{"完了" if completed else "未完了"}にしました。'
     
-    if action == 'complete':
-        todos.update(completed=True, completed_at=timezone.now())
-        message = f'{todos.count()}件のTodoを完了にしました。'
-    elif action == 'incomplete':
-        todos.update(completed=False, completed_at=None)
-        message = f'{todos.count()}件のTodoを未完了にしました。'
-    elif action == 'delete':
-        count = todos.count()
-        todos.delete()
-        message = f'{count}件のTodoを削除しました。'
+    if affected_ids:
+        invalidate_todo_cache(request.user.id)
+        publish_todo_event(request.user.id, 'deleted' if action == 'delete' else 'updated', affected_ids)
     
     return Response({'message': message})
 
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def batch_todos(request):
+    """Todoの複数の操作を1リクエスト・1トランザクションで実行する（todos.batch を参照）
+
+    atomic=True（デフォルト）で失敗した操作がある場合は全体を取り消して400を返す。
+    """
+    serializer = TodoBatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    atomic = serializer.validated_data['atomic']
+    
+    results = run_batch(request.user, serializer.validated_data['operations'], atomic=atomic)
+    failed = sum(1 for result in results if result['status'] >= 400)
+    response_status = status.HTTP_400_BAD_REQUEST if atomic and failed else status.HTTP_200_OK
+    return Response({
+        'atomic': atomic,
+        'succeeded': len(results) - failed,
+        'failed': failed,
+        'results': results,
+    }, status=response_status)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@parser_classes([JSONParser, MultiPartParser])
+def import_todos(request):
+    """Todoのインポート（todos.importer を参照）
+
+    本文をそのまま送る場合は Content-Type で形式を指定する（application/x-ndjson / text/csv / application/json）。
+    multipart の場合は file フィールドのファイル名の拡張子で判別する。
+    """
+    content_type = request.content_type.split(';')[0].strip().lower()
+    try:
+        if content_type.startswith('multipart/'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({'error': 'fileを指定してください。'}, status=status.HTTP_400_BAD_REQUEST)
+            records = read_records(upload, format_for_filename(upload.name))
+        elif content_type == 'application/json':
+            if not isinstance(request.data, list):
+                return Response({'error': 'JSONはTodoの配列である必要があります。'}, status=status.HTTP_400_BAD_REQUEST)
+            records = enumerate(request.data, 1)
+        elif content_type in IMPORT_CONTENT_TYPES:
+            # 本文はパースせずに1行ずつ読む
+            records = read_records(request.stream or [], IMPORT_CONTENT_TYPES[content_type])
+        else:
+            raise UnsupportedMediaType(content_type)
+        result = run_import(request.user, records)
+    except ImportFormatError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({'message': f'{result["created"]}件のTodoをインポートしました。', **result})
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@renderer_classes(EXPORT_RENDERERS)
+def export_todos(request):
+    """Todoのエクスポート（`?format=ndjson|csv|json`、TodoFilter・`?search=` で絞り込み可）
+
+    一覧と違いページ分割はせず、全件を少しずつ読みながら返す（todos.exporter を参照）。
+    """
+    queryset = export_queryset(request.user, request.query_params)
+    fmt = request.accepted_renderer.format
+    response = StreamingHttpResponse(export_lines(queryset, fmt), content_type=EXPORT_CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="todos.{fmt}"'
+    return response
+
 @api_view(['DELETE'])
 @permission_classes([permissions.IsAuthenticated])
 def clear_completed_todos(request):
     """完了済みTodo一括削除"""
-    deleted_count = Todo.objects.filter(user=request.user, completed=True).delete()[0]
+    deleted_ids = delete_todos(request.user.id, Todo.objects.filter(user=request.user, completed=True))
+    if deleted_ids:
+        invalidate_todo_cache(request.user.id)
+        publish_todo_event(request.user.id, 'deleted', deleted_ids)
+    deleted_count = len(deleted_ids)
     return Response({'message': f'{deleted_count}件の完了済みTodoを削除しました。'})
 
-@api_view(['GET'])
-@permission_classes([permissions.IsAuthenticated])
-def todo_stats(request):
-    """Todo統計情報"""
-    user = request.user
-    now = timezone.now()
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    week_start = today_start - timedelta(days=today_start.weekday())
-    
-    todos = Todo.objects.filter(user=user)
-    total_todos = todos.count()
-    completed_todos = todos.filter(completed=True).count()
-    pending_todos = total_todos - completed_todos
+def overdue_queryset(user, now):
+    return Todo.objects.filter(user_id=user.pk, completed=False, due_date__lt=now)
+
+def todo_stats_etag(request, now, version, overdue_count):
+    # 日付と期限切れ件数で結果が変わるので、バージョンと合わせて検証子にする
+    return make_etag('stats', request.user.pk, version, bucket_day(now), overdue_count, request.accepted_media_type)
+
+def todo_stats_data(stats):
+    total_todos = stats['total_todos']
+    completed_todos = stats['completed_todos']
     completion_rate = (completed_todos / total_todos * 100) if total_todos > 0 else 0
     
-    overdue_todos = todos.filter(
-        due_date__lt=now,
-        completed=False
-    ).count()
-    
-    today_completed = todos.filter(
-        completed=True,
-        completed_at__gte=today_start
-    ).count()
-    
-    week_completed = todos.filter(
-        completed=True,
-        completed_at__gte=week_start
-    ).count()
-    
-    # カテゴリ別統計
-    categories_stats = {}
-    categories = Category.objects.filter(user=user).annotate(
-        total=Count('todo_categories__todo'),
-        completed=Count('todo_categories__todo', filter=Q(todo_categories__todo__completed=True))
-    )
-    
-    for category in categories:
-        categories_stats[category.name] = {
-            'total': category.total,
-            'completed': category.completed,
-            'pending': category.total - category.completed
-        }
-    
     stats_data = {
         'total_todos': total_todos,
         'completed_todos': completed_todos,
-        'pending_todos': pending_todos,
+        'pending_todos': total_todos - completed_todos,
         'completion_rate': round(completion_rate, 2),
-        'overdue_todos': overdue_todos,
-        'today_completed': today_completed,
-        'week_completed': week_completed,
-        'categories_stats': categories_stats
+        'overdue_todos': stats['overdue_todos'],
+        'today_completed': stats['today_completed'],
+        'week_completed': stats['week_completed'],
+        'categories_stats': stats['categories_stats']
     }
     
     serializer = TodoStatsSerializer(stats_data)
-    return Response(serializer.data)
+    return serializer.data
+
+@api_view(['GET'])
+@authentication_classes([TokenUserJWTAuthentication])
+@permission_classes([permissions.IsAuthenticated])
+def todo_stats(request):
+    """Todo統計情報"""
+    now = timezone.now()
+    version, _ = get_list_state(request.user.pk)
+    etag = None
+    if version is not None:
+        etag = todo_stats_etag(request, now, version, overdue_queryset(request.user, now).count())
+        response = check_preconditions(request, etag)
+        if response is not None:
+            return set_validators(response, etag)
+    
+    stats = read_stats(request.user, now)
+    return set_validators(Response(todo_stats_data(stats)), etag)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def todo_changes(request):
+    """差分同期
+
+    `?since=<cursor>` 以降に作成・更新されたTodoとカテゴリ、削除されたIDと次回のカーソルを返す。
+    since を省略すると全件を返す。
+    """
+    since = request.query_params.get('since')
+    try:
+        since = decode_cursor(since) if since else None
+    except (ValueError, OverflowError, OSError):
+        return Response({'error': '無効なカーソルです。'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        changes = changes_since(request.user, since)
+    except CursorExpired:
+        return Response(
+            {'error': 'カーソルの有効期限が切れています。全件を取得し直してください。'},
+            status=status.HTTP_410_GONE,
+        )
+    
+    return Response({
+        'todos': TodoSerializer(changes['todos'].prefetch_related(categories_prefetch()), many=True).data,
+        'categories': CategorySerializer(changes['categories'], many=True).data,
+        'deleted': changes['deleted'],
+        'cursor': changes['cursor'],
+    })
+
+async def todo_events(request):
+    """Todoの変更イベント（Server-Sent Events）
+
+    ASGIで動かす前提の非同期ビュー。イベントには種類とTodoのIDだけが含まれるので、
+    クライアントは受信後に差分同期で内容を取得する。
+    EventSourceはヘッダーを付けられないため `?token=` も受け付ける（URLがログに残る点に注意）。
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'GETのみ対応しています。'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    try:
+        user = await AsyncJWTAuthentication().aauthenticate(request, allow_query_token=True)
+    except AuthenticationFailed:
+        user = None
+    if user is None:
+        return JsonResponse({'error': '認証情報が正しくありません。'}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    response = StreamingHttpResponse(event_stream(user.pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginxなどのプロキシでバッファリングさせない
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def todo_cache_stats(request):
+    """Todo一覧キャッシュのヒット数・ミス数（管理者のみ）"""
+    return Response(cache_metrics())
+
+class ArchivedTodoListView(generics.ListAPIView):
+    """アーカイブ済みTodo一覧（manage.py archive_todos で移したもの。新しく完了した順）"""
+    authentication_classes = [TokenUserJWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = ArchivedTodoSerializer
+    pagination_class = TodoPagination
+    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filterset_class = ArchivedTodoFilter
+    search_fields = ['name', 'description']
+    ordering_fields = ['completed_at', 'created_at', 'due_date', 'archived_at']
+    ordering = ['-completed_at']
+
+    def get_queryset(self):
+        return ArchivedTodo.objects.filter(user_id=self.request.user.pk)
 
 # Category Views
-class CategoryListCreateView(generics.ListCreateAPIView):
+class CategoryListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
     """カテゴリ一覧取得・作成"""
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -200,10 +457,40 @@ class CategoryListCreateView(generics.ListCreateAPIView):
             todo_count=Count('todo_categories')
         ).order_by('-created_at')
 
+    def get_validators(self, request, lock=False):
+        # カテゴリのTodo件数もTodoの書き込みで変わるため、Todo一覧と同じバージョンを使う
+        version, modified = get_list_state(request.user.pk)
+        if version is None:
+            return None, None
+        etag = make_etag('categories', request.user.pk, version, request_digest(request), request.accepted_media_type)
+        return etag, modified
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        invalidate_todo_cache(self.request.user.id)
+
 class CategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
     """カテゴリ詳細取得・更新・削除"""
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Category.objects.filter(user=self.request.user)
\ No newline at end of file
+        return Category.objects.filter(user=self.request.user)
+
+    # カテゴリはTodo一覧にも含まれるので、変更時は一覧のキャッシュも無効にする
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate_todo_cache(self.request.user.id)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            # 関連付けが外れるTodoは差分同期で送り直す
+            todos = Todo.objects.filter(user=self.request.user, categories=instance)
+            todo_ids = list(todos.values_list('id', flat=True))
+            todos.update(updated_at=timezone.now())
+            category_id = instance.pk
+            super().perform_destroy(instance)
+            record_deletions(self.request.user.id, Tombstone.KIND_CATEGORY, [category_id])
+        invalidate_todo_cache(self.request.user.id)
+        if todo_ids:
+            publish_todo_event(self.request.user.id, 'updated', todo_ids)